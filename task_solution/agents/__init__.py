@@ -5,6 +5,8 @@ from .procedure_descriptor.procedure_descriptor import ProcedureDescriptor
 from .report_maker.report_maker import ReportMaker
 from .task_supporter.task_supporter import TaskSupporter, SupportType, SupportInfo
 from .task_supporter.notify_desider import NotifyDesider
+from .task_supporter.notify_gate import NotifyGate, GateDecision
+from .registry import get_agent, clear_agents
 
 __all__ = [
     "ScreenAnalyzer",
@@ -14,4 +16,8 @@ __all__ = [
     "SupportType",
     "SupportInfo",
     "NotifyDesider",
+    "NotifyGate",
+    "GateDecision",
+    "get_agent",
+    "clear_agents",
 ]
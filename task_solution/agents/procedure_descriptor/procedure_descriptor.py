@@ -1,8 +1,17 @@
 import json
+import os
 from pydantic import BaseModel, Field
 from typing import Dict, Any
 from vertexai.generative_models import Part
 from ..vertex_ai.base_vertex_ai import BaseVertexAI
+from utils.pipeline import Pipeline
+from utils.text_similarity import ngram_similarity
+
+# 分割モードの1区間の長さ (秒) と、区間境界で操作が切れないように前後に重ねる秒数
+PROCEDURE_SEGMENT_SECONDS = float(os.getenv("PROCEDURE_SEGMENT_SECONDS", 120))
+PROCEDURE_SEGMENT_OVERLAP_SECONDS = float(os.getenv("PROCEDURE_SEGMENT_OVERLAP_SECONDS", 5))
+# 区間を同時に解析する数
+PROCEDURE_SEGMENT_PARALLELISM = int(os.getenv("PROCEDURE_SEGMENT_PARALLELISM", 4))
 
 
 class ProcedureStep(BaseModel):
@@ -17,6 +26,9 @@ class ProcedureStep(BaseModel):
 class ProcedureOutput(BaseModel):
     title: str = Field(description="title of the procedure")
     steps: list[ProcedureStep] = Field(description="steps of the procedure")
+    timings: Dict[str, float] = Field(
+        default_factory=dict, description="区間ごとの解析時間 (秒)。分割モードのみ"
+    )
 
     @classmethod
     def from_json_data(cls, json_data: Dict[str, Any]) -> "ProcedureOutput":
@@ -36,6 +48,75 @@ class ProcedureOutput(BaseModel):
         return md_content
 
 
+class VideoSegment(BaseModel):
+    index: int = Field(description="区間の番号 (0始まり)")
+    start_offset: float = Field(description="開始位置 (秒)")
+    end_offset: float = Field(description="終了位置 (秒)")
+
+    @property
+    def name(self) -> str:
+        return f"segment_{self.index}"
+
+    def to_part(self, video_uri: str, mime_type: str = "video/mp4") -> Part:
+        # 動画全体は1つのオブジェクトのまま、video_metadata で解析する範囲を指定する
+        return Part.from_dict(
+            {
+                "file_data": {"file_uri": video_uri, "mime_type": mime_type},
+                "video_metadata": {
+                    "start_offset": f"{self.start_offset:.3f}s",
+                    "end_offset": f"{self.end_offset:.3f}s",
+                },
+            }
+        )
+
+
+def split_segments(
+    duration_seconds: float,
+    segment_seconds: float = PROCEDURE_SEGMENT_SECONDS,
+    overlap_seconds: float = PROCEDURE_SEGMENT_OVERLAP_SECONDS,
+) -> list[VideoSegment]:
+    """動画を segment_seconds ごとの区間に分ける。各区間の前後は overlap_seconds だけ重ねる"""
+    segments = []
+    start = 0.0
+    while start < duration_seconds:
+        end = min(start + segment_seconds, duration_seconds)
+        segments.append(
+            VideoSegment(
+                index=len(segments),
+                start_offset=max(0.0, start - overlap_seconds),
+                end_offset=min(duration_seconds, end + overlap_seconds),
+            )
+        )
+        start = end
+    return segments
+
+
+def merge_procedure_outputs(
+    outputs: list[ProcedureOutput],
+    title: str = "",
+    similarity_threshold: float = 0.8,
+    lookback: int = 3,
+) -> ProcedureOutput:
+    """
+    区間ごとの手順を区間順に連結する。
+    区間の重なりで同じ手順が2回抽出されるので、直前 lookback 件と似ている手順は捨てる。
+    """
+    steps = []
+    for output in outputs:
+        for step in output.steps:
+            text = f"{step.section} {step.description}"
+            if any(
+                ngram_similarity(text, f"{kept.section} {kept.description}")
+                >= similarity_threshold
+                for kept in steps[-lookback:]
+            ):
+                continue
+            steps.append(step)
+    if not title:
+        title = next((output.title for output in outputs if output.title), "")
+    return ProcedureOutput(title=title, steps=steps)
+
+
 class ProcedureDescriptor(BaseVertexAI):
     def __init__(self, model_name="gemini-2.0-flash"):
         super().__init__(model_name=model_name)
@@ -84,19 +165,86 @@ class ProcedureDescriptor(BaseVertexAI):
             "required": ["title", "steps"],
         }
 
-    def analyze_video(self, task_name, video_uri, user_query) -> ProcedureOutput:
+    def analyze_video(
+        self, task_name, video_uri, user_query, duration_seconds: float = None,
+        on_segment_done=None,
+    ) -> ProcedureOutput:
+        """
+        :param duration_seconds: 動画の長さ (秒)。区間長より十分長ければ分割モードで解析する
+        :param on_segment_done: 分割モードで区間の解析が終わるたびに (終わった数, 区間数) で呼ぶ関数
+        """
+        if duration_seconds and duration_seconds > PROCEDURE_SEGMENT_SECONDS * 1.5:
+            return self.analyze_video_segmented(
+                task_name, video_uri, user_query, duration_seconds,
+                on_segment_done=on_segment_done,
+            )
+
         video_file = Part.from_uri(
             video_uri,
             mime_type="video/mp4",
         )
-        self.system_prompt = self.system_prompt.format(
+        # インスタンスを共有するので self.system_prompt は書き換えない
+        system_prompt = self.system_prompt.format(
             task_name=task_name, query=user_query
         )
-        contents = [video_file, self.system_prompt]
-        response = self.model.generate_content(
-            contents=contents,
-            generation_config=self.generation_config,
-        )
+        contents = [video_file, system_prompt]
+        response = self.generate_content(contents)
 
         output = ProcedureOutput.from_json_data(json.loads(response.text))
         return output
+
+    def _analyze_segment(
+        self, segment: VideoSegment, total: int, video_uri: str, system_prompt: str
+    ) -> ProcedureOutput:
+        segment_prompt = (
+            f"{system_prompt}\n"
+            f"## Segment\n"
+            f"This video is part {segment.index + 1} of {total} of the recording "
+            f"({segment.start_offset:.0f}s - {segment.end_offset:.0f}s). "
+            f"Extract only the steps performed in this part, in order.\n"
+        )
+        response = self.generate_content([segment.to_part(video_uri), segment_prompt])
+        return ProcedureOutput.from_json_data(json.loads(response.text))
+
+    def analyze_video_segmented(
+        self,
+        task_name,
+        video_uri,
+        user_query,
+        duration_seconds: float,
+        max_workers: int = PROCEDURE_SEGMENT_PARALLELISM,
+        on_segment_done=None,
+    ) -> ProcedureOutput:
+        """
+        動画を時間区間に分けて並列に解析し (map)、区間順に結合・重複除去する (reduce)
+        """
+        system_prompt = self.system_prompt.format(
+            task_name=task_name, query=user_query
+        )
+        segments = split_segments(duration_seconds)
+        pipeline = Pipeline("procedure_segments", max_workers=max_workers)
+        for segment in segments:
+            pipeline.add(
+                segment.name,
+                lambda segment=segment: self._analyze_segment(
+                    segment, len(segments), video_uri, system_prompt
+                ),
+            )
+        done = []
+
+        def segment_done(name):
+            done.append(name)
+            if on_segment_done is not None:
+                on_segment_done(len(done), len(segments))
+
+        result = pipeline.run(on_node_done=segment_done)
+
+        outputs = [result.get(s.name) for s in segments if result.ok(s.name)]
+        if not outputs:
+            raise next(iter(result.errors.values()))
+        for name, error in result.errors.items():
+            self.logger.warning(f"{name} failed and was skipped: {error}")
+
+        output = merge_procedure_outputs(outputs)
+        output.timings = {**result.timings, "wall_time": result.wall_time}
+        return output
@@ -0,0 +1,30 @@
+import threading
+
+
+_lock = threading.Lock()
+_agents = {}
+
+
+def get_agent(agent_cls, **kwargs):
+    """
+    エージェントのインスタンスをプロセス内で共有して返す。
+    エージェントは呼び出しごとの状態を持たないので、複数スレッドから同じインスタンスを使ってよい。
+
+        screen_analyzer = get_agent(ScreenAnalyzer)
+        report_maker = get_agent(ReportMaker, model_name="gemini-2.0-flash")
+    """
+    key = (agent_cls, tuple(sorted(kwargs.items())))
+    agent = _agents.get(key)
+    if agent is None:
+        with _lock:
+            agent = _agents.get(key)
+            if agent is None:
+                agent = agent_cls(**kwargs)
+                _agents[key] = agent
+    return agent
+
+
+def clear_agents():
+    """共有しているエージェントを破棄する (設定を変えて作り直したい場合など)"""
+    with _lock:
+        _agents.clear()
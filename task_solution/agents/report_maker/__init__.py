@@ -1,10 +1,12 @@
 from .report_maker import ReportMaker
 from .task_type_extracter import TaskTypeExtractor
 from .time_table_maker import TimeTableMaker
+from .log_summarizer import LogSummarizer
 
 
 __all__ = [
     "ReportMaker",
     "TaskTypeExtractor",
     "TimeTableMaker",
+    "LogSummarizer",
 ]
@@ -0,0 +1,54 @@
+import json
+from pydantic import BaseModel, Field
+from typing import Dict, Any
+
+from ..vertex_ai.base_vertex_ai import BaseVertexAI
+
+
+class LogSummary(BaseModel):
+    summary: str = Field(description="時間帯の作業内容の要約")
+
+    @classmethod
+    def from_json_data(cls, json_data: Dict[str, Any]) -> "LogSummary":
+        return cls(summary=json_data["summary"])
+
+
+class LogSummarizer(BaseVertexAI):
+    cache_ttl = 86400
+
+    def __init__(self, model_name="gemini-2.0-flash"):
+        super().__init__(model_name=model_name)
+        self.system_prompt = """
+        あなたは、ユーザーの作業ログを要約するAIアシスタントです。
+        ある時間帯の詳細な作業ログを受け取り、後で作業レポートと時間割を作成できるように日本語で要約してください。
+
+        ## 要約のルール
+        - 時系列に沿って、どの時刻からどの時刻まで何の作業をしていたかを残してください (HH:MM形式)。
+        - 作業の種類 (文書作成、調査、コーディング、会議、休憩、離席など) が分かるように記載してください。
+        - 完了したタスク、遭遇した課題とその解決方法を残してください。
+        - 参照していたWebページのタイトルやURLがあれば残してください。
+        - PCで何もしていない時間は"離席"と記載してください。
+        """
+        self.response_scheme = {
+            "type": "OBJECT",
+            "properties": {
+                "summary": {
+                    "type": "STRING",
+                    "description": "時間帯の作業内容の要約",
+                }
+            },
+            "required": ["summary"],
+        }
+
+    def summarize(self, log_text: str, window: str) -> LogSummary:
+        """
+        :param log_text: 時間帯の作業ログ
+        :param window: 時間帯 ("HH:MM-HH:MM")
+        :return: 要約
+        """
+        query = f"## 時間帯\n{window}\n\n## 作業ログ\n{log_text}\n\n"
+        contents = [self.system_prompt, query]
+
+        response = self.invoke(contents)
+        output = LogSummary.from_json_data(json.loads(response.text))
+        return output
@@ -62,6 +62,9 @@ class ReportInfo(BaseModel):
 
 
 class ReportMaker(BaseVertexAI):
+    # ログが変わっていなければ再生成のたびに同じ結果を返す
+    cache_ttl = 3600
+
     def __init__(self, model_name="gemini-2.5-pro-preview-03-25"):
         super().__init__(model_name=model_name)
         self.system_prompt = """
@@ -135,14 +138,19 @@ class ReportMaker(BaseVertexAI):
             ],
         }
 
+    def _make_contents(self, log_text: str) -> list:
+        query = f"## 作業ログ\n{log_text}\n\n"
+        return [self.system_prompt, query]
+
     def make_report(self, log_text: str) -> ReportInfo:
         """
         :param log_text: ログ
         :return: 作業レポート (dict)
         """
-        query = f"## 作業ログ\n{log_text}\n\n"
-        contents = [self.system_prompt, query]
-
-        response = self.invoke(contents)
+        response = self.invoke(self._make_contents(log_text))
         output = ReportInfo.from_json_data(json.loads(response.text))
         return output
+
+    async def amake_report(self, log_text: str) -> ReportInfo:
+        response = await self.ainvoke(self._make_contents(log_text))
+        return ReportInfo.from_json_data(json.loads(response.text))
@@ -29,6 +29,8 @@ class TaskTypeList(BaseModel):
 
 
 class TaskTypeExtractor(BaseVertexAI):
+    cache_ttl = 3600
+
     def __init__(self, model_name="gemini-2.5-pro-preview-03-25"):
         super().__init__(model_name=model_name)
         self.system_prompt = """
@@ -71,10 +73,15 @@ class TaskTypeExtractor(BaseVertexAI):
             "required": ["task_types"],
         }
 
-    def extract_task_type(self, log_text: str) -> TaskTypeList:
+    def _make_contents(self, log_text: str) -> list:
         query = f"{log_text}"
-        contents = [self.system_prompt, query]
+        return [self.system_prompt, query]
 
-        response = self.invoke(contents)
+    def extract_task_type(self, log_text: str) -> TaskTypeList:
+        response = self.invoke(self._make_contents(log_text))
         output = TaskTypeList.from_json_data(json.loads(response.text))
         return output
+
+    async def aextract_task_type(self, log_text: str) -> TaskTypeList:
+        response = await self.ainvoke(self._make_contents(log_text))
+        return TaskTypeList.from_json_data(json.loads(response.text))
@@ -4,14 +4,7 @@ import json
 from pydantic import BaseModel, Field
 from typing import Dict, Any
 from ..vertex_ai.base_vertex_ai import BaseVertexAI
-import matplotlib
-
-matplotlib.use("Agg")  # Ensure matplotlib doesn't try to use a GUI backend
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import os
-import urllib.request
-import uuid
+from utils.chart_renderer import chart_renderer
 
 
 class TimeTable(BaseModel):
@@ -79,193 +72,30 @@ class TimeTableList(BaseModel):
         )
         return whole_task_duration + task_durations
 
-    def generate_pie_chart_path(self) -> str:
+    def duration_minutes_by_type(self) -> dict:
+        """円グラフ用のタスク種別ごとの作業時間 (分)。休憩・離席は除く"""
         type_durations = defaultdict(timedelta)
         for t in self.time_table:
             if (
                 t.task_type != "休憩" and t.task_type != "離席"
             ):  # Exclude specific types
                 type_durations[t.task_type] += t.duration
+        return {
+            task_type: td.total_seconds() / 60
+            for task_type, td in type_durations.items()
+        }
 
-        if not type_durations:
-            return ""
-
-        labels = list(type_durations.keys())
-        sizes = [td.total_seconds() / 60 for td in type_durations.values()]
-
-        charts_dir = os.path.join(
-            os.path.dirname(__file__), "..", "..", "static", "generated_charts"
-        )
-        os.makedirs(charts_dir, exist_ok=True)
-
-        filename = f"pie_chart_{uuid.uuid4().hex}.png"
-        filepath = os.path.join(charts_dir, filename)
-
-        # より鮮やかで見やすい色のパレット
-        colors = [
-            "#FF6B6B",  # コーラルレッド
-            "#4ECDC4",  # ターコイズ
-            "#45B7D1",  # ブルー
-            "#96CEB4",  # ミントグリーン
-            "#FECA57",  # ゴールド
-            "#FF9FF3",  # ピンク
-            "#54A0FF",  # ライトブルー
-            "#5F27CD",  # パープル
-            "#00D2D3",  # シアン
-            "#FF9F43",  # オレンジ
-        ]
-
-        font_name_to_use = None
-        # URL from subtask description, with _COLON_ replaced
-        font_download_url = "https://raw.githubusercontent.com/google/fonts/main/ofl/notosansjp/NotoSansJP-Regular.ttf"
-        font_filename = "NotoSansJP-Regular.ttf"
-        # Correctly determine temp_font_dir relative to the task_solution directory
-        base_dir = os.path.dirname(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        )  # This should be task_solution
-        temp_font_dir = os.path.join(base_dir, "temp_fonts")
-        local_font_path = os.path.join(temp_font_dir, font_filename)
-
-        os.makedirs(temp_font_dir, exist_ok=True)
-        print(f"Temp font directory: {temp_font_dir}")
-
-        if not os.path.exists(local_font_path):
-            print(
-                f"Font {font_filename} not found locally. Attempting to download from {font_download_url}..."
-            )
-            try:
-                actual_url = (
-                    font_download_url  # This variable already has the correct URL.
-                )
-
-                # Create a request object with a User-Agent header
-                req = urllib.request.Request(
-                    actual_url,
-                    data=None,
-                    headers={
-                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-                    },
-                )
-
-                with urllib.request.urlopen(req) as response, open(
-                    local_font_path, "wb"
-                ) as out_file:
-                    if response.status == 200:
-                        data = response.read()  # Read data from response
-                        out_file.write(data)  # Write to file
-                        print(f"Font downloaded successfully to {local_font_path}")
-                    else:
-                        print(
-                            f"Error during download: Server responded with status {response.status}"
-                        )
-                        local_font_path = None  # Indicate download failure
-
-            except Exception as e:
-                print(f"Error downloading font: {e}")
-                local_font_path = None
-        else:
-            print(f"Font {font_filename} found locally at {local_font_path}")
-
-        # フォント設定の改善（より確実な方法）
-        font_prop = None
-        if local_font_path and os.path.exists(local_font_path):
-            try:
-                # FontPropertiesオブジェクトを直接使用
-                font_prop = fm.FontProperties(fname=local_font_path)
-                print(f"Successfully loaded font from: {local_font_path}")
-            except Exception as e:
-                print(f"Error loading downloaded font {local_font_path}: {e}")
-                font_prop = None
-
-        # フォントプロパティが取得できなかった場合のフォールバック
-        if font_prop is None:
-            try:
-                # システムの日本語フォントを検索
-                available_fonts = [f.name for f in fm.fontManager.ttflist]
-                japanese_fonts = [
-                    "Noto Sans CJK JP",
-                    "NotoSansCJK-Regular",
-                    "Hiragino Sans",
-                    "Yu Gothic",
-                    "Meiryo",
-                    "Takao",
-                    "DejaVu Sans",
-                ]
-
-                for font_name in japanese_fonts:
-                    if any(font_name.lower() in af.lower() for af in available_fonts):
-                        font_prop = fm.FontProperties(family=font_name)
-                        print(f"Using system font: {font_name}")
-                        break
-
-                if font_prop is None:
-                    # 最後の手段：利用可能なフォントから日本語対応フォントを探す
-                    for af in available_fonts:
-                        if any(
-                            keyword in af.lower()
-                            for keyword in ["noto", "cjk", "jp", "japanese"]
-                        ):
-                            font_prop = fm.FontProperties(family=af)
-                            print(f"Found Japanese font: {af}")
-                            break
-
-            except Exception as e:
-                print(f"Error finding system fonts: {e}")
-
-        if font_prop is None:
-            print("No Japanese font found, using default font")
-            font_prop = fm.FontProperties()  # デフォルトフォント
-
-        # グラフのサイズと品質を向上
-        fig, ax = plt.subplots(figsize=(10, 8), dpi=100)
-
-        # 円グラフの作成（フォントプロパティを直接指定）
-        wedges, texts, autotexts = ax.pie(
-            sizes,
-            labels=labels,
-            autopct="%1.1f%%",
-            startangle=90,
-            colors=colors[: len(labels)],  # ラベル数に応じて色を選択
-            textprops={"fontproperties": font_prop, "fontsize": 12, "weight": "bold"},
-            pctdistance=0.85,
-        )
-
-        # パーセンテージテキストの色を白に設定（視認性向上）
-        for autotext in autotexts:
-            autotext.set_color("white")
-            autotext.set_weight("bold")
-            autotext.set_fontsize(11)
-            autotext.set_fontproperties(font_prop)
-
-        # ラベルテキストの設定
-        for text in texts:
-            text.set_fontsize(12)
-            text.set_weight("bold")
-            text.set_fontproperties(font_prop)
-
-        ax.axis("equal")
-
-        # タイトルの設定（フォントプロパティを指定）
-        plt.title(
-            "作業時間割合", fontsize=16, weight="bold", pad=20, fontproperties=font_prop
-        )
-
-        # 背景色を設定（オプション）
-        fig.patch.set_facecolor("white")
-
-        try:
-            plt.tight_layout()
-            plt.savefig(filepath, dpi=150, bbox_inches="tight", facecolor="white")
-            plt.close(fig)
-            print(f"Pie chart saved successfully to {filepath}")
-        except Exception as e:
-            print(f"Error saving pie chart: {e}")
-            return ""
-
-        return f"/static/generated_charts/{filename}"
+    def generate_pie_chart_path(self, fmt: str = None) -> str:
+        """
+        :param fmt: "png" または "svg"。省略時は CHART_FORMAT 環境変数 (既定 png)
+        :return: 円グラフ画像の URL。作業が無い場合や描画に失敗した場合は ""
+        """
+        return chart_renderer.render_pie_chart(self.duration_minutes_by_type(), fmt=fmt)
 
 
 class TimeTableMaker(BaseVertexAI):
+    cache_ttl = 3600
+
     def __init__(self, model_name="gemini-2.5-pro-preview-03-25"):
         super().__init__(model_name=model_name)
         self.system_prompt = """
@@ -301,15 +131,20 @@ class TimeTableMaker(BaseVertexAI):
             "required": ["time_table"],
         }
 
+    def _make_contents(self, log_text: str, task_type: str) -> list:
+        query = f"## 作業ログ{log_text}\n\n## タスクの種類{task_type}"
+        return [self.system_prompt, query]
+
     def make_time_table(self, log_text: str, task_type: str) -> TimeTableList:
         """
         :param log_text: 作業ログ
         :param task_type: タスクの種類
         :return: 時間割 (dict)
         """
-        query = f"## 作業ログ{log_text}\n\n## タスクの種類{task_type}"
-        contents = [self.system_prompt, query]
-
-        response = self.invoke(contents)
+        response = self.invoke(self._make_contents(log_text, task_type))
         time_table_list = TimeTableList.from_json_data(json.loads(response.text))
         return time_table_list
+
+    async def amake_time_table(self, log_text: str, task_type: str) -> TimeTableList:
+        response = await self.ainvoke(self._make_contents(log_text, task_type))
+        return TimeTableList.from_json_data(json.loads(response.text))
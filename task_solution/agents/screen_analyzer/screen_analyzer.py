@@ -1,12 +1,11 @@
+import asyncio
 import json
 from datetime import datetime
 from pydantic import BaseModel, Field
 from vertexai.generative_models import Image, Part
 
-import base64
-import tempfile
-from pathlib import Path
 from agents.vertex_ai.base_vertex_ai import BaseVertexAI
+from utils.frame_processor import decode_frame, normalize_frames
 
 
 class ScreenInfo(BaseModel):
@@ -16,31 +15,6 @@ class ScreenInfo(BaseModel):
     timestamp: str
 
 
-class ImageProcessor:
-    def __init__(self):
-        self._temp_dir = tempfile.TemporaryDirectory()
-        self.temp_path = Path(self._temp_dir.name)
-
-    def save_image(self, base64_data, filename):
-        image_data = base64.b64decode(base64_data)
-        file_path = self.temp_path / filename
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-        return file_path
-
-    def process_image(self, filename):
-        file_path = self.temp_path / filename
-        with open(file_path, "rb") as f:
-            return f.read()
-
-    def cleanup(self):
-        self._temp_dir.cleanup()
-
-    def __del__(self):
-        if hasattr(self, "_temp_dir"):
-            self._temp_dir.cleanup()
-
-
 class ScreenAnalyzer(BaseVertexAI):
     def __init__(self, model_name="gemini-2.5-pro-preview-03-25"):  # Changed model
         super().__init__(model_name=model_name)
@@ -70,17 +44,21 @@ class ScreenAnalyzer(BaseVertexAI):
             "required": ["description"],
         }
 
-        self.image_processor = ImageProcessor()
-
     def _make_contents(self, encoded_frames: list[str], user_query: str):
         image_parts = []
         self.logger.info(
             f"Begin processing {len(encoded_frames)} images "
             f"for query '{user_query}'"
         )
+        # dedupe_frames を通したフレームはデコード済みのバイト列なので、decode_frame はそのまま返す
+        frames = []
         for i, encoded_frame in enumerate(encoded_frames):
-            image_data = base64.b64decode(encoded_frame)
-            image_part = Part.from_data(data=image_data, mime_type="image/png")
+            try:
+                frames.append(decode_frame(encoded_frame))
+            except Exception as e:
+                self.logger.error(f"Error decoding frame {i}: {e}")
+        for image_data, mime_type in normalize_frames(frames):
+            image_part = Part.from_data(data=image_data, mime_type=mime_type)
             image_parts.append(image_part)
 
         current_system_prompt = self.system_prompt.format(
@@ -97,7 +75,19 @@ class ScreenAnalyzer(BaseVertexAI):
         )
         contents = self._make_contents(encoded_frames, user_query)
         response = self.invoke(contents)
+        return self._parse_response(response)
+
+    async def aanalysis(self, encoded_frames: list[str], user_query: str = "") -> ScreenInfo:
+        self.logger.info(
+            f"Starting async analysis for query '{user_query}' "
+            f"with {len(encoded_frames)} image(s)"
+        )
+        # フレームのデコード・縮小は CPU 処理なのでイベントループの外で行う
+        contents = await asyncio.to_thread(self._make_contents, encoded_frames, user_query)
+        response = await self.ainvoke(contents)
+        return self._parse_response(response)
 
+    def _parse_response(self, response) -> ScreenInfo:
         parsed_response = json.loads(response.text)
         description = parsed_response.get("description", "")
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -105,6 +95,3 @@ class ScreenAnalyzer(BaseVertexAI):
         screen_info = ScreenInfo(description=description, timestamp=timestamp)
 
         return screen_info
-
-    def cleanup(self):
-        self.image_processor.cleanup()
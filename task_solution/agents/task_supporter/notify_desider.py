@@ -3,6 +3,7 @@ from pydantic import BaseModel, Field, validator
 from typing import Dict, Any
 
 from ..vertex_ai.base_vertex_ai import BaseVertexAI
+from .task_supporter import SupportInfo
 
 
 class NotifyInfo(BaseModel):
@@ -34,6 +35,8 @@ class NotifyInfo(BaseModel):
 
 
 class NotifyDesider(BaseVertexAI):
+    cache_ttl = 300
+
     def __init__(self, model_name="gemini-2.5-pro-preview-03-25"):
         super().__init__(model_name=model_name)
         self.system_prompt = """
@@ -90,11 +93,15 @@ Check if the current notification message matches or closely resembles a previou
             "required": ["importance_level", "is_duplicate"],
         }
 
-    def is_need_notify(self, support_info: dict, log_context: str) -> bool:
-        query = f"## Target Support Message\n{support_info.get('message', '')}\n\n## Logs\n{log_context}"
-
-        contents = [self.system_prompt, query]
+    def _make_contents(self, support_info: SupportInfo, log_context: str) -> list:
+        query = f"## Target Support Message\n{support_info.message}\n\n## Logs\n{log_context}"
+        return [self.system_prompt, query]
 
-        response = self.invoke(contents)
+    def is_need_notify(self, support_info: SupportInfo, log_context: str) -> bool:
+        response = self.invoke(self._make_contents(support_info, log_context))
         notify_info = NotifyInfo.from_json_data(json.loads(response.text))
         return notify_info.should_notify
+
+    async def ais_need_notify(self, support_info: SupportInfo, log_context: str) -> bool:
+        response = await self.ainvoke(self._make_contents(support_info, log_context))
+        return NotifyInfo.from_json_data(json.loads(response.text)).should_notify
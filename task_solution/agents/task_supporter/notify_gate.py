@@ -0,0 +1,102 @@
+from enum import Enum
+
+from utils.text_similarity import ngram_similarity
+
+from .task_supporter import SupportInfo, SupportType
+
+
+class GateDecision(Enum):
+    NOTIFY = "notify"
+    SKIP = "skip"
+    ASK_LLM = "ask_llm"
+
+
+class GateResult:
+    def __init__(self, decision: GateDecision, reason: str, importance: int = 0,
+                 similarity: float = 0.0):
+        self.decision = decision
+        self.reason = reason
+        self.importance = importance
+        self.similarity = similarity
+
+    def __repr__(self):
+        return (
+            f"GateResult(decision={self.decision.value}, reason={self.reason!r}, "
+            f"importance={self.importance}, similarity={self.similarity:.2f})"
+        )
+
+
+class NotifyGate:
+    """
+    NotifyDesider の前段でローカルに通知要否を判定する。
+    明らかに通知すべき / すべきでないものはここで決め、曖昧なものだけ LLM に判断させる。
+    重要度の尺度は NotifyDesider のプロンプト (1-5, 4以上で通知) に合わせている。
+    """
+
+    # サポート種別ごとの基本重要度
+    BASE_IMPORTANCE = {
+        SupportType.NOTHING.value: 0,
+        SupportType.ADVICE.value: 2,
+        SupportType.SUPPORT.value: 3,
+        SupportType.ALERT.value: 4,
+    }
+    # 含まれていれば重要度を1段上げるキーワード (危険操作・セキュリティ・障害)
+    ESCALATION_KEYWORDS = [
+        "削除", "消去", "上書き", "漏洩", "流出", "apiキー", "api key", "パスワード",
+        "認証情報", "秘密鍵", "セキュリティ", "不正", "データ損失", "失われ", "復元でき",
+        "障害", "停止", "クラッシュ",
+    ]
+
+    def __init__(
+        self,
+        notify_threshold: int = 4,
+        skip_threshold: int = 2,
+        duplicate_threshold: float = 0.6,
+        ambiguous_similarity: float = 0.3,
+        ngram_size: int = 2,
+        max_history: int = 20,
+    ):
+        self.notify_threshold = notify_threshold
+        self.skip_threshold = skip_threshold
+        self.duplicate_threshold = duplicate_threshold
+        self.ambiguous_similarity = ambiguous_similarity
+        self.ngram_size = ngram_size
+        self.max_history = max_history
+
+    def score_importance(self, support_info: SupportInfo) -> int:
+        importance = self.BASE_IMPORTANCE.get(support_info.support_type, 0)
+        if importance == 0:
+            return 0
+        message = support_info.message.lower()
+        if any(keyword in message for keyword in self.ESCALATION_KEYWORDS):
+            importance += 1
+        return min(importance, 5)
+
+    def max_similarity(self, message: str, log_context: str) -> float:
+        history = [line for line in log_context.split("\n") if line.strip()]
+        history = history[: self.max_history]  # 通知ログは新しいものが先頭
+        similarities = [
+            max(
+                ngram_similarity(message, line, self.ngram_size),
+                # 通知ログは "type: message" 形式なので本文同士でも比較する
+                ngram_similarity(message, line.split(": ", 1)[-1], self.ngram_size),
+            )
+            for line in history
+        ]
+        return max(similarities, default=0.0)
+
+    def decide(self, support_info: SupportInfo, log_context: str = "") -> GateResult:
+        message = (support_info.message or "").strip()
+        if support_info.support_type == SupportType.NOTHING.value or not message:
+            return GateResult(GateDecision.SKIP, "nothing to notify")
+
+        importance = self.score_importance(support_info)
+        similarity = self.max_similarity(message, log_context or "")
+
+        if similarity >= self.duplicate_threshold:
+            return GateResult(GateDecision.SKIP, "duplicate", importance, similarity)
+        if importance <= self.skip_threshold:
+            return GateResult(GateDecision.SKIP, "low importance", importance, similarity)
+        if importance >= self.notify_threshold and similarity < self.ambiguous_similarity:
+            return GateResult(GateDecision.NOTIFY, "high importance", importance, similarity)
+        return GateResult(GateDecision.ASK_LLM, "ambiguous", importance, similarity)
@@ -1,13 +1,12 @@
+import asyncio
 import json
-import base64
 from enum import Enum
-import tempfile
-from pathlib import Path
 from pydantic import BaseModel, Field, validator
 from typing import Dict, Any
 from vertexai.generative_models import Part
 
 from ..vertex_ai.base_vertex_ai import BaseVertexAI
+from utils.frame_processor import decode_frame, normalize_frames
 
 
 class SupportType(Enum):
@@ -37,43 +36,22 @@ class SupportInfo(BaseModel):
 
     @classmethod
     def from_json_data(cls, json_data: Dict[str, Any]) -> "SupportInfo":
-        return cls(support_type=json_data["support_type"], message=json_data["message"])
+        # スキーマの説明は大文字 (NOTHING,SUPPORT,...) なので小文字に揃える
+        return cls(
+            support_type=json_data["support_type"].lower(),
+            message=json_data["message"],
+        )
 
     def make_message(self):
         return f"{self.support_type}: {self.message}"
 
 
-class ImageProcessor:
-    def __init__(self):
-        self._temp_dir = tempfile.TemporaryDirectory()
-        self.temp_path = Path(self._temp_dir.name)
-
-    def save_image(self, base64_data, filename):
-        image_data = base64.b64decode(base64_data)
-        file_path = self.temp_path / filename
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-        return file_path
-
-    def process_image(
-        self, filename
-    ):  # Not strictly needed by TaskSupporter if using Part.from_data
-        file_path = self.temp_path / filename
-        with open(file_path, "rb") as f:
-            return f.read()
-
-    def cleanup(self):
-        self._temp_dir.cleanup()
-
-    def __del__(self):
-        if hasattr(self, "_temp_dir"):
-            self._temp_dir.cleanup()
-
-
 class TaskSupporter(BaseVertexAI):
+    # 画面が変わらない間の通知ポーリングはキャッシュから返す
+    cache_ttl = 60
+
     def __init__(self, model_name="gemini-2.5-pro-preview-03-25"):
         super().__init__(model_name=model_name)
-        self.image_processor = ImageProcessor()
         self.system_prompt = """
 You are an assistant designed to provide **minimal yet effective support** based on Screen Image of a user's activity on their PC.
 
@@ -164,16 +142,14 @@ You must output in the following
             self.logger.info(
                 f"Processing {len(encoded_frames)} image(s) for TaskSupporter."
             )
+            frames = []
             for i, frame_b64 in enumerate(encoded_frames):
                 try:
-                    image_data = base64.b64decode(frame_b64)
-                    image_parts.append(
-                        Part.from_data(data=image_data, mime_type="image/png")
-                    )
+                    frames.append(decode_frame(frame_b64))
                 except Exception as e:
-                    self.logger.error(
-                        f"Error decoding or creating Part for frame {i}: {e}"
-                    )
+                    self.logger.error(f"Error decoding frame {i}: {e}")
+            for image_data, mime_type in normalize_frames(frames):
+                image_parts.append(Part.from_data(data=image_data, mime_type=mime_type))
         else:
             self.logger.info("No frames provided to TaskSupporter.")
 
@@ -187,6 +163,8 @@ You must output in the following
         support_info = SupportInfo.from_json_data(json.loads(response.text))
         return support_info
 
-    def cleanup(self):
-        if hasattr(self, "image_processor") and self.image_processor:
-            self.image_processor.cleanup()
+    async def aget_support(self, encoded_frames: list[str]) -> SupportInfo:
+        # フレームのデコード・縮小は CPU 処理なのでイベントループの外で行う
+        contents = await asyncio.to_thread(self._make_contents, encoded_frames)
+        response = await self.ainvoke(contents)
+        return SupportInfo.from_json_data(json.loads(response.text))
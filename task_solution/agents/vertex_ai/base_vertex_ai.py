@@ -1,22 +1,102 @@
+import asyncio
 import os
+import threading
 import vertexai
 from vertexai.generative_models import GenerativeModel, Part, GenerationConfig
 from google.genai import types, Client
-from utils.logger import Logger
+from utils.logger import Logger, summarize_payload
+from utils.metrics import registry
+from .mock_model import MockGenerativeModel
+from .response_cache import CachedResponse, make_cache_key, response_cache
+
+
+# モデルの実装 (モデル名 -> generate_content を持つオブジェクト)。
+# mock は Vertex AI を呼ばずにスキーマに合う JSON を返す (負荷試験用)
+MODEL_BACKENDS = {
+    "vertex": GenerativeModel,
+    "mock": MockGenerativeModel,
+}
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "vertex").lower()
+if MODEL_BACKEND not in MODEL_BACKENDS:
+    raise ValueError(f"Unknown MODEL_BACKEND: {MODEL_BACKEND}")
+
+invoke_seconds = registry.histogram(
+    "vertex_ai_generate_duration_seconds",
+    "Duration of generate_content calls",
+    ("agent", "model", "status"),
+)
+cache_requests = registry.counter(
+    "vertex_ai_response_cache_requests_total",
+    "Response cache lookups",
+    ("agent", "result"),
+)
+
+
+def describe_contents(contents) -> str:
+    """
+    ログ用にプロンプトを要約する。画像・動画は中身を出さず MIME タイプとサイズ (URI) だけにする
+    (ハッシュはキャッシュキーの計算で取るので、ここでは取らない)
+    """
+    described = []
+    for content in contents if isinstance(contents, list) else [contents]:
+        if isinstance(content, Part):
+            if content.inline_data:
+                described.append(
+                    f"<{content.inline_data.mime_type} {len(content.inline_data.data)} bytes>"
+                )
+                continue
+            if content.file_data:
+                described.append(
+                    f"<{content.file_data.mime_type} {content.file_data.file_uri}>"
+                )
+                continue
+            content = content.text
+        described.append(summarize_payload(content))
+    return "[" + ", ".join(described) + "]"
+
+
+_init_lock = threading.Lock()
+_vertexai_initialized = False
+# モデル名ごとの GenerativeModel (プロセス内で共有する)
+_models = {}
+
+
+def _ensure_vertexai_initialized():
+    global _vertexai_initialized
+    if _vertexai_initialized or MODEL_BACKEND != "vertex":
+        return
+    with _init_lock:
+        if not _vertexai_initialized:
+            project_id = os.getenv("GCP_PROJECT")
+            location = os.getenv("GCP_LOCATION", "us-central1")
+            vertexai.init(project=project_id, location=location)
+            _vertexai_initialized = True
+
+
+def get_model(model_name: str) -> GenerativeModel:
+    model = _models.get(model_name)
+    if model is None:
+        with _init_lock:
+            model = _models.get(model_name)
+            if model is None:
+                model = MODEL_BACKENDS[MODEL_BACKEND](model_name)
+                _models[model_name] = model
+    return model
 
 
 class BaseVertexAI:
+    # レスポンスキャッシュの有効期限 (秒)。None ならキャッシュしない。サブクラスで上書きして有効化する
+    cache_ttl = None
+
     def __init__(self, model_name):
-        project_id = os.getenv("GCP_PROJECT")
-        location = os.getenv("GCP_LOCATION", "us-central1")
-        vertexai.init(project=project_id, location=location)
+        _ensure_vertexai_initialized()
         self.model_name = model_name
         self.response_scheme = None
         self.logger = Logger(name=self.__class__.__name__).get_logger()
 
     @property
     def model(self) -> GenerativeModel:
-        return GenerativeModel(self.model_name)
+        return get_model(self.model_name)
 
     @property
     def generation_config(self):
@@ -26,10 +106,60 @@ class BaseVertexAI:
         )
 
     def invoke(self, contents):
-        self.logger.info(f"contents > {contents[30:]}")
-        response = self.model.generate_content(
-            contents,
-            generation_config=self.generation_config,
-        )
-        self.logger.info(f"response > {response}")
+        cache_key, cached = self._lookup_cache(contents)
+        if cached is not None:
+            return cached
+
+        self.logger.info(f"contents > {describe_contents(contents)}")
+        response = self.generate_content(contents)
+        return self._store_response(cache_key, response)
+
+    async def ainvoke(self, contents):
+        """
+        invoke の非同期版。モデルの応答を待つ間スレッドを占有しない (async サーバー用)。
+        キャッシュの参照・保存は画像のハッシュ計算とディスク I/O を伴うので、イベントループの外で行う
+        """
+        if not self.cache_ttl:
+            self.logger.info(f"contents > {describe_contents(contents)}")
+            return self._store_response(None, await self.agenerate_content(contents))
+
+        cache_key, cached = await asyncio.to_thread(self._lookup_cache, contents)
+        if cached is not None:
+            return cached
+
+        self.logger.info(f"contents > {describe_contents(contents)}")
+        response = await self.agenerate_content(contents)
+        return await asyncio.to_thread(self._store_response, cache_key, response)
+
+    def _lookup_cache(self, contents):
+        if not self.cache_ttl:
+            return None, None
+        cache_key = make_cache_key(self.model_name, contents, self.response_scheme)
+        cached_text = response_cache.get(cache_key, namespace=self.__class__.__name__)
+        if cached_text is not None:
+            self.logger.info(f"cache hit > {cache_key}")
+            cache_requests.inc(agent=self.__class__.__name__, result="hit")
+            return cache_key, CachedResponse(cached_text)
+        cache_requests.inc(agent=self.__class__.__name__, result="miss")
+        return cache_key, None
+
+    def _store_response(self, cache_key, response):
+        self.logger.info(f"response > {summarize_payload(response.text, 500)}")
+        if cache_key:
+            response_cache.set(cache_key, response.text, ttl=self.cache_ttl)
         return response
+
+    def generate_content(self, contents):
+        """モデルを呼び出す (キャッシュを通さない)。所要時間をエージェント・モデル別に記録する"""
+        with invoke_seconds.time(agent=self.__class__.__name__, model=self.model_name):
+            return self.model.generate_content(
+                contents,
+                generation_config=self.generation_config,
+            )
+
+    async def agenerate_content(self, contents):
+        with invoke_seconds.time(agent=self.__class__.__name__, model=self.model_name):
+            return await self.model.generate_content_async(
+                contents,
+                generation_config=self.generation_config,
+            )
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from google.api_core import exceptions
+
+from utils.logger import Logger
+
+
+logger = Logger(name="mock_model").get_logger()
+
+# 応答までの時間は対数正規分布 (中央値 MOCK_MODEL_LATENCY_MS、ばらつき MOCK_MODEL_LATENCY_SIGMA)
+MOCK_MODEL_LATENCY_MS = float(os.getenv("MOCK_MODEL_LATENCY_MS", 800))
+MOCK_MODEL_LATENCY_SIGMA = float(os.getenv("MOCK_MODEL_LATENCY_SIGMA", 0.4))
+# 429 (クォータ超過) / 503 を返す割合
+MOCK_MODEL_ERROR_RATE = float(os.getenv("MOCK_MODEL_ERROR_RATE", 0.0))
+MOCK_MODEL_SEED = os.getenv("MOCK_MODEL_SEED")
+
+_CHOICES_PATTERN = re.compile(r"\b([A-Z][A-Z_]+(?:\s*,\s*[A-Z][A-Z_]+)+)\b")
+_RANGE_PATTERN = re.compile(r"(\d+)\s*-\s*(\d+)")
+
+
+class MockResponse:
+    """GenerationResponse の代わり。呼び出し側は .text だけを参照する"""
+
+    def __init__(self, text: str, latency: float):
+        self.text = text
+        self.latency = latency
+
+    def __repr__(self):
+        return f"MockResponse(latency={self.latency:.3f}s, text={self.text[:100]!r})"
+
+
+class MockGenerativeModel:
+    """
+    Vertex AI を呼ばずに、レスポンススキーマに合う JSON を返す GenerativeModel の代替。
+    MODEL_BACKEND=mock で有効になり、負荷試験で Gemini のクォータを使わずに済む。
+    値は説明文から推測する (HH:MM 形式の時刻、"A,B,C" の選択肢、"1-5" の範囲など)。
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        latency_ms: float = MOCK_MODEL_LATENCY_MS,
+        latency_sigma: float = MOCK_MODEL_LATENCY_SIGMA,
+        error_rate: float = MOCK_MODEL_ERROR_RATE,
+        seed=MOCK_MODEL_SEED,
+    ):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _sample_latency(self) -> float:
+        with self._lock:
+            if self.latency_sigma <= 0:
+                return self.latency_ms / 1000
+            return self._random.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000
+
+    def _should_fail(self):
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            return self._random.choice(
+                [
+                    exceptions.ResourceExhausted("Mock quota exceeded"),
+                    exceptions.ServiceUnavailable("Mock service unavailable"),
+                ]
+            )
+
+    def generate_content(self, contents, generation_config=None, **kwargs) -> MockResponse:
+        latency = self._sample_latency()
+        time.sleep(latency)
+        return self._respond(generation_config, latency)
+
+    async def generate_content_async(
+        self, contents, generation_config=None, **kwargs
+    ) -> MockResponse:
+        latency = self._sample_latency()
+        await asyncio.sleep(latency)
+        return self._respond(generation_config, latency)
+
+    def _respond(self, generation_config, latency: float) -> MockResponse:
+        error = self._should_fail()
+        if error is not None:
+            logger.info(f"{self.model_name}: injected error {error.code}")
+            raise error
+
+        schema = None
+        if generation_config is not None:
+            schema = generation_config.to_dict().get("response_schema")
+        with self._lock:
+            value = self._generate(schema) if schema else "mock response"
+        return MockResponse(json.dumps(value, ensure_ascii=False), latency)
+
+    def _generate(self, schema: dict):
+        schema_type = schema.get("type", "STRING").upper()
+        description = schema.get("description", "")
+        if schema.get("enum"):
+            return self._random.choice(schema["enum"])
+
+        if schema_type == "OBJECT":
+            properties = schema.get("properties", {})
+            order = schema.get("property_ordering") or list(properties)
+            value = {name: self._generate(properties[name]) for name in order}
+            # 開始・終了のような時刻の組は前後関係を揃える
+            times = [name for name in order if "HH:MM" in properties[name].get("description", "")]
+            for name, time_value in zip(times, sorted(value[name] for name in times)):
+                value[name] = time_value
+            return value
+        if schema_type == "ARRAY":
+            item_schema = schema.get("items", {"type": "STRING"})
+            return [self._generate(item_schema) for _ in range(self._random.randint(1, 3))]
+        if schema_type == "BOOLEAN":
+            return self._random.random() < 0.5
+        if schema_type in ("INTEGER", "NUMBER"):
+            match = _RANGE_PATTERN.search(description)
+            low, high = (int(match.group(1)), int(match.group(2))) if match else (0, 10)
+            if schema_type == "INTEGER":
+                return self._random.randint(low, high)
+            return round(self._random.uniform(low, high), 2)
+
+        choices = _CHOICES_PATTERN.search(description)
+        if choices:
+            return self._random.choice([c.strip() for c in choices.group(1).split(",")])
+        if "HH:MM" in description:
+            return f"{self._random.randint(9, 17):02d}:{self._random.choice([0, 15, 30, 45]):02d}"
+        if "url" in description.lower():
+            return f"https://example.com/mock/{self._random.randint(1, 1000)}"
+        return f"モック応答 {self._random.randint(1, 1000)}"
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from vertexai.generative_models import Part
+
+from utils.logger import Logger
+
+
+logger = Logger(name="response_cache").get_logger()
+
+
+class CachedResponse:
+    """キャッシュから返すレスポンス。呼び出し側は .text だけを参照する"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __repr__(self):
+        return f"CachedResponse(text={self.text[:100]!r})"
+
+
+def _update_digest(digest, value):
+    if isinstance(value, Part):
+        value = value.to_dict()
+    if isinstance(value, bytes):
+        digest.update(value)
+    elif isinstance(value, str):
+        digest.update(value.encode("utf-8"))
+    else:
+        digest.update(
+            json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode(
+                "utf-8"
+            )
+        )
+    # 要素の区切りを入れて ["ab", "c"] と ["a", "bc"] を区別する
+    digest.update(b"\x00")
+
+
+def make_cache_key(model_name: str, contents: list, response_scheme) -> str:
+    """
+    モデル名・プロンプト・画像・レスポンススキーマから安定したダイジェストを作る
+    """
+    digest = hashlib.sha256()
+    _update_digest(digest, model_name)
+    _update_digest(digest, response_scheme)
+    for content in contents:
+        _update_digest(digest, content)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    LLM レスポンスの2段キャッシュ。
+    - メモリ: LRU。エントリ数とバイト数の上限を超えたら古いものから追い出す
+    - ディスク (任意): disk_dir を指定した場合のみ。バイト数の上限を超えたら更新時刻の古い順に削除
+    エントリごとに有効期限 (TTL) を持つ。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 32 * 1024 * 1024,
+        disk_dir: str = None,
+        disk_max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, text)
+        self._memory_bytes = 0
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._evictions = {"memory": 0, "disk": 0}
+
+        self._disk_bytes = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_files())
+
+    # --- public ---
+
+    def get(self, key: str, namespace: str = "default"):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, text = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters[namespace]["memory_hits"] += 1
+                    return text
+                self._remove_memory(key)
+
+        text, expires_at = self._read_disk(key, now)
+        with self._lock:
+            if text is not None:
+                self._counters[namespace]["disk_hits"] += 1
+                self._put_memory(key, text, expires_at)
+                return text
+            self._counters[namespace]["misses"] += 1
+        return None
+
+    def set(self, key: str, text: str, ttl: float):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._put_memory(key, text, expires_at)
+        self._write_disk(key, text, expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        for path, _, _ in self._disk_files():
+            self._unlink(path)
+        with self._lock:
+            self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            namespaces = {}
+            for namespace, counters in self._counters.items():
+                hits = counters["memory_hits"] + counters["disk_hits"]
+                total = hits + counters["misses"]
+                namespaces[namespace] = {
+                    **counters,
+                    "hits": hits,
+                    "hit_rate": hits / total if total else None,
+                }
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes if self.disk_dir else None,
+                "evictions": dict(self._evictions),
+                "namespaces": namespaces,
+            }
+
+    # --- memory tier ---
+
+    def _put_memory(self, key: str, text: str, expires_at: float):
+        if key in self._memory:
+            self._remove_memory(key)
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self._memory[key] = (expires_at, text)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            oldest = next(iter(self._memory))
+            self._remove_memory(oldest)
+            self._evictions["memory"] += 1
+
+    def _remove_memory(self, key: str):
+        _, text = self._memory.pop(key)
+        self._memory_bytes -= len(text.encode("utf-8"))
+
+    # --- disk tier ---
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_files(self) -> list:
+        if not self.disk_dir:
+            return []
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((path, stat.st_mtime, stat.st_size))
+        return files
+
+    def _read_disk(self, key: str, now: float):
+        if not self.disk_dir:
+            return None, None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None, None
+        if entry["expires_at"] <= now:
+            freed = self._unlink(path)
+            with self._lock:
+                self._disk_bytes -= freed
+            return None, None
+        os.utime(path)  # LRU のために参照時刻を更新
+        return entry["text"], entry["expires_at"]
+
+    def _write_disk(self, key: str, text: str, expires_at: float):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "text": text}, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            # 同じキーを上書きする場合は古いファイルの分を差し引く
+            try:
+                old_size = os.path.getsize(path)
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {key}: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += size - old_size
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        files = sorted(self._disk_files(), key=lambda f: f[1])
+        total = sum(size for _, _, size in files)
+        for path, _, size in files:
+            if total <= self.disk_max_bytes * 0.9:
+                break
+            self._unlink(path)
+            total -= size
+            with self._lock:
+                self._evictions["disk"] += 1
+        with self._lock:
+            self._disk_bytes = total
+
+    def _unlink(self, path: str) -> int:
+        """ファイルを削除し、削除したバイト数を返す (すでになければ 0)"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return size
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512)),
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    disk_dir=os.getenv("LLM_CACHE_DIR") or None,
+    disk_max_bytes=int(os.getenv("LLM_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024)),
+)
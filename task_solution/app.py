@@ -3,12 +3,23 @@ import traceback # Ensure this import is present at the top of app.py
 from dotenv import load_dotenv
 import datetime
 from google.cloud import storage
-from flask import Flask, request, jsonify, session
+from flask import (
+    Flask,
+    Response,
+    g,
+    request,
+    jsonify,
+    send_from_directory,
+    session,
+    stream_with_context,
+)
 import json
+import time
 import uuid
+from urllib.parse import urljoin
 
 from services import (
-    upload_log_from_base64_screen_shot,
+    upload_log_from_frames,
     make_report_by_log,
     make_procedure_from_mp4,
     generate_notification_message,
@@ -20,10 +31,30 @@ from google.auth.transport import requests as grequests
 
 # Loggerクラスのインポート
 from utils.logger import Logger
-from services.firestore_service import firestore_service
+from services.firestore_service import firestore_service, InvalidPageTokenError, document_etag
+from services.job_queue import (
+    ingest_queue,
+    procedure_queue,
+    summary_queue,
+    JobQueueFullError,
+    JobStatus,
+)
+from services.upload_service import (
+    upload_service,
+    LocalUploadBackend,
+    UploadError,
+    UploadNotFoundError,
+)
+from utils.artifact_store import chart_store, ArtifactNotFoundError
+from utils.chart_renderer import chart_renderer, CONTENT_TYPES
+from utils.frame_processor import record_capture_stats
+from utils.metrics import registry, stage_seconds, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.request_decompression import RequestDecompressionMiddleware
 
 app = Flask(__name__)
 app.secret_key = "ThisIsHelloween"
+# Content-Encoding: gzip / zstd のボディは展開してから Flask に渡す
+app.wsgi_app = RequestDecompressionMiddleware(app.wsgi_app)
 logger = Logger(name="app").get_logger()
 
 # Load environment variables from .env file
@@ -44,6 +75,45 @@ else:
 storage_client = storage.Client()
 BUCKET_NAME = os.getenv("BUCKET_NAME")
 
+http_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests currently being handled", ("endpoint",)
+)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "Duration of HTTP requests",
+    ("endpoint", "method", "status"),
+)
+job_queue_depth = registry.gauge("job_queue_depth", "Jobs waiting in the queue", ("queue",))
+job_queue_running = registry.gauge("job_queue_running", "Jobs currently running", ("queue",))
+
+
+@app.before_request
+def start_request_metrics():
+    # ラベルはURLそのものではなくルールにして、種類が増えすぎないようにする
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_start = time.perf_counter()
+    http_in_flight.inc(endpoint=g.metrics_endpoint)
+
+
+@app.after_request
+def record_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    endpoint = g.pop("metrics_endpoint", None)
+    if endpoint is None:
+        return
+    http_in_flight.dec(endpoint=endpoint)
+    http_request_seconds.observe(
+        time.perf_counter() - g.metrics_start,
+        endpoint=endpoint,
+        method=request.method,
+        status=str(g.pop("metrics_status", 500)),
+    )
+
 
 # ヘルパー関数: 実効UIDを取得
 def get_effective_uid():
@@ -65,6 +135,31 @@ def get_effective_uid():
         return new_uuid
 
 
+def get_frames_request():
+    """
+    フレームを送るリクエストから (フレームのリスト, その他の項目, エラーレスポンス) を取り出す。
+    multipart/form-data では frames パートの画像バイト列を、JSON では data URL 文字列の配列を返す。
+    フレームがなければ None。ボディが multipart でも JSON オブジェクトでもなければエラーレスポンスを返す
+    """
+    if request.mimetype == "multipart/form-data":
+        # werkzeug はパートを順に読み、大きいものは一時ファイルに逃がすので本文全体は保持しない
+        frames = [part.read() for part in request.files.getlist("frames")]
+        return frames, request.form.to_dict(), None
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return None, None, (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "Request body must be multipart/form-data or a JSON object",
+                }
+            ),
+            400,
+        )
+    frames = data.get("frames")
+    return (frames if isinstance(frames, list) else None), data, None
+
+
 @app.route("/google_login", methods=["POST"])
 def google_login():
     try:
@@ -97,31 +192,83 @@ def google_login():
 
 @app.route("/record_frame", methods=["POST"])
 def record_frame():
+    """
+    フレーム配列を受け取り、解析・保存ジョブをキューに積んで即座に 202 を返す。
+    フレームは multipart の frames パート (JPEG のバイナリ) か、JSON の data URL 配列で受け取る。
+    進捗は /api/jobs/<job_id> で確認する。
+    """
     try:
         uid = get_effective_uid()
         logger.info(f"/record_frame リクエスト受信: uid={uid}")
 
-        data = request.json
+        frames, data, error = get_frames_request()
+        if error:
+            return error
 
-        if "frames" in data and isinstance(data["frames"], list):
-            base64_frames = data["frames"]
+        if frames is not None:
             user_request = data.get("user_request", "")
+            capture_stats = record_capture_stats(data.get("capture_stats"))
             wrapped_msg = (
-                f"フレーム配列受信: {len(base64_frames)}枚, uid={uid}, "
-                f"user_request='{user_request}'"
+                f"フレーム配列受信: {len(frames)}枚, uid={uid}, "
+                f"user_request='{user_request}', capture_stats={capture_stats}"
             )
             logger.info(wrapped_msg)
-            upload_log_from_base64_screen_shot(uid, user_request, base64_frames)
+            job = ingest_queue.submit(
+                upload_log_from_frames,
+                uid,
+                user_request,
+                frames,
+                owner=uid,
+            )
+            logger.info(f"フレーム記録ジョブ登録: uid={uid}, job_id={job.id}")
+            return (
+                jsonify(
+                    {
+                        "status": "accepted",
+                        "job_id": job.id,
+                        "metrics": ingest_queue.metrics(),
+                    }
+                ),
+                202,
+            )
 
         result = {"status": "success"}
         logger.info(f"フレーム記録成功: uid={uid}")
         return jsonify(result)
 
+    except JobQueueFullError as e:
+        logger.warning(f"フレーム記録キュー満杯: {str(e)}")
+        response = jsonify({"status": "error", "message": str(e)})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+
     except Exception as e:
         logger.error(f"フレーム記録失敗: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def api_get_job(job_id):
+    """
+    ジョブ状態取得API (queued / running / done / failed)
+    """
+    effective_uid = get_effective_uid()
+    job = ingest_queue.get_job(job_id)
+    if job is None or job.owner != effective_uid:
+        return jsonify({"status": "error", "message": "Not found"}), 404
+    return jsonify(
+        {"status": "success", "job": job.to_dict(), "metrics": ingest_queue.metrics()}
+    )
+
+
+@app.route("/api/jobs/metrics", methods=["GET"])
+def api_get_job_metrics():
+    """
+    キュー深さ・待ち時間・処理時間などのメトリクス取得API
+    """
+    return jsonify({"status": "success", "metrics": ingest_queue.metrics()})
+
+
 @app.route("/make_report", methods=["POST"])
 def make_report():
     try:
@@ -145,44 +292,128 @@ def make_report():
 
 @app.route("/create_procedure", methods=["POST"])
 def create_procedure():
+    """
+    手順書生成をバックグラウンドジョブとして受け付ける。
+    進捗は /api/procedures/jobs/<job_id>/events (SSE)、結果は .../result で取得する。
+    """
+    uid = get_effective_uid()  # session.get("google_uid") から変更
+    logger.info(f"/create_procedure リクエスト受信: uid={uid}")
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"status": "error", "message": "Request body must be a JSON object"}), 400
+    task_name = data.get("task_name", "")
+    video_url = data.get("video_url", "")
+    user_request = data.get("user_request", "")  # Extract user_request
     try:
-        # セッションからUIDを参照可能
-        uid = get_effective_uid()  # session.get("google_uid") から変更
-        logger.info(f"/create_procedure リクエスト受信: uid={uid}")
+        # 録画の長さ (秒)。長い動画は区間に分けて解析する
+        duration_seconds = float(data.get("duration_seconds") or 0) or None
+    except (TypeError, ValueError):
+        duration_seconds = None
+    logger.info(f"video_url: {video_url}, duration_seconds: {duration_seconds}")
+
+    if not video_url:
+        logger.error("手順書作成失敗")
+        return jsonify(
+            {"status": "error", "message": "No video_url provided to create procedure."}
+        ), 400
 
-        data = request.json
-        procedure = ""
-        task_name = data.get("task_name", "")
-        video_url = data.get("video_url", "")
-        user_request = data.get("user_request", "")  # Extract user_request
-        logger.info(f"video_url: {video_url}")
-
-        if video_url:
-            procedure = make_procedure_from_mp4(
-                uid,
-                video_url,
-                user_request,  # Pass user_request
-                task_name,
-            )
-            logger.info(f"手順書作成成功: \n{procedure}")
-            status = "success"
+    try:
+        job = procedure_queue.submit(
+            make_procedure_from_mp4,
+            uid,
+            video_url,
+            user_request,  # Pass user_request
+            task_name,
+            duration_seconds=duration_seconds,
+            owner=uid,
+        )
+    except JobQueueFullError as e:
+        logger.warning(f"手順書生成キューが満杯: {str(e)}")
+        response = jsonify({"status": "error", "message": "Server is busy"})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    return jsonify(
+        {
+            "status": "accepted",
+            "job_id": job.id,
+            "status_url": f"/api/procedures/jobs/{job.id}",
+            "result_url": f"/api/procedures/jobs/{job.id}/result",
+            "events_url": f"/api/procedures/jobs/{job.id}/events",
+        }
+    ), 202
 
-        else:
-            logger.error("手順書作成失敗")
-            status = "error"
 
-        result = {
-            "status": status,
-            "procedure": procedure,  # 生の文字列
-        }
-        if status == "error" and not video_url:
-            result["message"] = "No video_url provided to create procedure."
+def _get_procedure_job(job_id):
+    job = procedure_queue.get_job(job_id)
+    if job is None or job.owner != get_effective_uid():
+        return None
+    return job
 
-        return jsonify(result)  # Use jsonify for correct Content-Type header
 
-    except Exception as e:
-        logger.error(f"手順書作成失敗: {str(e)}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+@app.route("/api/procedures/jobs/<job_id>", methods=["GET"])
+def api_get_procedure_job(job_id):
+    job = _get_procedure_job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Not found"}), 404
+    return jsonify({"status": "success", "job": job.to_dict(include_result=False)})
+
+
+@app.route("/api/procedures/jobs/<job_id>/result", methods=["GET"])
+def api_get_procedure_job_result(job_id):
+    job = _get_procedure_job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Not found"}), 404
+    if job.status == JobStatus.FAILED:
+        return jsonify({"status": "error", "message": job.error}), 500
+    if job.status != JobStatus.DONE:
+        return jsonify({"status": "pending", "job": job.to_dict(include_result=False)}), 202
+    return jsonify({"status": "success", "procedure": job.result})
+
+
+@app.route("/api/procedures/jobs/<job_id>/events", methods=["GET"])
+def api_procedure_job_events(job_id):
+    """
+    ジョブの進捗を Server-Sent Events で配信する。完了または失敗で終了する
+    """
+    job = _get_procedure_job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Not found"}), 404
+
+    def generate():
+        version = -1
+        while True:
+            current = job.wait_for_update(version, timeout=15)
+            if current == version:
+                # プロキシに切断されないよう定期的にコメントを送る
+                yield ": keep-alive\n\n"
+                continue
+            version = current
+            payload = json.dumps(job.to_dict(include_result=False), ensure_ascii=False)
+            yield f"event: progress\ndata: {payload}\n\n"
+            if job.finished and job.finished_at is not None:
+                yield f"event: {job.status.value}\ndata: {payload}\n\n"
+                break
+
+    response = app.response_class(
+        stream_with_context(generate()), mimetype="text/event-stream"
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus 形式のメトリクス
+    """
+    for job_queue in (ingest_queue, procedure_queue, summary_queue):
+        queue_metrics = job_queue.metrics()
+        job_queue_depth.set(queue_metrics["queue_depth"], queue=job_queue.name)
+        job_queue_running.set(queue_metrics["running"], queue=job_queue.name)
+    return Response(registry.render(), content_type=METRICS_CONTENT_TYPE)
 
 
 @app.route("/check_login", methods=["GET"])
@@ -201,41 +432,93 @@ def index():
     return app.send_static_file("index.html")
 
 
+@app.route("/charts/<name>")
+def get_chart(name):
+    # ファイル名は内容のハッシュなので、同じ URL の中身は変わらない
+    try:
+        data = chart_store.get(name)
+    except ArtifactNotFoundError:
+        return jsonify({"status": "error", "message": "Chart not found"}), 404
+    ext = name.rsplit(".", 1)[-1]
+    response = app.response_class(
+        data, mimetype=CONTENT_TYPES.get(ext, "application/octet-stream")
+    )
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    response.headers["ETag"] = f'"{name}"'
+    return response
+
+
 # --- レポートAPI ---
 
 
 # --- 手順書API ---
+def _parse_page() -> int:
+    try:
+        page = int(request.args.get("page", 1))
+    except ValueError:
+        page = 1
+    return max(page, 1)
+
+
+def _parse_page_size() -> int:
+    try:
+        page_size = int(request.args.get("page_size", 10))
+    except ValueError:
+        page_size = 10
+    if page_size < 1:
+        page_size = 10  # Default to 10 if invalid
+    return min(page_size, 100)
+
+
 @app.route("/api/procedures", methods=["GET"])
 def api_get_procedures():
     """
     手順書一覧取得API
-    レポート一覧と同様に、ページングを受け取り手順書一覧を返却します。
+    レポート一覧と同様に、page_token でページングして手順書一覧を返却します。
     """
     # 実効UIDを取得する
     effective_uid = get_effective_uid()
     logger.info(f"GET /api/procedures called. effective_uid={effective_uid}")
+    page_size = _parse_page_size()
+    if "page" in request.args and "page_token" not in request.args:
+        # 旧クライアント向けのページ番号指定 (offset)
+        page = _parse_page()
+        procedures = firestore_service.get_procedures(effective_uid, page, page_size)
+        return jsonify({"status": "success", "procedures": procedures})
+
     try:
-        page = int(request.args.get("page", 1))
-        if page < 1:
-            page = 1
-    except ValueError:
-        page = 1
-    page_size = int(request.args.get("page_size", 10))
-    if page_size < 1:
-        page_size = 10  # Default to 10 if invalid
-    logger.info(
-        logger.info(
-            "Fetching procedures for user: %s page=%d, page_size=%d",
+        procedures, next_page_token = firestore_service.list_procedures(
             effective_uid,
-            page,
             page_size,
+            page_token=request.args.get("page_token") or None,
+            summary=request.args.get("fields", "summary") != "full",
         )
-    )
-    procedures = firestore_service.get_procedures(
-        effective_uid, page, page_size
-    )  # このメソッドをfirestore_service側で定義
+    except InvalidPageTokenError:
+        return jsonify({"status": "error", "message": "Invalid page_token"}), 400
     logger.info(f"Returning {len(procedures)} procedures.")
-    return jsonify({"status": "success", "procedures": procedures})
+    result = {
+        "status": "success",
+        "procedures": procedures,
+        "next_page_token": next_page_token,
+    }
+    if request.args.get("include_total") in ("1", "true"):
+        result["total"] = firestore_service.count_procedures(effective_uid)
+    return jsonify(result)
+
+
+def _conditional_json(payload: dict, etag: str):
+    """
+    If-None-Match が ETag と一致すれば本文なしの 304 を返す。
+    詳細はキャッシュから返るので、一致した場合は Firestore を読まずに済む
+    """
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    # ブラウザにも保存させるが、使う前に毎回 ETag で再検証させる
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
 
 @app.route("/api/procedures/<procedure_id>", methods=["GET"])
@@ -253,7 +536,10 @@ def api_get_procedure(procedure_id):
         effective_uid, procedure_id
     )  # このメソッドをfirestore_service側で定義
     if procedure:
-        return jsonify({"status": "success", "procedure": procedure})
+        return _conditional_json(
+            {"status": "success", "procedure": procedure},
+            document_etag(procedure_id, procedure.get("updated_at")),
+        )
     else:
         return jsonify({"status": "error", "message": "Not found"}), 404
 
@@ -365,20 +651,38 @@ def api_delete_procedure(procedure_id):
 
 @app.route("/api/reports", methods=["GET"])
 def api_get_reports():
+    """
+    レポート一覧取得API
+    page_token で続きのページを取得する (レスポンスの next_page_token を渡す)。
+    fields=full で本文も返し、include_total=1 で総件数も返す。
+    """
     effective_uid = get_effective_uid()  # 実効UIDを取得
     logger.info(f"GET /api/reports called. effective_uid={effective_uid}")
+    page_size = _parse_page_size()
+    if "page" in request.args and "page_token" not in request.args:
+        # 旧クライアント向けのページ番号指定 (offset)
+        page = _parse_page()
+        logger.info(f"get_reports: uid={effective_uid} page={page} page_size={page_size}")
+        reports = firestore_service.get_reports(effective_uid, page, page_size)
+        return jsonify({"status": "success", "reports": reports})
+
     try:
-        page = int(request.args.get("page", 1))
-        if page < 1:
-            page = 1
-    except ValueError:
-        page = 1
-    page_size = int(request.args.get("page_size", 10))
-    if page_size < 1:
-        page_size = 10  # Default to 10 if invalid
-    logger.info(f"get_reports: uid={effective_uid} page={page} page_size={page_size}")
-    reports = firestore_service.get_reports(effective_uid, page, page_size)
-    return jsonify({"status": "success", "reports": reports})
+        reports, next_page_token = firestore_service.list_reports(
+            effective_uid,
+            page_size,
+            page_token=request.args.get("page_token") or None,
+            summary=request.args.get("fields", "summary") != "full",
+        )
+    except InvalidPageTokenError:
+        return jsonify({"status": "error", "message": "Invalid page_token"}), 400
+    result = {
+        "status": "success",
+        "reports": reports,
+        "next_page_token": next_page_token,
+    }
+    if request.args.get("include_total") in ("1", "true"):
+        result["total"] = firestore_service.count_reports(effective_uid)
+    return jsonify(result)
 
 
 @app.route("/api/reports/<report_id>", methods=["GET"])
@@ -391,7 +695,10 @@ def api_get_report(report_id):
     logger.info(wrapped_report_msg)
     report = firestore_service.get_report(effective_uid, report_id)
     if report:
-        return jsonify({"status": "success", "report": report})
+        return _conditional_json(
+            {"status": "success", "report": report},
+            document_etag(report_id, report.get("updated_at")),
+        )
     else:
         return jsonify({"status": "error", "message": "Not found"}), 404
 
@@ -403,8 +710,7 @@ def api_create_report():
     data = request.json
     title = data.get("title", "")
     content = data.get("content", "")
-    date = data.get("date", "")
-    report = firestore_service.create_report(effective_uid, title, content, date)
+    report = firestore_service.create_report(effective_uid, title, content)
     return jsonify({"status": "success", "report": report})
 
 
@@ -435,6 +741,110 @@ def api_delete_report(report_id):
     return jsonify({"status": "success"})
 
 
+# --- 一括操作API ---
+# 結果は項目ごとに status (ok / not_found / deleted / created / error) を返す
+BATCH_MAX_ITEMS = 500
+
+
+def _batch_ids(key: str):
+    """リクエストボディから ID のリストを取り出す。不正なら (None, エラーレスポンス)"""
+    ids = (request.get_json(silent=True) or {}).get(key)
+    if not isinstance(ids, list) or not all(isinstance(i, str) and i for i in ids):
+        return None, (
+            jsonify({"status": "error", "message": f"'{key}' must be a list of strings"}),
+            400,
+        )
+    if len(ids) > BATCH_MAX_ITEMS:
+        return None, (
+            jsonify({"status": "error", "message": f"Too many items (max {BATCH_MAX_ITEMS})"}),
+            400,
+        )
+    return ids, None
+
+
+def _batch_documents(key: str, fields: list):
+    documents = (request.get_json(silent=True) or {}).get(key)
+    if not isinstance(documents, list) or not all(
+        isinstance(d, dict) and all(isinstance(d.get(f), str) for f in fields)
+        for d in documents
+    ):
+        return None, (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": f"'{key}' must be a list of objects with {', '.join(fields)}",
+                }
+            ),
+            400,
+        )
+    if len(documents) > BATCH_MAX_ITEMS:
+        return None, (
+            jsonify({"status": "error", "message": f"Too many items (max {BATCH_MAX_ITEMS})"}),
+            400,
+        )
+    return documents, None
+
+
+@app.route("/api/reports/batch_get", methods=["POST"])
+def api_batch_get_reports():
+    effective_uid = get_effective_uid()
+    ids, error = _batch_ids("ids")
+    if error:
+        return error
+    results = firestore_service.batch_get_reports(effective_uid, ids)
+    return jsonify({"status": "success", "results": results})
+
+
+@app.route("/api/reports/batch_delete", methods=["POST"])
+def api_batch_delete_reports():
+    effective_uid = get_effective_uid()
+    ids, error = _batch_ids("ids")
+    if error:
+        return error
+    results = firestore_service.batch_delete_reports(effective_uid, ids)
+    return jsonify({"status": "success", "results": results})
+
+
+@app.route("/api/reports/batch_import", methods=["POST"])
+def api_batch_import_reports():
+    effective_uid = get_effective_uid()
+    reports, error = _batch_documents("reports", ["title", "content"])
+    if error:
+        return error
+    results = firestore_service.batch_import_reports(effective_uid, reports)
+    return jsonify({"status": "success", "results": results})
+
+
+@app.route("/api/procedures/batch_get", methods=["POST"])
+def api_batch_get_procedures():
+    effective_uid = get_effective_uid()
+    task_names, error = _batch_ids("task_names")
+    if error:
+        return error
+    results = firestore_service.batch_get_procedures(effective_uid, task_names)
+    return jsonify({"status": "success", "results": results})
+
+
+@app.route("/api/procedures/batch_delete", methods=["POST"])
+def api_batch_delete_procedures():
+    effective_uid = get_effective_uid()
+    task_names, error = _batch_ids("task_names")
+    if error:
+        return error
+    results = firestore_service.batch_delete_procedures(effective_uid, task_names)
+    return jsonify({"status": "success", "results": results})
+
+
+@app.route("/api/procedures/batch_import", methods=["POST"])
+def api_batch_import_procedures():
+    effective_uid = get_effective_uid()
+    procedures, error = _batch_documents("procedures", ["task_name", "content"])
+    if error:
+        return error
+    results = firestore_service.batch_import_procedures(effective_uid, procedures)
+    return jsonify({"status": "success", "results": results})
+
+
 @app.route("/api/notify_support", methods=["POST"])
 def notify_support():
     """
@@ -444,13 +854,12 @@ def notify_support():
         uid = get_effective_uid()
         logger.info(f"POST /api/notify_support called by uid={uid}")
 
-        # フレームデータをリクエストボディのJSONから取得
-        frames = []
-        log_context = ""  # Default value
-
-        if request.json:
-            frames = request.json.get("frames", [])
-            log_context = request.json.get("log_context", "")  # Retrieve log_context
+        # フレームデータをリクエストボディ (multipart または JSON) から取得
+        frames, data, error = get_frames_request()
+        if error:
+            return error
+        frames = frames or []
+        log_context = data.get("log_context", "")
 
         if not frames:
             logger.info("No frames received in the request.")
@@ -505,7 +914,8 @@ def upload_video():
 
             logger.info(f"Uploading video '{filename}' to GCS bucket '{BUCKET_NAME}'.")
             # Upload the file
-            blob.upload_from_file(file.stream, content_type=file.content_type)
+            with stage_seconds.time(stage="gcs_upload"):
+                blob.upload_from_file(file.stream, content_type=file.content_type)
 
             blob.make_public()
 
@@ -532,9 +942,97 @@ def upload_video():
         return jsonify({"status": "error", "message": "Invalid file"}), 400
 
 
+# --- 分割アップロードAPI ---
+# POST /api/uploads で開始し、チャンクを PUT してから complete を呼ぶ。
+# 失敗したら GET /api/uploads/<id> の missing_chunks から再開できる。
+
+
+@app.route("/api/uploads", methods=["POST"])
+def api_init_upload():
+    effective_uid = get_effective_uid()
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = upload_service.init_upload(
+            effective_uid,
+            filename=data.get("filename", ""),
+            size=data.get("size"),
+            content_type=data.get("content_type", ""),
+        )
+    except UploadError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "upload": upload}), 201
+
+
+@app.route("/api/uploads/<upload_id>/chunks/<int:index>", methods=["PUT"])
+def api_put_upload_chunk(upload_id, index):
+    effective_uid = get_effective_uid()
+    if request.content_length and request.content_length > upload_service.chunk_size:
+        return jsonify({"status": "error", "message": "Chunk too large"}), 413
+    try:
+        # request.stream をそのまま渡し、チャンク全体をメモリやテンポラリに溜めない
+        upload = upload_service.put_chunk(
+            effective_uid,
+            upload_id,
+            index,
+            request.stream,
+            request.headers.get("X-Chunk-SHA256", ""),
+        )
+    except UploadNotFoundError:
+        return jsonify({"status": "error", "message": "Upload not found"}), 404
+    except UploadError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "upload": upload})
+
+
+@app.route("/api/uploads/<upload_id>", methods=["GET"])
+def api_get_upload(upload_id):
+    effective_uid = get_effective_uid()
+    try:
+        upload = upload_service.progress(effective_uid, upload_id)
+    except UploadNotFoundError:
+        return jsonify({"status": "error", "message": "Upload not found"}), 404
+    return jsonify({"status": "success", "upload": upload})
+
+
+@app.route("/api/uploads/<upload_id>/complete", methods=["POST"])
+def api_complete_upload(upload_id):
+    effective_uid = get_effective_uid()
+    try:
+        result = upload_service.complete(effective_uid, upload_id)
+    except UploadNotFoundError:
+        return jsonify({"status": "error", "message": "Upload not found"}), 404
+    except UploadError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error completing upload {upload_id}: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    # ローカル保存の URL は相対パスなので、このサーバーの絶対 URL にする (GCS の URL はそのまま)
+    result["video_url"] = urljoin(request.host_url, result["video_url"])
+    return jsonify({"status": "success", **result})
+
+
+@app.route("/uploads/<path:name>", methods=["GET"])
+def get_uploaded_video(name):
+    """
+    UPLOAD_BACKEND=local で結合した動画を配信する (GCS のときは公開 URL を直接使うので 404)
+    """
+    backend = upload_service.backend
+    if not isinstance(backend, LocalUploadBackend) or name.startswith(upload_service.prefix):
+        return jsonify({"status": "error", "message": "Not found"}), 404
+    return send_from_directory(backend.root, name)
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
     logger.info(f"Flaskアプリ起動 on port {port}")
-    app.run(host="0.0.0.0", port=port)
+    # グラフ用フォントはリクエスト中に探さないよう起動時に解決しておく
+    chart_renderer.warm_up()
+    # async: 推論待ちの長いルートを async ハンドラで処理する (Hypercorn)。既定はスレッド
+    if os.getenv("SERVING_MODE", "threaded").lower() == "async":
+        from async_app import serve
+
+        serve(app, port)
+    else:
+        app.run(host="0.0.0.0", port=port)
 
 # Removed duplicate block
@@ -0,0 +1,388 @@
+"""
+SERVING_MODE=async で起動したときの ASGI サーバー (Hypercorn)。
+
+モデルの応答待ちが長い /api/notify_support・/record_frame・/make_report は async ハンドラで
+処理し、応答を待つ間もスレッドを占有しない。それ以外のルートはこれまでどおり Flask アプリに
+WSGI で渡す (スレッドプール上で実行される)。セッションは Flask と同じ署名付き Cookie を読み書き
+するので、どちらのルートでも同じユーザーとして扱われる。
+
+    SERVING_MODE=async python app.py
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from hypercorn.asyncio import serve as hypercorn_serve
+from hypercorn.config import Config
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from itsdangerous import BadSignature
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import dump_cookie, parse_cookie, parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from services import (
+    agenerate_notification_message,
+    amake_report_by_log,
+    aupload_log_from_frames,
+)
+from services.job_queue import ingest_queue, JobQueueFullError
+from utils.frame_processor import record_capture_stats
+from utils.logger import Logger
+from utils.metrics import registry
+from utils.request_decompression import (
+    DecompressedBodyTooLarge,
+    InvalidEncodedBody,
+    MAX_DECOMPRESSED_BYTES,
+    content_encoding,
+    make_decoder,
+    record_decode_error,
+    record_decoded_body,
+)
+
+
+logger = Logger(name="async_app").get_logger()
+
+# リクエストボディの上限 (WSGI に渡すルートも含む。動画アップロードを受けられる大きさにする)
+ASYNC_MAX_BODY_BYTES = int(os.getenv("ASYNC_MAX_BODY_BYTES", 512 * 1024 * 1024))
+# multipart のパート数と、ファイル以外の項目 (user_request など) の大きさの上限
+MAX_FORM_PARTS = int(os.getenv("MAX_FORM_PARTS", 1000))
+MAX_FORM_FIELD_BYTES = int(os.getenv("MAX_FORM_FIELD_BYTES", 500 * 1024))
+
+# app.py と同じメトリクス (レジストリから同じインスタンスが返る)
+http_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests currently being handled", ("endpoint",)
+)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "Duration of HTTP requests",
+    ("endpoint", "method", "status"),
+)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class AsyncRequest:
+    """
+    async ハンドラに渡すリクエスト。ボディは読み込み済み
+    (multipart の場合は form / files に分解済みで、body は空)
+    """
+
+    def __init__(self, scope: dict, body: bytes, session, form: dict = None,
+                 files: dict = None):
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.body = body
+        self.session = session
+        self.form = form or {}
+        self.files = files or {}
+        self._json = None
+
+    @property
+    def json(self):
+        if self._json is None and self.body:
+            try:
+                self._json = json.loads(self.body)
+            except ValueError:
+                raise HTTPError(400, "Invalid JSON body")
+        return self._json
+
+    def frames_and_fields(self):
+        """app.get_frames_request と同じく (フレームのリスト, その他の項目) を返す"""
+        mimetype, _ = parse_options_header(_header(self.scope, b"content-type"))
+        if mimetype == "multipart/form-data":
+            return self.files.get("frames", []), self.form
+        data = self.json if self.body else None
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Request body must be multipart/form-data or a JSON object")
+        frames = data.get("frames")
+        return (frames if isinstance(frames, list) else None), data
+
+    def effective_uid(self) -> str:
+        """app.get_effective_uid と同じ規則で実効UIDを決める"""
+        if "google_uid" in self.session:
+            return self.session["google_uid"]
+        if "session_uuid" in self.session:
+            return self.session["session_uuid"]
+        new_uuid = str(uuid.uuid4())
+        self.session["session_uuid"] = new_uuid
+        logger.info(f"Generated new session_uuid: {new_uuid}")
+        return new_uuid
+
+
+async def notify_support(request: AsyncRequest):
+    uid = request.effective_uid()
+    logger.info(f"POST /api/notify_support called by uid={uid}")
+
+    frames, data = request.frames_and_fields()
+    log_context = data.get("log_context", "")
+    if not frames:
+        logger.info("No frames received in the request.")
+        return {"status": "no_frames", "notification_message": ""}, 200, {}
+
+    logger.info(
+        f"Received {len(frames)} frames and log_context: '{log_context[:100]}...' for AI support."
+    )
+    message = await agenerate_notification_message(frames, log_context)
+    if message:
+        return {"status": "success", "notification_message": message}, 200, {}
+    return {"status": "no_support_needed", "notification_message": ""}, 200, {}
+
+
+async def record_frame(request: AsyncRequest):
+    uid = request.effective_uid()
+    logger.info(f"/record_frame リクエスト受信: uid={uid}")
+
+    frames, data = request.frames_and_fields()
+    if frames is None:
+        return {"status": "success"}, 200, {}
+
+    user_request = data.get("user_request", "")
+    capture_stats = record_capture_stats(data.get("capture_stats"))
+    logger.info(
+        f"フレーム配列受信: {len(frames)}枚, uid={uid}, user_request='{user_request}', "
+        f"capture_stats={capture_stats}"
+    )
+    try:
+        job = ingest_queue.submit_async(
+            aupload_log_from_frames,
+            uid,
+            user_request,
+            frames,
+            owner=uid,
+        )
+    except JobQueueFullError as e:
+        logger.warning(f"フレーム記録キュー満杯: {str(e)}")
+        return {"status": "error", "message": str(e)}, 503, {"Retry-After": "5"}
+
+    logger.info(f"フレーム記録ジョブ登録: uid={uid}, job_id={job.id}")
+    return (
+        {"status": "accepted", "job_id": job.id, "metrics": ingest_queue.metrics()},
+        202,
+        {},
+    )
+
+
+async def make_report(request: AsyncRequest):
+    uid = request.effective_uid()
+    logger.info(f"/make_report リクエスト受信: uid={uid}")
+    report = await amake_report_by_log(uid)
+    logger.info(f"レポート生成成功: uid={uid}")
+    return {"status": "success", "report": report}, 200, {}
+
+
+ROUTES = {
+    ("POST", "/api/notify_support"): notify_support,
+    ("POST", "/record_frame"): record_frame,
+    ("POST", "/make_report"): make_report,
+}
+
+
+class AsyncServingApp:
+    """ROUTES にあるリクエストは async ハンドラで、それ以外は Flask アプリで処理する ASGI アプリ"""
+
+    def __init__(self, flask_app, routes: dict = None):
+        self.flask_app = flask_app
+        self.routes = ROUTES if routes is None else routes
+        self.wsgi = AsyncioWSGIMiddleware(flask_app, max_body_size=ASYNC_MAX_BODY_BYTES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        handler = None
+        if scope["type"] == "http":
+            handler = self.routes.get((scope["method"], scope["path"]))
+        if handler is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        endpoint = scope["path"]
+        start = time.perf_counter()
+        status = 500
+        http_in_flight.inc(endpoint=endpoint)
+        try:
+            status = await self._handle(handler, scope, receive, send)
+        finally:
+            http_in_flight.dec(endpoint=endpoint)
+            http_request_seconds.observe(
+                time.perf_counter() - start,
+                endpoint=endpoint,
+                method=scope["method"],
+                status=str(status),
+            )
+
+    async def _handle(self, handler, scope, receive, send) -> int:
+        headers = {}
+        session = None
+        try:
+            session = self._open_session(scope)
+            request = await _read_request(scope, receive, session, ASYNC_MAX_BODY_BYTES)
+            payload, status, headers = await handler(request)
+        except HTTPError as e:
+            payload, status = {"status": "error", "message": str(e)}, e.status
+        except Exception as e:
+            logger.error(f"{scope['path']} エラー: {str(e)}")
+            payload, status = {"status": "error", "message": str(e)}, 500
+
+        response_headers = [
+            (b"content-type", b"application/json"),
+            *[(k.lower().encode(), str(v).encode()) for k, v in headers.items()],
+        ]
+        if session is not None and session.modified:
+            response_headers.append((b"set-cookie", self._session_cookie(session).encode()))
+        await send(
+            {"type": "http.response.start", "status": status, "headers": response_headers}
+        )
+        await send(
+            {"type": "http.response.body", "body": self.flask_app.json.dumps(payload).encode()}
+        )
+        return status
+
+    def _open_session(self, scope):
+        """Flask の SecureCookieSessionInterface.open_session と同じ方法で Cookie を読む"""
+        interface = self.flask_app.session_interface
+        serializer = interface.get_signing_serializer(self.flask_app)
+        cookie_header = b"; ".join(
+            value for name, value in scope["headers"] if name == b"cookie"
+        ).decode("latin-1")
+        value = parse_cookie(cookie_header).get(interface.get_cookie_name(self.flask_app))
+        if not value or serializer is None:
+            return interface.session_class()
+        max_age = int(self.flask_app.permanent_session_lifetime.total_seconds())
+        try:
+            return interface.session_class(serializer.loads(value, max_age=max_age))
+        except BadSignature:
+            return interface.session_class()
+
+    def _session_cookie(self, session) -> str:
+        app = self.flask_app
+        interface = app.session_interface
+        return dump_cookie(
+            interface.get_cookie_name(app),
+            interface.get_signing_serializer(app).dumps(dict(session)),
+            expires=interface.get_expiration_time(app, session),
+            domain=interface.get_cookie_domain(app),
+            path=interface.get_cookie_path(app),
+            secure=interface.get_cookie_secure(app),
+            httponly=interface.get_cookie_httponly(app),
+            samesite=interface.get_cookie_samesite(app),
+        )
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _header(scope, name: bytes) -> str:
+    return b"".join(value for key, value in scope["headers"] if key == name).decode("latin-1")
+
+
+async def _read_request(scope, receive, session, limit: int) -> AsyncRequest:
+    mimetype, options = parse_options_header(_header(scope, b"content-type"))
+    body = _receive_body(receive, limit)
+    encoding = content_encoding(_header(scope, b"content-encoding"))
+    if encoding:
+        body = _decode_body(body, encoding)
+    if mimetype == "multipart/form-data" and options.get("boundary"):
+        form, files = await _read_multipart(body, options["boundary"].encode("latin-1"))
+        return AsyncRequest(scope, b"", session, form=form, files=files)
+    chunks = [chunk async for chunk in body]
+    return AsyncRequest(scope, b"".join(chunks), session)
+
+
+async def _receive_body(receive, limit: int):
+    """ボディを届いた順にチャンクで返す。limit を超えたら 413"""
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "Client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            raise HTTPError(413, f"Request body exceeds {limit} bytes")
+        yield chunk
+        if not message.get("more_body", False):
+            return
+
+
+async def _decode_body(chunks, encoding: str):
+    """
+    Content-Encoding: gzip / zstd のボディを届いた順に展開して返す
+    (WSGI 側の RequestDecompressionMiddleware と同じ上限で、超えたら 413)
+    """
+    decoder = make_decoder(encoding)
+    if decoder is None:
+        raise HTTPError(415, f"Unsupported Content-Encoding: {encoding}")
+    start = time.perf_counter()
+    wire_bytes = decoded_bytes = 0
+    try:
+        async for chunk in chunks:
+            wire_bytes += len(chunk)
+            data = decoder.feed(chunk)
+            decoded_bytes += len(data)
+            yield data
+        data = decoder.finish()
+    except DecompressedBodyTooLarge as e:
+        record_decode_error(encoding, e)
+        raise HTTPError(413, f"Decompressed body exceeds {MAX_DECOMPRESSED_BYTES} bytes")
+    except InvalidEncodedBody as e:
+        record_decode_error(encoding, e)
+        raise HTTPError(400, str(e))
+    record_decoded_body(
+        encoding, wire_bytes, decoded_bytes + len(data), time.perf_counter() - start
+    )
+    yield data
+
+
+async def _read_multipart(chunks, boundary: bytes) -> tuple[dict, dict]:
+    """
+    multipart/form-data をチャンクが届くたびに少しずつ分解する (本文全体を一度に持たない)。
+    :return: (項目名 -> 文字列, ファイル名 -> バイト列のリスト)
+    """
+    decoder = MultipartDecoder(boundary, max_parts=MAX_FORM_PARTS)
+    form, files = {}, {}
+    part, data = None, []
+    try:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                decoder.receive_data(await anext(chunks, None))
+            elif isinstance(event, (Field, File)):
+                part, data = event, []
+            elif isinstance(event, Data):
+                data.append(event.data)
+                if isinstance(part, Field) and sum(map(len, data)) > MAX_FORM_FIELD_BYTES:
+                    raise HTTPError(413, f"Form field {part.name} is too large")
+                if not event.more_data:
+                    value = b"".join(data)
+                    if isinstance(part, File):
+                        files.setdefault(part.name, []).append(value)
+                    else:
+                        form[part.name] = value.decode("utf-8", "replace")
+            elif isinstance(event, Epilogue):
+                return form, files
+    except RequestEntityTooLarge:
+        raise HTTPError(413, f"Too many form parts (max {MAX_FORM_PARTS})")
+    except ValueError as e:
+        raise HTTPError(400, f"Invalid multipart body: {e}")
+
+
+def serve(flask_app, port: int):
+    config = Config()
+    config.bind = [f"0.0.0.0:{port}"]
+    logger.info(f"async サーバー起動 on port {port}")
+    asyncio.run(hypercorn_serve(AsyncServingApp(flask_app), config))
@@ -0,0 +1,117 @@
+"""
+リクエストごとにエージェントを生成する場合と、レジストリで共有する場合の準備コストを比較するベンチマーク。
+
+1 リクエスト分の準備 (エージェント取得 + model の取得) を繰り返し、1 回あたりの時間を計測する。
+legacy は変更前の挙動 (毎回 vertexai.init・GenerativeModel 生成・一時ディレクトリ作成) を再現したもの。
+Vertex への呼び出しは行わない。
+
+    cd task_solution
+    python -m benchmarks.bench_agent_registry --iterations 200
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import vertexai
+from vertexai.generative_models import GenerativeModel
+
+# vertexai.init はプロジェクトを解決できないと認証情報を探しに行くので、計測用に仮の値を入れる
+os.environ.setdefault("GCP_PROJECT", "benchmark")
+
+from agents import (  # noqa: E402
+    NotifyDesider,
+    ReportMaker,
+    ScreenAnalyzer,
+    TaskSupporter,
+    clear_agents,
+    get_agent,
+)
+from agents.report_maker import TaskTypeExtractor, TimeTableMaker  # noqa: E402
+
+AGENT_CLASSES = [
+    ScreenAnalyzer,
+    TaskSupporter,
+    NotifyDesider,
+    ReportMaker,
+    TaskTypeExtractor,
+    TimeTableMaker,
+]
+
+
+def legacy(agent_cls):
+    vertexai.init(
+        project=os.getenv("GCP_PROJECT"),
+        location=os.getenv("GCP_LOCATION", "us-central1"),
+    )
+    agent = agent_cls()
+    if agent_cls in (ScreenAnalyzer, TaskSupporter):
+        tempfile.TemporaryDirectory().cleanup()
+    return GenerativeModel(agent.model_name)
+
+
+def per_request(agent_cls):
+    agent = agent_cls()
+    return agent.model
+
+
+def pooled(agent_cls):
+    agent = get_agent(agent_cls)
+    return agent.model
+
+
+def measure(func, agent_cls, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func(agent_cls)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "mean_us": statistics.mean(samples) * 1e6,
+        "p95_us": samples[int(len(samples) * 0.95) - 1] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", help="結果を JSON で書き出すパス")
+    args = parser.parse_args()
+
+    clear_agents()
+    results = []
+    print(
+        f"{'agent':<18} {'legacy':>12} {'per-request':>12} {'pooled':>10} "
+        f"{'saved/request':>14}"
+    )
+    for agent_cls in AGENT_CLASSES:
+        before = measure(legacy, agent_cls, args.iterations)
+        fresh = measure(per_request, agent_cls, args.iterations)
+        shared = measure(pooled, agent_cls, args.iterations)
+        saved = before["mean_us"] - shared["mean_us"]
+        results.append(
+            {
+                "agent": agent_cls.__name__,
+                "legacy": before,
+                "per_request": fresh,
+                "pooled": shared,
+                "saved_us": saved,
+            }
+        )
+        print(
+            f"{agent_cls.__name__:<18} {before['mean_us']:>9.1f} us "
+            f"{fresh['mean_us']:>9.1f} us {shared['mean_us']:>7.1f} us "
+            f"{saved:>11.1f} us"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"iterations": args.iterations, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+FirestoreService.upload_log の追記コストが 1 日のログ量に対して一定であることを確認するベンチマーク。
+
+旧実装 (ドキュメントの logs 配列を読み込んで丸ごと書き戻す) と現在の追記専用レイアウトを
+同じ件数だけ追記し、区間ごとの追記レイテンシと 1 件あたりの書き込みバイト数を比較する。
+
+    cd task_solution
+    python -m benchmarks.bench_log_append --entries 5000 --bucket 500
+
+FIRESTORE_EMULATOR_HOST が設定されていて --backend emulator を指定した場合は
+Firestore エミュレータに対して計測する (その場合バイト数は計測しない)。
+"""
+
+import argparse
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+from benchmarks.fake_firestore import FakeFirestoreClient
+from services.firestore_service import FirestoreService
+
+
+def legacy_upload_log(db, uid: str, log_data: str):
+    """変更前の upload_log (read-modify-write) の再現"""
+    today_str = datetime.now().strftime("%Y-%m-%d")
+    doc_ref = db.collection("users").document(uid).collection("logs").document(today_str)
+    doc = doc_ref.get()
+    if doc.exists:
+        logs = doc.to_dict().get("logs", [])
+        logs.append(log_data)
+        doc_ref.update({"logs": logs, "updated_at": datetime.now()})
+    else:
+        doc_ref.set(
+            {
+                "logs": [log_data],
+                "created_at": datetime.now(),
+                "updated_at": datetime.now(),
+            }
+        )
+
+
+def make_client(backend: str):
+    if backend == "emulator":
+        from google.cloud import firestore
+
+        return firestore.Client()
+    return FakeFirestoreClient()
+
+
+def run_layout(layout: str, backend: str, entries: int, bucket: int, entry_size: int):
+    db = make_client(backend)
+    service = FirestoreService()
+    service.db = db
+    uid = f"bench-{layout}-{uuid.uuid4().hex[:8]}"
+    payload = "x" * entry_size
+
+    buckets = []
+    latencies = []
+    bytes_before = getattr(getattr(db, "stats", None), "bytes_written", 0)
+    for i in range(entries):
+        log_data = f"{datetime.now():%Y-%m-%d %H:%M:%S}: #{i} {payload}"
+        start = time.perf_counter()
+        if layout == "legacy":
+            legacy_upload_log(db, uid, log_data)
+        else:
+            service.upload_log(uid, log_data)
+        latencies.append(time.perf_counter() - start)
+
+        if (i + 1) % bucket == 0:
+            stats = getattr(db, "stats", None)
+            bytes_now = stats.bytes_written if stats else 0
+            buckets.append(
+                {
+                    "entries": i + 1,
+                    "mean_ms": statistics.mean(latencies) * 1000,
+                    "p95_ms": sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000,
+                    "bytes_per_append": (bytes_now - bytes_before) / len(latencies)
+                    if stats
+                    else None,
+                }
+            )
+            latencies = []
+            bytes_before = bytes_now
+
+    start = time.perf_counter()
+    if layout == "legacy":
+        doc = (
+            db.collection("users")
+            .document(uid)
+            .collection("logs")
+            .document(datetime.now().strftime("%Y-%m-%d"))
+            .get()
+        )
+        downloaded = len(doc.to_dict().get("logs", []))
+    else:
+        downloaded = len(service.download_log_entries(uid))
+    download_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "layout": layout,
+        "buckets": buckets,
+        "download_ms": download_ms,
+        "downloaded_entries": downloaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--bucket", type=int, default=500)
+    parser.add_argument("--entry-size", type=int, default=400)
+    parser.add_argument("--backend", choices=["fake", "emulator"], default="fake")
+    parser.add_argument("--output", help="結果を JSON で書き出すパス")
+    args = parser.parse_args()
+
+    results = [
+        run_layout(layout, args.backend, args.entries, args.bucket, args.entry_size)
+        for layout in ("legacy", "append_only")
+    ]
+
+    for result in results:
+        print(f"\n[{result['layout']}] download {result['downloaded_entries']} entries "
+              f"in {result['download_ms']:.1f} ms")
+        print(f"{'entries':>8} {'mean_ms':>9} {'p95_ms':>9} {'bytes/append':>13}")
+        for b in result["buckets"]:
+            bytes_per_append = (
+                f"{b['bytes_per_append']:13.0f}" if b["bytes_per_append"] is not None else f"{'-':>13}"
+            )
+            print(f"{b['entries']:8d} {b['mean_ms']:9.3f} {b['p95_ms']:9.3f} {bytes_per_append}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+/record_frame のボディを圧縮したときの転送量と、取り込み完了までの時間を比べるベンチマーク。
+
+送り方 (--transports: json / multipart) と Content-Encoding (--encodings: identity / gzip / zstd) の
+組み合わせごとに、同じフレームを --requests 件ずつ順に送る。1件ごとに、クライアントでの圧縮から
+/api/jobs/<job_id> が done になるまでを計り、ボディのバイト数 (wire) と p50/p95 を表示する。
+ローカルホストでは転送時間がほぼ 0 なので、--uplink-mbps の回線で送った場合の推定値
+(計測値 + wire バイト数 / 帯域) も並べる。--output で JSON に書き出す。
+
+フレームは既定で load_test.make_frames の合成画像を使う。合成画像は連続するフレームが似ているので
+圧縮が効きすぎる。実際の画面キャプチャで計るときは --frames-dir に JPEG を置く。
+
+サーバーは bench_serving と同じくモックのモデルで子プロセスとして起動する。
+
+    cd task_solution
+    FIRESTORE_EMULATOR_HOST=localhost:8080 \\
+        python -m benchmarks.bench_request_compression --requests 50 --uplink-mbps 10
+"""
+
+import argparse
+import base64
+import glob
+import gzip
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+import zstandard
+
+from benchmarks.bench_serving import base_url, percentile, start_server
+from benchmarks.bench_storage import git_revision
+from benchmarks.load_test import make_frames, multipart_files
+
+ENCODINGS = ("identity", "gzip", "zstd")
+TRANSPORTS = ("json", "multipart")
+
+
+def load_frames(directory: str) -> list:
+    """directory の JPEG を data URL にする (ブラウザの canvas.toDataURL と同じ形式)"""
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.jp*g"))):
+        with open(path, "rb") as f:
+            frames.append("data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii"))
+    if not frames:
+        raise SystemExit(f"no JPEG files in {directory}")
+    return frames
+
+
+def build_body(transport: str, frames: list, fields: dict) -> tuple[bytes, str]:
+    """ブラウザの Recorder と同じ形のボディと Content-Type を作る"""
+    if transport == "multipart":
+        request = httpx.Request(
+            "POST", "http://localhost/", data=fields, files=multipart_files(frames)
+        )
+        return request.read(), request.headers["content-type"]
+    return json.dumps({"frames": frames, **fields}).encode(), "application/json"
+
+
+def compress(encoding: str, body: bytes, level: int) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    return body
+
+
+def wait_for_job(http: httpx.Client, url: str, job_id: str, timeout: float) -> str:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = http.get(f"{url}/api/jobs/{job_id}").json()["job"]["status"]
+        if status in ("done", "failed"):
+            return status
+        time.sleep(0.005)
+    return "timeout"
+
+
+def run_variant(args, transport: str, encoding: str, frames: list) -> dict:
+    url = base_url(args)
+    level = args.gzip_level if encoding == "gzip" else args.zstd_level
+    raw_bytes, wire_bytes, compress_seconds, latencies = [], [], [], []
+    statuses = {}
+    with httpx.Client(timeout=args.timeout) as http:
+        for i in range(args.requests):
+            batch = [frames[(i + k) % len(frames)] for k in range(args.frames)]
+            body, content_type = build_body(transport, batch, {"user_request": "圧縮試験"})
+            headers = {"Content-Type": content_type}
+            if encoding != "identity":
+                headers["Content-Encoding"] = encoding
+
+            start = time.perf_counter()
+            payload = compress(encoding, body, level)
+            compressed = time.perf_counter()
+            response = http.post(f"{url}/record_frame", content=payload, headers=headers)
+            if response.status_code == 202:
+                status = wait_for_job(http, url, response.json()["job_id"], args.timeout)
+            else:
+                status = str(response.status_code)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+            raw_bytes.append(len(body))
+            wire_bytes.append(len(payload))
+            compress_seconds.append(compressed - start)
+
+    latencies.sort()
+    mean_wire = sum(wire_bytes) / len(wire_bytes)
+    # 回線の帯域で送った場合の転送時間 (ミリ秒)
+    upload_ms = mean_wire * 8 / (args.uplink_mbps * 1e6) * 1000
+    return {
+        "requests": len(latencies),
+        "raw_bytes": sum(raw_bytes) / len(raw_bytes),
+        "wire_bytes": mean_wire,
+        "ratio": mean_wire / (sum(raw_bytes) / len(raw_bytes)),
+        "compress_ms": sum(compress_seconds) / len(compress_seconds) * 1000,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "upload_ms": upload_ms,
+        "est_p50_ms": percentile(latencies, 0.50) + upload_ms,
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--transports", nargs="+", choices=TRANSPORTS, default=list(TRANSPORTS))
+    parser.add_argument("--encodings", nargs="+", choices=ENCODINGS, default=list(ENCODINGS))
+    parser.add_argument("--requests", type=int, default=50, help="組み合わせごとの件数")
+    parser.add_argument("--frames", type=int, default=10, help="1リクエストのフレーム数")
+    parser.add_argument("--frame-size", default="1280x720")
+    parser.add_argument("--frames-dir", help="合成画像の代わりに使う JPEG のディレクトリ")
+    parser.add_argument("--gzip-level", type=int, default=6)
+    parser.add_argument("--zstd-level", type=int, default=3)
+    parser.add_argument("--uplink-mbps", type=float, default=10, help="推定に使う上り帯域")
+    parser.add_argument("--model-latency-ms", type=float, default=0)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--server-cmd", default=f"{sys.executable} app.py")
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="結果を JSON で書き出すパス")
+    args = parser.parse_args()
+
+    if args.frames_dir:
+        frames = load_frames(args.frames_dir)
+    else:
+        width, height = (int(v) for v in args.frame_size.split("x"))
+        frames = make_frames(30, width, height, seed=0)
+
+    process = start_server(args, "threaded")
+    try:
+        results = {
+            f"{transport}/{encoding}": run_variant(args, transport, encoding, frames)
+            for transport in args.transports
+            for encoding in args.encodings
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    print(
+        f"{args.frames} frames of {args.frames_dir or args.frame_size} per request, "
+        f"{args.requests} requests, estimated at {args.uplink_mbps:g} Mbps uplink"
+    )
+    print(
+        f"{'variant':<20} {'raw_kb':>8} {'wire_kb':>8} {'ratio':>6} {'comp_ms':>8} "
+        f"{'p50_ms':>8} {'p95_ms':>8} {'upload_ms':>9} {'est_p50':>8}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<20} {r['raw_bytes'] / 1024:8.1f} {r['wire_bytes'] / 1024:8.1f} "
+            f"{r['ratio']:6.2f} {r['compress_ms']:8.2f} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} "
+            f"{r['upload_ms']:9.1f} {r['est_p50_ms']:8.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "revision": git_revision(),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "params": vars(args),
+                    "results": results,
+                },
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+スレッドモード (app.run) と async モード (SERVING_MODE=async) の同時接続性能を比べるベンチマーク。
+
+モードごとにサーバーを子プロセスで起動し、--concurrency 本の接続から /api/notify_support と
+/record_frame を合計 --requests 件ずつ送る。エンドポイントごとのスループットと p50/p95/p99、
+サーバーのスレッド数と RSS のピーク (/proc から取得)、/record_frame のジョブが
+すべて終わるまでの時間 (--timeout 以内に終わらなければ -) を表示し、--output で JSON に書き出す。
+
+モデルはモック (MODEL_BACKEND=mock) で、応答時間は --model-latency-ms で指定する。
+Firestore・GCS はサーバー側の環境 (エミュレータなど) をそのまま使う。
+
+    cd task_solution
+    FIRESTORE_EMULATOR_HOST=localhost:8080 \\
+        python -m benchmarks.bench_serving --concurrency 200 --requests 1000 --output serving.json
+
+--server-cmd でサーバーの起動コマンドを差し替えられる (既定は python app.py)。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.bench_storage import git_revision
+from benchmarks.load_test import make_frames, multipart_files
+
+MODES = ("threaded", "async")
+SCENARIOS = {
+    "notify_support": "/api/notify_support",
+    "record_frame": "/record_frame",
+}
+
+
+class ProcessSampler(threading.Thread):
+    """サーバープロセスのスレッド数と RSS を一定間隔で読み、ピークを記録する"""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_threads = None
+        self.peak_rss_mb = None
+        self._stop_event = threading.Event()
+
+    def _read(self):
+        try:
+            with open(f"/proc/{self.pid}/status", encoding="utf-8") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            return None, None
+        threads = int(status["Threads"])
+        rss_mb = int(status["VmRSS"].split()[0]) / 1024
+        return threads, rss_mb
+
+    def reset(self):
+        self.peak_threads = self.peak_rss_mb = None
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            threads, rss_mb = self._read()
+            if threads is None:
+                continue
+            self.peak_threads = max(self.peak_threads or 0, threads)
+            self.peak_rss_mb = max(self.peak_rss_mb or 0, rss_mb)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_server(args, mode: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "SERVING_MODE": mode,
+        "PORT": str(args.port),
+        "MODEL_BACKEND": "mock",
+        "MOCK_MODEL_LATENCY_MS": str(args.model_latency_ms),
+        "MOCK_MODEL_ERROR_RATE": "0",
+        "INGEST_QUEUE_SIZE": str(args.requests),
+    }
+    process = subprocess.Popen(
+        shlex.split(args.server_cmd), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{mode} server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url(args)}/metrics", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f"{mode} server did not start within {args.startup_timeout} s")
+
+
+def base_url(args) -> str:
+    return f"http://127.0.0.1:{args.port}"
+
+
+def percentile(samples: list, p: float):
+    if not samples:
+        return None
+    return samples[min(int(len(samples) * p), len(samples) - 1)] * 1000
+
+
+async def run_scenario(args, scenario: str, frames: list) -> dict:
+    """--concurrency 本の接続 (それぞれ別セッション) で合計 --requests 件を送る"""
+    url = base_url(args) + SCENARIOS[scenario]
+    remaining = iter(range(args.requests))
+    latencies = []
+    statuses = {}
+    errors = 0
+    # multipart のパートは先に作っておく (クライアント側の base64 デコードを計測に含めない)
+    parts = multipart_files(frames) if args.transport == "multipart" else None
+
+    async def client(index: int):
+        nonlocal errors
+        async with httpx.AsyncClient(timeout=args.timeout) as http:
+            for i in remaining:
+                indexes = [(i + k) % len(frames) for k in range(args.frames)]
+                fields = {"user_request": "負荷試験", "log_context": ""}
+                if parts is not None:
+                    request = {"data": fields, "files": [parts[j] for j in indexes]}
+                else:
+                    request = {"json": {"frames": [frames[j] for j in indexes], **fields}}
+                start = time.perf_counter()
+                try:
+                    response = await http.post(url, **request)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = "exception"
+                latencies.append(time.perf_counter() - start)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status == "exception" or status >= 400:
+                    errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": latencies[-1] * 1000 if latencies else None,
+        "error_rate": errors / len(latencies) if latencies else None,
+        "statuses": statuses,
+    }
+
+
+def wait_for_ingest(args, submitted_before: int, accepted: int) -> float:
+    """受け付けた /record_frame のジョブがすべて終わるまでの秒数"""
+    start = time.perf_counter()
+    deadline = time.time() + args.timeout
+    while time.time() < deadline:
+        metrics = httpx.get(f"{base_url(args)}/api/jobs/metrics", timeout=5).json()["metrics"]
+        finished = metrics["done"] + metrics["failed"]
+        if finished - submitted_before >= accepted:
+            return time.perf_counter() - start
+        time.sleep(0.1)
+    return None
+
+
+def bench_mode(args, mode: str, frames: list) -> dict:
+    process = start_server(args, mode)
+    sampler = ProcessSampler(process.pid)
+    sampler.start()
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            before = httpx.get(f"{base_url(args)}/api/jobs/metrics", timeout=5).json()["metrics"]
+            sampler.reset()
+            result = asyncio.run(run_scenario(args, scenario, frames))
+            if scenario == "record_frame":
+                result["ingest_drain_seconds"] = wait_for_ingest(
+                    args, before["done"] + before["failed"], result["statuses"].get("202", 0)
+                )
+            result["peak_threads"] = sampler.peak_threads
+            result["peak_rss_mb"] = sampler.peak_rss_mb
+            results[scenario] = result
+    finally:
+        sampler.stop()
+        process.terminate()
+        process.wait(timeout=10)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--concurrency", type=int, default=200, help="同時接続数")
+    parser.add_argument("--requests", type=int, default=1000, help="シナリオごとの件数")
+    parser.add_argument("--frames", type=int, default=3, help="1リクエストのフレーム数")
+    parser.add_argument("--frame-size", default="640x360")
+    parser.add_argument("--transport", choices=["multipart", "json"], default="multipart")
+    parser.add_argument("--model-latency-ms", type=float, default=800)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--server-cmd", default=f"{sys.executable} app.py")
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", help="結果を JSON で書き出すパス")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.frame_size.split("x"))
+    frames = make_frames(30, width, height, seed=0)
+
+    results = {mode: bench_mode(args, mode, frames) for mode in args.modes}
+
+    print(
+        f"{args.concurrency} connections, {args.requests} requests per scenario, "
+        f"model latency {args.model_latency_ms:.0f} ms"
+    )
+    print(
+        f"{'mode':<9} {'scenario':<15} {'rps':>7} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} "
+        f"{'errors':>7} {'threads':>8} {'rss_mb':>7} {'drain_s':>8}"
+    )
+    fmt = lambda v, spec: "-" if v is None else format(v, spec)  # noqa: E731
+    for mode, scenarios in results.items():
+        for scenario, r in scenarios.items():
+            print(
+                f"{mode:<9} {scenario:<15} {r['throughput_rps']:7.1f} "
+                f"{fmt(r['p50_ms'], '9.1f')} {fmt(r['p95_ms'], '9.1f')} "
+                f"{fmt(r['p99_ms'], '9.1f')} {fmt(r['error_rate'], '7.1%')} "
+                f"{fmt(r['peak_threads'], '8d')} {fmt(r['peak_rss_mb'], '7.1f')} "
+                f"{fmt(r.get('ingest_drain_seconds'), '8.2f')}"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "revision": git_revision(),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "params": vars(args),
+                    "results": results,
+                },
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+FirestoreService のストレージ層を実運用規模のデータで計測するベンチマーク。
+
+合成ユーザー (レポート・手順を大量に持ち、1 日に数千件のログを書く) を投入し、次を計測する。
+- upload_log の追記 / download_log の取得
+- レポート一覧の深いページ: offset (get_reports) とカーソル (list_reports)、概要のみと全項目
+- count 集計とそのキャッシュ
+- 手順の作成・取得 (キャッシュなし/あり)・更新・削除、batch_get と逐次取得
+
+    cd task_solution
+    python -m benchmarks.bench_storage --users 2 --reports 2000 --procedures 500 \\
+        --log-entries 5000 --output storage.json
+
+--backend emulator は FIRESTORE_EMULATOR_HOST の Firestore エミュレータに対して計測する
+(その場合読み取り数・バイト数は記録しない)。フェイクでは --latency-ms で往復ごとの遅延を再現できる。
+--baseline に以前の JSON を渡すと計測項目ごとの平均時間の比を表示するので、
+コミット間の性能劣化の確認に使える。
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.fake_firestore import FakeFirestoreClient
+from services.firestore_service import (
+    BATCH_WRITE_LIMIT,
+    DOCUMENT_CACHE_MAX_PER_USER,
+    DOCUMENT_CACHE_MAX_USERS,
+    DOCUMENT_CACHE_TTL,
+    FirestoreService,
+    UserDocumentCache,
+)
+
+
+def make_client(backend: str, latency_ms: float):
+    if backend == "emulator":
+        if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+            raise SystemExit("FIRESTORE_EMULATOR_HOST is not set")
+        from google.cloud import firestore
+
+        return firestore.Client()
+    return FakeFirestoreClient(latency=latency_ms / 1000)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Recorder:
+    """計測項目ごとのレイテンシと、フェイクの場合は読み書き数・バイト数を集計する"""
+
+    def __init__(self, db):
+        self.db = db
+        self.results = {}
+
+    def _stats(self):
+        stats = getattr(self.db, "stats", None)
+        return stats.to_dict() if stats else None
+
+    def measure(self, name: str, func, repeat: int = 1):
+        samples = []
+        before = self._stats()
+        value = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            value = func()
+            samples.append(time.perf_counter() - start)
+        after = self._stats()
+        self.add(name, samples, before, after)
+        return value
+
+    def add(self, name: str, samples: list, before=None, after=None):
+        result = self.results.setdefault(
+            name, {"count": 0, "samples_ms": [], "round_trips": None, "reads": None,
+                   "bytes_read": None, "writes": None}
+        )
+        result["count"] += len(samples)
+        result["samples_ms"].extend(s * 1000 for s in samples)
+        if before is not None and after is not None:
+            for key in ("round_trips", "reads", "bytes_read", "writes"):
+                result[key] = (result[key] or 0) + after[key] - before[key]
+
+    def summary(self) -> dict:
+        summary = {}
+        for name, result in self.results.items():
+            samples = sorted(result["samples_ms"])
+            per_call = lambda v: v / result["count"] if v is not None else None  # noqa: E731
+            summary[name] = {
+                "count": result["count"],
+                "mean_ms": statistics.mean(samples),
+                "p50_ms": samples[len(samples) // 2],
+                "p95_ms": samples[max(int(len(samples) * 0.95) - 1, 0)],
+                "max_ms": samples[-1],
+                "round_trips_per_call": per_call(result["round_trips"]),
+                "reads_per_call": per_call(result["reads"]),
+                "bytes_read_per_call": per_call(result["bytes_read"]),
+                "writes_per_call": per_call(result["writes"]),
+            }
+        return summary
+
+
+def reset_caches(service: FirestoreService):
+    service._count_cache = {}
+    service.document_cache = UserDocumentCache(
+        DOCUMENT_CACHE_TTL, DOCUMENT_CACHE_MAX_PER_USER, DOCUMENT_CACHE_MAX_USERS
+    )
+
+
+def seed_user(db, uid: str, reports: int, procedures: int, content_size: int):
+    """作成日時を過去に分散させたレポート・手順を WriteBatch で投入する"""
+    user_ref = db.collection("users").document(uid)
+    now = datetime.now(timezone.utc)
+    body = "あ" * content_size
+
+    def write_all(collection, items):
+        for i in range(0, len(items), BATCH_WRITE_LIMIT):
+            batch = db.batch()
+            for doc_id, data in items[i : i + BATCH_WRITE_LIMIT]:
+                batch.set(collection.document(doc_id), data)
+            batch.commit()
+
+    write_all(
+        user_ref.collection("reports"),
+        [
+            (
+                uuid.uuid4().hex[:20],
+                {
+                    "title": f"日報 #{i}",
+                    "content": body,
+                    "created_at": now - timedelta(hours=reports - i),
+                    "updated_at": now - timedelta(hours=reports - i),
+                },
+            )
+            for i in range(reports)
+        ],
+    )
+    write_all(
+        user_ref.collection("procedures"),
+        [
+            (
+                f"task-{i:05d}",
+                {
+                    "content": body,
+                    "created_at": now - timedelta(minutes=procedures - i),
+                    "updated_at": now - timedelta(minutes=procedures - i),
+                },
+            )
+            for i in range(procedures)
+        ],
+    )
+
+
+def bench_logs(rec: Recorder, service: FirestoreService, uid: str, entries: int,
+               entry_size: int):
+    payload = "x" * entry_size
+    for i in range(entries):
+        rec.measure(
+            "upload_log",
+            lambda i=i: service.upload_log(uid, f"{datetime.now():%H:%M:%S}: #{i} {payload}"),
+        )
+    downloaded = rec.measure("download_log", lambda: service.download_log(uid))
+    return len(downloaded.split("\n")) if downloaded else 0
+
+
+def bench_report_pages(rec: Recorder, service: FirestoreService, uid: str, total: int,
+                       page_size: int):
+    last_page = max(total // page_size, 1)
+    depths = sorted({1, 10, last_page // 2, last_page} - {0})
+
+    page_token = None
+    page = 1
+    for depth in depths:
+        # 目的のページのトークンまで (計測せずに) 進める
+        while page < depth:
+            _, page_token = service.list_reports(uid, page_size, page_token)
+            page += 1
+        rec.measure(
+            f"reports_page{depth}_offset",
+            lambda depth=depth: service.get_reports(uid, depth, page_size),
+        )
+        rec.measure(
+            f"reports_page{depth}_cursor_full",
+            lambda token=page_token: service.list_reports(uid, page_size, token, summary=False),
+        )
+        rec.measure(
+            f"reports_page{depth}_cursor_summary",
+            lambda token=page_token: service.list_reports(uid, page_size, token),
+        )
+    return depths
+
+
+def bench_counts(rec: Recorder, service: FirestoreService, uid: str, repeat: int):
+    for _ in range(repeat):
+        service._invalidate_count(uid, "reports")
+        rec.measure("count_reports_cold", lambda: service.count_reports(uid))
+    rec.measure("count_reports_cached", lambda: service.count_reports(uid), repeat=repeat)
+
+
+def bench_procedure_crud(rec: Recorder, service: FirestoreService, uid: str, ops: int,
+                         content_size: int):
+    body = "い" * content_size
+    names = [f"bench-{uuid.uuid4().hex[:8]}" for _ in range(ops)]
+    for name in names:
+        rec.measure("create_procedure", lambda: service.create_procedure(uid, name, body))
+    reset_caches(service)
+    for name in names:
+        rec.measure("get_procedure_uncached", lambda: service.get_procedure(uid, name))
+    for name in names:
+        rec.measure("get_procedure_cached", lambda: service.get_procedure(uid, name))
+    for name in names:
+        rec.measure(
+            "update_procedure", lambda: service.update_procedure(uid, name, body + "更新")
+        )
+
+    reset_caches(service)
+    rec.measure(
+        "get_procedures_sequential",
+        lambda: [service.get_procedure(uid, name) for name in names],
+    )
+    reset_caches(service)
+    rec.measure("batch_get_procedures", lambda: service.batch_get_procedures(uid, names))
+
+    for name in names:
+        rec.measure("delete_procedure", lambda: service.delete_procedure(uid, name))
+
+
+def compare(summary: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    print(f"\n{'vs baseline':<36} {'before_ms':>10} {'after_ms':>10} {'ratio':>7}")
+    for name, result in summary.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["mean_ms"]
+        ratio = result["mean_ms"] / before if before else float("inf")
+        flag = "  !" if ratio > 1.2 else ""
+        print(f"{name:<36} {before:10.3f} {result['mean_ms']:10.3f} {ratio:7.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backend", choices=["fake", "emulator"], default="fake")
+    parser.add_argument("--users", type=int, default=2)
+    parser.add_argument("--reports", type=int, default=2000, help="ユーザーあたりのレポート数")
+    parser.add_argument("--procedures", type=int, default=500, help="ユーザーあたりの手順数")
+    parser.add_argument("--log-entries", type=int, default=5000, help="ユーザーあたりの 1 日のログ件数")
+    parser.add_argument("--entry-size", type=int, default=400)
+    parser.add_argument("--content-size", type=int, default=2000, help="本文の文字数")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="フェイクの往復ごとの遅延")
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--crud-ops", type=int, default=50)
+    parser.add_argument("--output", help="結果を JSON で書き出すパス")
+    parser.add_argument("--baseline", help="比較する以前の結果 JSON")
+    args = parser.parse_args()
+
+    db = make_client(args.backend, args.latency_ms)
+    service = FirestoreService()
+    service.db = db
+    reset_caches(service)
+    rec = Recorder(db)
+
+    run_id = uuid.uuid4().hex[:8]
+    uids = [f"bench-{run_id}-{i}" for i in range(args.users)]
+    start = time.perf_counter()
+    for uid in uids:
+        seed_user(db, uid, args.reports, args.procedures, args.content_size)
+    seed_seconds = time.perf_counter() - start
+
+    downloaded = depths = None
+    for uid in uids:
+        downloaded = bench_logs(rec, service, uid, args.log_entries, args.entry_size)
+        depths = bench_report_pages(rec, service, uid, args.reports, args.page_size)
+        bench_counts(rec, service, uid, repeat=10)
+        bench_procedure_crud(rec, service, uid, args.crud_ops, args.content_size)
+
+    summary = rec.summary()
+    print(f"seeded {args.users} users in {seed_seconds:.1f} s, "
+          f"downloaded {downloaded} log entries, report pages {depths}")
+    print(
+        f"\n{'operation':<36} {'n':>6} {'mean_ms':>9} {'p95_ms':>9} {'RTs':>6} "
+        f"{'reads':>8} {'KB read':>9}"
+    )
+    fmt = lambda v, scale=1: "-" if v is None else f"{v / scale:.1f}"  # noqa: E731
+    for name, result in summary.items():
+        print(
+            f"{name:<36} {result['count']:6d} {result['mean_ms']:9.3f} {result['p95_ms']:9.3f} "
+            f"{fmt(result['round_trips_per_call']):>6} {fmt(result['reads_per_call']):>8} "
+            f"{fmt(result['bytes_read_per_call'], 1024):>9}"
+        )
+
+    if args.baseline:
+        compare(summary, args.baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "revision": git_revision(),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "params": vars(args),
+                    "seed_seconds": seed_seconds,
+                    "results": summary,
+                },
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+
+
+if __name__ == "__main__":
+    main()
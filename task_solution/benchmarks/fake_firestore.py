@@ -0,0 +1,432 @@
+"""
+ベンチマーク用のインメモリ Firestore フェイク。
+FirestoreService が使う google.cloud.firestore.Client のサブセットを再現し、
+読み書きしたドキュメント数・バイト数を数える。
+FakeAsyncFirestoreClient は同じデータを AsyncClient として見せる (async サーバーの読み書き用)。
+"""
+
+import asyncio
+import copy
+import functools
+import json
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.transforms import Increment
+
+
+def _payload_size(data) -> int:
+    return len(json.dumps(data, default=str, ensure_ascii=False).encode("utf-8"))
+
+
+class FakeStats:
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.round_trips = 0
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class FakeWriteResult:
+    def __init__(self, update_time: datetime):
+        self.update_time = update_time
+
+
+class FakeAggregationResult:
+    def __init__(self, alias: str, value):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAggregationQuery:
+    def __init__(self, query, alias: str):
+        self._query = query
+        self._alias = alias
+
+    def get(self):
+        self._query._client._round_trip()
+        total = len(self._query._ordered_documents())
+        # count 集計はインデックス 1000 件ごとに 1 読み取りとして課金される
+        self._query._client.stats.reads += max(1, math.ceil(total / 1000))
+        return [[FakeAggregationResult(self._alias, total)]]
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str):
+        return self._data.get(field) if self._data else None
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path: tuple):
+        self._client = client
+        self._path = path
+        self.id = path[-1]
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._path)
+
+    def collection(self, name: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._client, self._path + (name,))
+
+    def get(self, field_paths=None) -> FakeDocumentSnapshot:
+        self._client._round_trip()
+        return self._snapshot(field_paths)
+
+    def _snapshot(self, field_paths=None) -> FakeDocumentSnapshot:
+        data = self._client._read(self._path)
+        if data is not None and field_paths is not None:
+            data = {k: v for k, v in data.items() if k in field_paths}
+        return FakeDocumentSnapshot(self, data)
+
+    def set(self, document_data: dict, merge: bool = False) -> FakeWriteResult:
+        self._client._round_trip()
+        return self._client._write(self._path, document_data, merge=merge)
+
+    def update(self, field_updates: dict) -> FakeWriteResult:
+        self._client._round_trip()
+        return self._client._update(self._path, field_updates)
+
+    def delete(self) -> FakeWriteResult:
+        self._client._round_trip()
+        return self._client._delete(self._path)
+
+
+class FakeQuery:
+    def __init__(self, client, parent_path: tuple):
+        self._client = client
+        self._parent_path = parent_path
+        self._orders = []
+        self._filters = []
+        self._limit = None
+        self._offset = 0
+        self._fields = None
+        self._start_after = None
+
+    def _new_query(self) -> "FakeQuery":
+        return FakeQuery(self._client, self._parent_path)
+
+    def _copy(self) -> "FakeQuery":
+        query = self._new_query()
+        query._orders = list(self._orders)
+        query._filters = list(self._filters)
+        query._limit = self._limit
+        query._offset = self._offset
+        query._fields = self._fields
+        query._start_after = self._start_after
+        return query
+
+    def order_by(self, field_path: str, direction=firestore.Query.ASCENDING):
+        query = self._copy()
+        query._orders.append((field_path, direction))
+        return query
+
+    def where(self, field_path: str, op_string: str, value):
+        query = self._copy()
+        query._filters.append((field_path, op_string, value))
+        return query
+
+    def limit(self, count: int):
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def offset(self, num_to_skip: int):
+        query = self._copy()
+        query._offset = num_to_skip
+        return query
+
+    def select(self, field_paths):
+        query = self._copy()
+        query._fields = list(field_paths)
+        return query
+
+    def start_after(self, document_fields: dict):
+        """並び順のフィールド -> 値 の dict を受け付ける ("__name__" はドキュメントID)"""
+        query = self._copy()
+        query._start_after = dict(document_fields)
+        return query
+
+    def count(self, alias: str = None) -> FakeAggregationQuery:
+        return FakeAggregationQuery(self, alias or "count")
+
+    @staticmethod
+    def _value(path: tuple, data: dict, field_path: str):
+        return path[-1] if field_path == "__name__" else data[field_path]
+
+    def _compare(self, a, b) -> int:
+        """並び順 (self._orders) で a が前なら負、後ろなら正"""
+        for field_path, direction in self._orders:
+            va = self._value(*a, field_path)
+            vb = self._value(*b, field_path)
+            if va == vb:
+                continue
+            result = -1 if va < vb else 1
+            return -result if direction == firestore.Query.DESCENDING else result
+        return 0
+
+    def _matches(self, data: dict) -> bool:
+        ops = {
+            "==": lambda a, b: a == b,
+            "<": lambda a, b: a < b,
+            "<=": lambda a, b: a <= b,
+            ">": lambda a, b: a > b,
+            ">=": lambda a, b: a >= b,
+        }
+        for field_path, op_string, value in self._filters:
+            if field_path not in data or not ops[op_string](data[field_path], value):
+                return False
+        return True
+
+    def _ordered_documents(self) -> list:
+        docs = [
+            (path, data)
+            for path, data in self._client._children(self._parent_path)
+            if self._matches(data)
+        ]
+        for field_path, _ in self._orders:
+            if field_path != "__name__":
+                docs = [d for d in docs if field_path in d[1]]
+        docs.sort(key=functools.cmp_to_key(self._compare))
+        if self._start_after is not None:
+            cursor_data = {k: v for k, v in self._start_after.items() if k != "__name__"}
+            cursor = (
+                (str(self._start_after.get("__name__", "")),),
+                cursor_data,
+            )
+            docs = [d for d in docs if self._compare(d, cursor) > 0]
+        return docs
+
+    def stream(self):
+        self._client._round_trip()
+        yield from self._snapshots()
+
+    def _snapshots(self):
+        docs = self._ordered_documents()
+        # オフセットで読み飛ばしたドキュメントも Firestore では読み取りとして課金される
+        self._client.stats.reads += min(self._offset, len(docs))
+        docs = docs[self._offset :]
+        if self._limit is not None:
+            docs = docs[: self._limit]
+        for path, data in docs:
+            if self._fields is not None:
+                data = {k: v for k, v in data.items() if k in self._fields}
+            self._client._count_read(data)
+            yield FakeDocumentSnapshot(
+                FakeDocumentReference(self._client, path), copy.deepcopy(data)
+            )
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path: tuple):
+        super().__init__(client, path)
+        self.id = path[-1]
+
+    def document(self, document_id: str = None) -> FakeDocumentReference:
+        document_id = document_id or uuid.uuid4().hex[:20]
+        return FakeDocumentReference(self._client, self._parent_path + (document_id,))
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, document_data: dict, merge: bool = False):
+        self._ops.append(
+            lambda: self._client._write(reference._path, document_data, merge=merge)
+        )
+
+    def update(self, reference, field_updates: dict):
+        self._ops.append(lambda: self._client._update(reference._path, field_updates))
+
+    def delete(self, reference):
+        self._ops.append(lambda: self._client._delete(reference._path))
+
+    def commit(self) -> list:
+        self._client._round_trip()
+        return self._apply()
+
+    def _apply(self) -> list:
+        with self._client._lock:
+            results = [op() for op in self._ops]
+        self._ops = []
+        return results
+
+
+class FakeAsyncWriteBatch(FakeWriteBatch):
+    async def commit(self) -> list:
+        await self._client._async_round_trip()
+        return self._apply()
+
+
+class _AsyncQueryMixin:
+    """stream / get を AsyncQuery と同じくコルーチン (非同期イテレータ) にする"""
+
+    def _new_query(self) -> "FakeAsyncQuery":
+        return FakeAsyncQuery(self._client, self._parent_path)
+
+    async def stream(self):
+        await self._client._async_round_trip()
+        for snapshot in self._snapshots():
+            yield snapshot
+
+    async def get(self):
+        return [snapshot async for snapshot in self.stream()]
+
+
+class FakeAsyncQuery(_AsyncQueryMixin, FakeQuery):
+    pass
+
+
+class FakeAsyncCollectionReference(_AsyncQueryMixin, FakeCollectionReference):
+    def document(self, document_id: str = None) -> "FakeAsyncDocumentReference":
+        document_id = document_id or uuid.uuid4().hex[:20]
+        return FakeAsyncDocumentReference(self._client, self._parent_path + (document_id,))
+
+
+class FakeAsyncDocumentReference(FakeDocumentReference):
+    def collection(self, name: str) -> FakeAsyncCollectionReference:
+        return FakeAsyncCollectionReference(self._client, self._path + (name,))
+
+    async def get(self, field_paths=None) -> FakeDocumentSnapshot:
+        await self._client._async_round_trip()
+        return self._snapshot(field_paths)
+
+    async def set(self, document_data: dict, merge: bool = False) -> FakeWriteResult:
+        await self._client._async_round_trip()
+        return self._client._write(self._path, document_data, merge=merge)
+
+    async def update(self, field_updates: dict) -> FakeWriteResult:
+        await self._client._async_round_trip()
+        return self._client._update(self._path, field_updates)
+
+    async def delete(self) -> FakeWriteResult:
+        await self._client._async_round_trip()
+        return self._client._delete(self._path)
+
+
+class FakeFirestoreClient:
+    """
+    :param latency: 1 回の往復 (get / stream / commit など) ごとに待つ秒数。
+        エミュレータや本番との往復回数の差を再現したいときに指定する
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self._documents = {}
+        self._lock = threading.RLock()
+        self.latency = latency
+        self.stats = FakeStats()
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, (name,))
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, field_paths=None):
+        # 実際の get_all と同様に、1回の往復でまとめて読む (順序は保証しない)
+        self._round_trip()
+        for reference in references:
+            data = self._read(reference._path)
+            if data is not None and field_paths is not None:
+                data = {k: v for k, v in data.items() if k in field_paths}
+            yield FakeDocumentSnapshot(reference, data)
+
+    def _round_trip(self):
+        self.stats.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    async def _async_round_trip(self):
+        self.stats.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _count_read(self, data):
+        self.stats.reads += 1
+        self.stats.bytes_read += _payload_size(data) if data is not None else 0
+
+    def _read(self, path: tuple, count: bool = True):
+        with self._lock:
+            data = self._documents.get(path)
+            if count:
+                self._count_read(data)
+            return copy.deepcopy(data)
+
+    def _write(self, path: tuple, document_data: dict, merge: bool) -> FakeWriteResult:
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            current = dict(self._documents.get(path) or {}) if merge else {}
+            for key, value in document_data.items():
+                if isinstance(value, Increment):
+                    current[key] = current.get(key, 0) + value.value
+                elif value is firestore.SERVER_TIMESTAMP:
+                    current[key] = now
+                else:
+                    current[key] = copy.deepcopy(value)
+            self._documents[path] = current
+            self.stats.writes += 1
+            self.stats.bytes_written += _payload_size(document_data)
+        return FakeWriteResult(now)
+
+    def _update(self, path: tuple, field_updates: dict) -> FakeWriteResult:
+        with self._lock:
+            if path not in self._documents:
+                raise KeyError(f"No document to update: {'/'.join(path)}")
+            return self._write(path, field_updates, merge=True)
+
+    def _delete(self, path: tuple):
+        with self._lock:
+            self._documents.pop(path, None)
+            self.stats.writes += 1
+        return FakeWriteResult(datetime.now(timezone.utc))
+
+    def _children(self, collection_path: tuple) -> list:
+        depth = len(collection_path) + 1
+        with self._lock:
+            return [
+                (path, data)
+                for path, data in self._documents.items()
+                if len(path) == depth and path[:-1] == collection_path
+            ]
+
+
+class FakeAsyncFirestoreClient:
+    """
+    FakeFirestoreClient と同じドキュメントを共有する AsyncClient のフェイク。
+    ドキュメントの読み書き・クエリの stream・バッチ書き込みを再現し、往復の遅延は asyncio.sleep で待つ
+    """
+
+    def __init__(self, client: FakeFirestoreClient):
+        self._client = client
+        self.stats = client.stats
+
+    def collection(self, name: str) -> FakeAsyncCollectionReference:
+        return FakeAsyncCollectionReference(self._client, (name,))
+
+    def batch(self) -> FakeAsyncWriteBatch:
+        return FakeAsyncWriteBatch(self._client)
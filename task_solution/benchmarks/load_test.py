@@ -0,0 +1,238 @@
+"""
+app.py に複数の仮想ユーザーからリクエストを送る負荷試験。
+
+各ユーザーは別々のセッション (Cookie) で、/record_frame・/api/notify_support・/make_report を
+--mix の比率で思考時間 (指数分布) を挟みながら送り続ける。エンドポイントごとのスループット、
+p50/p95/p99 レイテンシ、エラー率を表示し、--output で JSON に書き出す。
+フレームは --transport multipart で JPEG のバイナリ、json で data URL の配列として送る。
+
+Gemini のクォータを使わないよう、サーバーはモックのモデルで起動しておく。
+
+    cd task_solution
+    MODEL_BACKEND=mock MOCK_MODEL_LATENCY_MS=800 MOCK_MODEL_ERROR_RATE=0.02 \\
+        FIRESTORE_EMULATOR_HOST=localhost:8080 python app.py
+    python -m benchmarks.load_test --url http://localhost:8080 --users 50 --duration 120
+"""
+
+import argparse
+import base64
+import io
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+from PIL import Image, ImageDraw
+
+ENDPOINTS = {
+    "record_frame": "/record_frame",
+    "notify_support": "/api/notify_support",
+    "make_report": "/make_report",
+}
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for item in value.split(","):
+        name, weight = item.split("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def multipart_files(frames: list) -> list:
+    """data URL のフレームを multipart の frames パート (JPEG のバイナリ) にする"""
+    return [
+        ("frames", (f"frame-{i}.jpg", base64.b64decode(frame.split(",")[1]), "image/jpeg"))
+        for i, frame in enumerate(frames)
+    ]
+
+
+def make_frames(count: int, width: int, height: int, seed: int) -> list:
+    """
+    画面キャプチャ相当の JPEG を作る。
+    連続するフレームは少しずつ変化させ、ときどき画面全体を切り替える
+    """
+    rng = random.Random(seed)
+    frames = []
+    background = (255, 255, 255)
+    for i in range(count):
+        if i % 20 == 0:
+            background = tuple(rng.randint(180, 255) for _ in range(3))
+        image = Image.new("RGB", (width, height), background)
+        draw = ImageDraw.Draw(image)
+        for _ in range(8):
+            x, y = rng.randint(0, width - 100), rng.randint(0, height - 40)
+            draw.rectangle([x, y, x + rng.randint(40, 300), y + rng.randint(10, 40)],
+                           fill=tuple(rng.randint(0, 200) for _ in range(3)))
+        draw.text((20, 20 + (i % 20) * 12), f"frame {i}", fill=(0, 0, 0))
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=70)
+        # ブラウザの canvas.toDataURL と同じ data URL 形式で送る
+        frames.append(
+            "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+        )
+    return frames
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+
+    def record(self, endpoint: str, status, latency: float, ok: bool):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][str(status)] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        def percentile(samples, p):
+            return samples[min(int(len(samples) * p), len(samples) - 1)] * 1000
+
+        summary = {}
+        with self._lock:
+            for endpoint, samples in self.latencies.items():
+                samples = sorted(samples)
+                summary[endpoint] = {
+                    "requests": len(samples),
+                    "throughput_rps": len(samples) / elapsed,
+                    "p50_ms": percentile(samples, 0.50),
+                    "p95_ms": percentile(samples, 0.95),
+                    "p99_ms": percentile(samples, 0.99),
+                    "max_ms": samples[-1] * 1000,
+                    "error_rate": self.errors[endpoint] / len(samples),
+                    "statuses": dict(self.statuses[endpoint]),
+                }
+        return summary
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, index: int, args, frames: list, stats: Stats, deadline: float):
+        super().__init__(name=f"user-{index}", daemon=True)
+        self.args = args
+        self.frames = frames
+        self.stats = stats
+        self.deadline = deadline
+        self.rng = random.Random(args.seed + index)
+        self.session = requests.Session()  # Cookie でユーザーごとのセッションを持つ
+        self.frame_index = self.rng.randrange(len(frames))
+        self.notifications = []
+
+    def next_frames(self) -> list:
+        frames = []
+        for _ in range(self.args.frames_per_request):
+            frames.append(self.frames[self.frame_index % len(self.frames)])
+            self.frame_index += 1
+        return frames
+
+    def payload(self, endpoint: str):
+        if endpoint == "record_frame":
+            return {"frames": self.next_frames(), "user_request": "負荷試験"}
+        if endpoint == "notify_support":
+            return {
+                "frames": self.next_frames(),
+                "log_context": "\n".join(self.notifications[-5:]),
+            }
+        return None
+
+    def request(self, endpoint: str):
+        start = time.perf_counter()
+        status = "exception"
+        ok = False
+        url = self.args.url.rstrip("/") + ENDPOINTS[endpoint]
+        payload = self.payload(endpoint)
+        try:
+            if payload is not None and self.args.transport == "multipart":
+                files = multipart_files(payload.pop("frames"))
+                response = self.session.post(
+                    url, data=payload, files=files, timeout=self.args.timeout
+                )
+            else:
+                response = self.session.post(url, json=payload, timeout=self.args.timeout)
+            status = response.status_code
+            ok = status < 400
+            if ok and endpoint == "notify_support":
+                message = response.json().get("notification_message")
+                if message:
+                    self.notifications.append(message)
+        except requests.RequestException:
+            pass
+        self.stats.record(endpoint, status, time.perf_counter() - start, ok)
+
+    def run(self):
+        names = list(self.args.mix)
+        weights = [self.args.mix[name] for name in names]
+        # 起動時刻をずらす
+        time.sleep(self.rng.uniform(0, self.args.think_time))
+        while time.time() < self.deadline:
+            self.request(self.rng.choices(names, weights)[0])
+            time.sleep(self.rng.expovariate(1 / self.args.think_time))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60, help="秒")
+    parser.add_argument(
+        "--mix", type=parse_mix, default="record_frame=10,notify_support=4,make_report=1",
+        help="エンドポイントごとの重み",
+    )
+    parser.add_argument("--think-time", type=float, default=2.0, help="リクエスト間隔の平均 (秒)")
+    parser.add_argument("--frames-per-request", type=int, default=3)
+    parser.add_argument("--frame-size", default="1280x720")
+    parser.add_argument("--transport", choices=["multipart", "json"], default="multipart")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果を JSON で書き出すパス")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.frame_size.split("x"))
+    frames = make_frames(60, width, height, args.seed)
+    stats = Stats()
+
+    start = time.time()
+    users = [
+        VirtualUser(i, args, frames, stats, start + args.duration) for i in range(args.users)
+    ]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.time() - start
+
+    summary = stats.summary(elapsed)
+    print(f"{args.users} users, {elapsed:.1f} s")
+    print(
+        f"{'endpoint':<16} {'requests':>8} {'rps':>7} {'p50_ms':>9} {'p95_ms':>9} "
+        f"{'p99_ms':>9} {'errors':>7}  statuses"
+    )
+    for endpoint, result in summary.items():
+        print(
+            f"{endpoint:<16} {result['requests']:8d} {result['throughput_rps']:7.2f} "
+            f"{result['p50_ms']:9.1f} {result['p95_ms']:9.1f} {result['p99_ms']:9.1f} "
+            f"{result['error_rate']:7.1%}  {result['statuses']}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "params": {**vars(args), "mix": args.mix},
+                    "elapsed_seconds": elapsed,
+                    "results": summary,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,18 @@
-from .log_service import make_report_by_log, upload_log_from_base64_screen_shot
+from .log_service import (
+    make_report_by_log,
+    amake_report_by_log,
+    upload_log_from_frames,
+    aupload_log_from_frames,
+)
 from .procedure_service import make_procedure_from_mp4
-from .notify_service import generate_notification_message  # 変更
+from .notify_service import generate_notification_message, agenerate_notification_message  # 変更
 
 __all__ = [
     "make_report_by_log",
-    "upload_log_from_base64_screen_shot",
+    "amake_report_by_log",
+    "upload_log_from_frames",
+    "aupload_log_from_frames",
     "make_procedure_from_mp4",
     "generate_notification_message",  # 変更
+    "agenerate_notification_message",
 ]
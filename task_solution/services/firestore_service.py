@@ -1,69 +1,605 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
 from google.cloud import firestore
 from datetime import datetime
 
-from utils.logger import Logger
+from utils.logger import Logger, summarize_payload
+from utils.metrics import instrument_methods, registry
 
 
 logger = Logger(name="firestore_service").get_logger()
 
+# 一覧の総件数 (count 集計) をキャッシュする秒数
+LIST_COUNT_CACHE_TTL = float(os.getenv("LIST_COUNT_CACHE_TTL", 60))
+# 一覧で返す項目 (本文 content は返さない)
+REPORT_SUMMARY_FIELDS = ["title", "created_at", "updated_at"]
+PROCEDURE_SUMMARY_FIELDS = ["created_at", "updated_at"]
+
+
+# レポート・手順書の詳細をキャッシュする秒数と、ユーザーごとの保持件数
+DOCUMENT_CACHE_TTL = float(os.getenv("DOCUMENT_CACHE_TTL", 300))
+DOCUMENT_CACHE_MAX_PER_USER = int(os.getenv("DOCUMENT_CACHE_MAX_PER_USER", 50))
+DOCUMENT_CACHE_MAX_USERS = int(os.getenv("DOCUMENT_CACHE_MAX_USERS", 1000))
+# 1回のコミットに含められる書き込み数の上限 (Firestore の制限)
+BATCH_WRITE_LIMIT = 500
+# ドキュメントIDの最大バイト数 (Firestore の制限)
+DOCUMENT_ID_MAX_BYTES = 1500
+
+
+class InvalidPageTokenError(Exception):
+    pass
+
+
+def document_etag(doc_id: str, updated_at) -> str:
+    """updated_at から ETag を作る。内容が更新されれば updated_at が変わるので ETag も変わる"""
+    stamp = updated_at.isoformat() if hasattr(updated_at, "isoformat") else str(updated_at)
+    return hashlib.sha256(f"{doc_id}:{stamp}".encode("utf-8")).hexdigest()[:32]
+
+
+def valid_document_id(doc_id) -> bool:
+    """Firestore のドキュメントIDとして使えるか ("/" を含むとサブコレクションのパスになる)"""
+    return (
+        isinstance(doc_id, str)
+        and 0 < len(doc_id.encode("utf-8")) <= DOCUMENT_ID_MAX_BYTES
+        and "/" not in doc_id
+        and doc_id not in (".", "..")
+        and not (doc_id.startswith("__") and doc_id.endswith("__"))
+    )
+
+
+def _invalid_id_result(id_key: str, doc_id) -> dict:
+    return {id_key: doc_id, "status": "error", "message": "Invalid document id"}
+
+
+class UserDocumentCache:
+    """
+    ユーザーごとの読み取りキャッシュ (LRU + TTL)。
+    更新・削除時に書き込み側から更新・破棄する。別インスタンスでの更新は TTL で反映される。
+    """
+
+    def __init__(self, ttl: float, max_per_user: int, max_users: int):
+        self.ttl = ttl
+        self.max_per_user = max_per_user
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._users = OrderedDict()  # uid -> OrderedDict[key -> (expires_at, data)]
+        self._counters = {"hits": 0, "misses": 0}
+
+    def get(self, uid: str, key: tuple):
+        with self._lock:
+            entries = self._users.get(uid)
+            entry = entries.get(key) if entries is not None else None
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del entries[key]
+                self._counters["misses"] += 1
+                return None
+            entries.move_to_end(key)
+            self._users.move_to_end(uid)
+            self._counters["hits"] += 1
+            return dict(entry[1])
+
+    def set(self, uid: str, key: tuple, data: dict):
+        with self._lock:
+            entries = self._users.setdefault(uid, OrderedDict())
+            self._users.move_to_end(uid)
+            entries[key] = (time.time() + self.ttl, dict(data))
+            entries.move_to_end(key)
+            while len(entries) > self.max_per_user:
+                entries.popitem(last=False)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, uid: str, key: tuple):
+        with self._lock:
+            entries = self._users.get(uid)
+            if entries is not None:
+                entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "entries": sum(len(entries) for entries in self._users.values()),
+                **self._counters,
+            }
+
+
+def encode_page_token(created_at: datetime, doc_id: str) -> str:
+    """最後に返したドキュメントの並び順のキーを、クライアントからは中身の見えないトークンにする"""
+    payload = json.dumps({"c": created_at.isoformat(), "id": doc_id})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return {
+            "created_at": datetime.fromisoformat(payload["c"]),
+            "__name__": payload["id"],
+        }
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidPageTokenError(str(e))
+
 
 class FirestoreService:
     __instance = None
+    __lock = threading.Lock()
 
     def __new__(cls):
         if cls.__instance is None:
             cls.__instance = super(FirestoreService, cls).__new__(cls)
-            cls.__instance.db = firestore.Client()
+            cls.__instance._db = None
+            cls.__instance._async_db = None
             cls.__instance.today_str = datetime.now().strftime("%Y-%m-%d")
+            cls.__instance._count_cache = {}
+            cls.__instance.document_cache = UserDocumentCache(
+                DOCUMENT_CACHE_TTL, DOCUMENT_CACHE_MAX_PER_USER, DOCUMENT_CACHE_MAX_USERS
+            )
         return cls.__instance
 
-    def upload_log(self, uid: str, log_data: str):
+    @property
+    def db(self):
+        # クライアントは初回アクセス時に生成する (ベンチマークではフェイクを差し替える)
+        if self._db is None:
+            with self.__lock:
+                if self._db is None:
+                    self._db = firestore.Client()
+        return self._db
+
+    @db.setter
+    def db(self, client):
+        self._db = client
+
+    @property
+    def async_db(self):
         """
-        ログを users/{uid}/logs/{date} ドキュメントの logs 配列に追加
+        async サーバー用の AsyncClient。gRPC のチャネルがイベントループに紐づくので、
+        サーバーのイベントループ上からだけ使う
         """
-        logger.info(f"upload_log: uid={uid} log_data={log_data}")
-
-        today_str = datetime.now().strftime("%Y-%m-%d")
-        doc_ref = (
-            self.db.collection("users")
+        if self._async_db is None:
+            with self.__lock:
+                if self._async_db is None:
+                    self._async_db = firestore.AsyncClient()
+        return self._async_db
+
+    @async_db.setter
+    def async_db(self, client):
+        self._async_db = client
+
+    def _log_day_ref(self, uid: str, date: str, db=None):
+        return (
+            (db or self.db)
+            .collection("users")
             .document(uid)
             .collection("logs")
-            .document(today_str)
+            .document(date)
         )
-        doc = doc_ref.get()
+
+    def upload_log(self, uid: str, log_data: str):
+        """
+        ログを users/{uid}/logs/{date}/entries に1件1ドキュメントで追記する。
+        既存ログの読み込みや配列の書き戻しはしないので、1日のログ量によらず一定コストで追記できる。
+        """
+        logger.info(f"upload_log: uid={uid} log_data={summarize_payload(log_data)}")
+        self._log_append_batch(self.db, uid, log_data).commit()
+
+    async def aupload_log(self, uid: str, log_data: str):
+        """upload_log の非同期版 (AsyncClient を使う)"""
+        logger.info(f"aupload_log: uid={uid} log_data={summarize_payload(log_data)}")
+        await self._log_append_batch(self.async_db, uid, log_data).commit()
+
+    def _log_append_batch(self, db, uid: str, log_data: str):
+        now = datetime.now()
+        day_ref = self._log_day_ref(uid, now.strftime("%Y-%m-%d"), db=db)
+        entry_ref = day_ref.collection("entries").document()
+
+        batch = db.batch()
+        batch.set(entry_ref, {"log": log_data, "created_at": now})
+        batch.set(
+            day_ref,
+            {
+                "entry_count": firestore.Increment(1),
+                "updated_at": now,
+            },
+            merge=True,
+        )
+        return batch
+
+    def download_log_entries(self, uid: str, date: str = None) -> list[str]:
+        """
+        users/{uid}/logs/{date} のログを書き込み順に取得する。
+        旧形式 (ドキュメント内の logs 配列) のログがあれば先頭に含める。
+        """
+        if date is None:
+            date = datetime.now().strftime("%Y-%m-%d")
+        day_ref = self._log_day_ref(uid, date)
+
+        logs = []
+        doc = day_ref.get()
         if doc.exists:
-            logs = doc.to_dict().get("logs", [])
-            logs.append(log_data)
-            doc_ref.update({"logs": logs, "updated_at": datetime.now()})
-        else:
-            doc_ref.set(
-                {
-                    "logs": [log_data],
-                    "created_at": datetime.now(),
-                    "updated_at": datetime.now(),
-                }
-            )
+            logs.extend(doc.to_dict().get("logs", []))
+
+        for entry in self._entries_query(day_ref).stream():
+            logs.append(entry.to_dict().get("log", ""))
+        return logs
+
+    async def adownload_log_entries(self, uid: str, date: str = None) -> list[str]:
+        """download_log_entries の非同期版 (AsyncClient を使う)"""
+        if date is None:
+            date = datetime.now().strftime("%Y-%m-%d")
+        day_ref = self._log_day_ref(uid, date, db=self.async_db)
+
+        logs = []
+        doc = await day_ref.get()
+        if doc.exists:
+            logs.extend(doc.to_dict().get("logs", []))
+
+        async for entry in self._entries_query(day_ref).stream():
+            logs.append(entry.to_dict().get("log", ""))
+        return logs
+
+    def _entries_query(self, day_ref):
+        return day_ref.collection("entries").order_by(
+            "created_at", direction=firestore.Query.ASCENDING
+        )
+
+    def download_log_entries_in_ranges(
+        self, uid: str, date: str, ranges: list[tuple[datetime, datetime]]
+    ) -> list[str]:
+        """
+        users/{uid}/logs/{date} のうち、created_at が ranges のいずれかの [start, end) に入るログを
+        書き込み順に取得する。旧形式のログは時刻で絞れないので常に先頭に含める。
+        """
+        day_ref = self._log_day_ref(uid, date)
+
+        logs = []
+        doc = day_ref.get()
+        if doc.exists:
+            logs.extend(doc.to_dict().get("logs", []))
+
+        for query in self._entries_in_ranges_queries(day_ref, ranges):
+            for entry in query.stream():
+                logs.append(entry.to_dict().get("log", ""))
+        return logs
+
+    async def adownload_log_entries_in_ranges(
+        self, uid: str, date: str, ranges: list[tuple[datetime, datetime]]
+    ) -> list[str]:
+        """download_log_entries_in_ranges の非同期版 (AsyncClient を使う)"""
+        day_ref = self._log_day_ref(uid, date, db=self.async_db)
+
+        logs = []
+        doc = await day_ref.get()
+        if doc.exists:
+            logs.extend(doc.to_dict().get("logs", []))
+
+        for query in self._entries_in_ranges_queries(day_ref, ranges):
+            async for entry in query.stream():
+                logs.append(entry.to_dict().get("log", ""))
+        return logs
+
+    def _entries_in_ranges_queries(self, day_ref, ranges: list[tuple[datetime, datetime]]):
+        entries = day_ref.collection("entries")
+        return [
+            entries.where("created_at", ">=", start)
+            .where("created_at", "<", end)
+            .order_by("created_at", direction=firestore.Query.ASCENDING)
+            for start, end in ranges
+        ]
 
     def download_log(self, uid: str, date: str = None) -> str:
         """
         ログを users/{uid}/logs/{date} から取得
         """
         logger.info(f"download_log: uid={uid} date={date}")
+        logs = self.download_log_entries(uid, date)
+        logs = [log.replace("\n", " ") for log in logs]
+        return "\n".join(logs)
+
+    def upload_log_summary(
+        self, uid: str, date: str, window_start: str, window_end: str, summary: str,
+        entry_count: int,
+    ):
+        """
+        時間帯ごとのログ要約を users/{uid}/logs/{date}/summaries/{HHMM} に保存
+        """
+        logger.info(f"upload_log_summary: uid={uid} date={date} window={window_start}")
+        summary_ref = (
+            self._log_day_ref(uid, date)
+            .collection("summaries")
+            .document(window_start.replace(":", ""))
+        )
+        summary_ref.set(
+            {
+                "window_start": window_start,
+                "window_end": window_end,
+                "summary": summary,
+                "entry_count": entry_count,
+                "updated_at": datetime.now(),
+            }
+        )
+
+    def get_log_summaries(self, uid: str, date: str = None) -> list[dict]:
+        """
+        時間帯ごとのログ要約を時刻順に取得
+        """
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
-        doc_ref = (
-            self.db.collection("users").document(uid).collection("logs").document(date)
+        logger.info(f"get_log_summaries: uid={uid} date={date}")
+        query = self._summaries_query(uid, date, self.db)
+        return [doc.to_dict() for doc in query.stream()]
+
+    async def aget_log_summaries(self, uid: str, date: str = None) -> list[dict]:
+        """get_log_summaries の非同期版 (AsyncClient を使う)"""
+        if date is None:
+            date = datetime.now().strftime("%Y-%m-%d")
+        logger.info(f"aget_log_summaries: uid={uid} date={date}")
+        query = self._summaries_query(uid, date, self.async_db)
+        return [doc.to_dict() async for doc in query.stream()]
+
+    def _summaries_query(self, uid: str, date: str, db):
+        return (
+            self._log_day_ref(uid, date, db=db)
+            .collection("summaries")
+            .order_by("window_start", direction=firestore.Query.ASCENDING)
+        )
+
+    # --- 一覧のページング ---
+    def _list_page(
+        self,
+        collection,
+        direction: str,
+        page_size: int,
+        page_token: str = None,
+        fields: list = None,
+    ):
+        """
+        created_at 順の1ページ分と次ページのトークンを返す。
+        offset は読み飛ばしたドキュメントも読み取りとして課金されるので、カーソル (start_after) で続きを取る。
+        同時刻のドキュメントがあっても取りこぼさないよう、ドキュメントIDを第2キーにする。
+        """
+        query = collection.order_by("created_at", direction=direction).order_by(
+            "__name__", direction=direction
         )
+        if fields is not None:
+            query = query.select(fields)
+        if page_token:
+            query = query.start_after(decode_page_token(page_token))
+
+        # 1件多く取得して次ページの有無を判定する
+        docs = list(query.limit(page_size + 1).stream())
+        next_page_token = None
+        if len(docs) > page_size:
+            docs = docs[:page_size]
+            last = docs[-1]
+            next_page_token = encode_page_token(last.get("created_at"), last.id)
+        return docs, next_page_token
+
+    def _count(self, uid: str, kind: str, collection) -> int:
+        """count 集計で総件数を取得する。作成・削除時に破棄し、それ以外は TTL の間キャッシュする"""
+        key = (uid, kind)
+        cached = self._count_cache.get(key)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+        result = collection.count(alias="total").get()
+        total = int(result[0][0].value)
+        self._count_cache[key] = (time.time() + LIST_COUNT_CACHE_TTL, total)
+        return total
+
+    def _invalidate_count(self, uid: str, kind: str):
+        self._count_cache.pop((uid, kind), None)
+
+    def _write_through(self, uid: str, key: tuple, doc_ref, fields: dict) -> dict:
+        """
+        更新した項目をキャッシュ済みのドキュメントに反映し、更新後のドキュメント全体を返す。
+        キャッシュに無ければ他の項目 (created_at など) が分からないので、読み直してキャッシュする
+        """
+        cached = self.document_cache.get(uid, key)
+        if cached is not None:
+            cached.update(fields)
+            self.document_cache.set(uid, key, cached)
+            return cached
+        self.document_cache.invalidate(uid, key)
         doc = doc_ref.get()
+        data = doc.to_dict() if doc.exists else {}
+        data.update(fields)
         if doc.exists:
-            logs = doc.to_dict().get("logs", [])
-            logs = [log.replace("\n", " ") for log in logs]
-            log_text = "\n".join(logs)
-            return log_text
-        else:
-            return ""
+            self.document_cache.set(uid, key, data)
+        return data
+
+    # --- 一括操作 ---
+    def _batch_get(self, uid: str, kind: str, doc_ids: list, id_key: str) -> list:
+        """
+        キャッシュに無いものだけ get_all で1回の往復でまとめて読む。
+        結果は doc_ids の順で、存在しないものは status=not_found、ID として不正なものは status=error
+        """
+        found = {}
+        missing = []
+        for doc_id in dict.fromkeys(doc_ids):
+            if not valid_document_id(doc_id):
+                continue
+            cached = self.document_cache.get(uid, (kind, doc_id))
+            if cached is not None:
+                found[doc_id] = cached
+            else:
+                missing.append(doc_id)
+
+        if missing:
+            collection = self.db.collection("users").document(uid).collection(kind)
+            refs = [collection.document(doc_id) for doc_id in missing]
+            for snapshot in self.db.get_all(refs):
+                if not snapshot.exists:
+                    continue
+                data = snapshot.to_dict()
+                data[id_key] = snapshot.id
+                self.document_cache.set(uid, (kind, snapshot.id), data)
+                found[snapshot.id] = data
+
+        results = []
+        for doc_id in doc_ids:
+            if doc_id in found:
+                results.append({id_key: doc_id, "status": "ok", "document": found[doc_id]})
+            elif not valid_document_id(doc_id):
+                results.append(_invalid_id_result(id_key, doc_id))
+            else:
+                results.append({id_key: doc_id, "status": "not_found"})
+        return results
+
+    def _commit_in_chunks(self, operations: list) -> list:
+        """
+        (項目, 書き込み関数) のリストを BATCH_WRITE_LIMIT 件ずつ WriteBatch でコミットする。
+        :return: 項目ごとの WriteResult。コミットに失敗したチャンクの項目は例外
+        """
+        results = []
+        for i in range(0, len(operations), BATCH_WRITE_LIMIT):
+            chunk = operations[i : i + BATCH_WRITE_LIMIT]
+            batch = self.db.batch()
+            for _, add_to_batch in chunk:
+                add_to_batch(batch)
+            try:
+                write_results = batch.commit()
+            except Exception as e:
+                logger.error(f"batch commit failed: {e}")
+                results.extend([e] * len(chunk))
+                continue
+            results.extend(write_results)
+        return results
+
+    def _batch_delete(self, uid: str, kind: str, doc_ids: list, id_key: str) -> list:
+        collection = self.db.collection("users").document(uid).collection(kind)
+        doc_ids = list(dict.fromkeys(doc_ids))
+        results = [
+            None if valid_document_id(doc_id) else _invalid_id_result(id_key, doc_id)
+            for doc_id in doc_ids
+        ]
+        operations = [
+            (i, lambda batch, ref=collection.document(doc_ids[i]): batch.delete(ref))
+            for i, result in enumerate(results)
+            if result is None
+        ]
+        for (i, _), result in zip(operations, self._commit_in_chunks(operations)):
+            doc_id = doc_ids[i]
+            self.document_cache.invalidate(uid, (kind, doc_id))
+            if isinstance(result, Exception):
+                results[i] = {id_key: doc_id, "status": "error", "message": str(result)}
+            else:
+                results[i] = {id_key: doc_id, "status": "deleted"}
+        self._invalidate_count(uid, kind)
+        return results
+
+    def _batch_import(self, uid: str, kind: str, documents: list, id_key: str) -> list:
+        """
+        documents (id_key を含めば そのIDで、無ければ自動採番) をまとめて作成する。
+        作成日時・更新日時はサーバー時刻で、書き込み後の読み直しはしない
+        """
+        collection = self.db.collection("users").document(uid).collection(kind)
+        results = [None] * len(documents)
+        operations = []
+        for i, document in enumerate(documents):
+            doc_id = document.get(id_key)
+            if doc_id and not valid_document_id(doc_id):
+                results[i] = _invalid_id_result(id_key, doc_id)
+                continue
+            fields = {k: v for k, v in document.items() if k != id_key}
+            ref = collection.document(doc_id or None)
+            fields["created_at"] = firestore.SERVER_TIMESTAMP
+            fields["updated_at"] = firestore.SERVER_TIMESTAMP
+            operations.append(
+                ((i, ref.id, fields), lambda batch, ref=ref, fields=fields: batch.set(ref, fields))
+            )
+
+        for ((i, doc_id, fields), _), result in zip(
+            operations, self._commit_in_chunks(operations)
+        ):
+            if isinstance(result, Exception):
+                results[i] = {id_key: doc_id, "status": "error", "message": str(result)}
+                continue
+            data = {
+                **fields,
+                "created_at": result.update_time,
+                "updated_at": result.update_time,
+                id_key: doc_id,
+            }
+            self.document_cache.set(uid, (kind, doc_id), data)
+            results[i] = {id_key: doc_id, "status": "created", "document": data}
+        self._invalidate_count(uid, kind)
+        return results
+
+    def batch_get_reports(self, uid: str, report_ids: list) -> list:
+        logger.info(f"batch_get_reports: uid={uid} count={len(report_ids)}")
+        return self._batch_get(uid, "reports", report_ids, "id")
+
+    def batch_delete_reports(self, uid: str, report_ids: list) -> list:
+        logger.info(f"batch_delete_reports: uid={uid} count={len(report_ids)}")
+        return self._batch_delete(uid, "reports", report_ids, "id")
+
+    def batch_import_reports(self, uid: str, reports: list) -> list:
+        """reports: {"title", "content"} のリスト"""
+        logger.info(f"batch_import_reports: uid={uid} count={len(reports)}")
+        return self._batch_import(
+            uid,
+            "reports",
+            [{"title": r["title"], "content": r["content"]} for r in reports],
+            "id",
+        )
+
+    def batch_get_procedures(self, uid: str, task_names: list) -> list:
+        logger.info(f"batch_get_procedures: uid={uid} count={len(task_names)}")
+        return self._batch_get(uid, "procedures", task_names, "task_name")
+
+    def batch_delete_procedures(self, uid: str, task_names: list) -> list:
+        logger.info(f"batch_delete_procedures: uid={uid} count={len(task_names)}")
+        return self._batch_delete(uid, "procedures", task_names, "task_name")
+
+    def batch_import_procedures(self, uid: str, procedures: list) -> list:
+        """procedures: {"task_name", "content"} のリスト"""
+        logger.info(f"batch_import_procedures: uid={uid} count={len(procedures)}")
+        return self._batch_import(
+            uid,
+            "procedures",
+            [{"task_name": p["task_name"], "content": p["content"]} for p in procedures],
+            "task_name",
+        )
 
     # --- レポートCRUD機能追加 ---
+    def _reports_collection(self, uid: str):
+        return self.db.collection("users").document(uid).collection("reports")
+
+    def list_reports(
+        self, uid: str, page_size: int = 10, page_token: str = None,
+        summary: bool = True,
+    ):
+        """
+        レポート一覧を作成日時の新しい順に取得する
+        :return: (レポートのリスト, 次ページのトークン。最終ページなら None)
+        """
+        logger.info(
+            "list_reports: uid=%s page_size=%s page_token=%s", uid, page_size, page_token
+        )
+        docs, next_page_token = self._list_page(
+            self._reports_collection(uid),
+            firestore.Query.DESCENDING,
+            page_size,
+            page_token,
+            fields=REPORT_SUMMARY_FIELDS if summary else None,
+        )
+        results = []
+        for d in docs:
+            dat = d.to_dict()
+            dat["id"] = d.id
+            results.append(dat)
+        return results, next_page_token
+
+    def count_reports(self, uid: str) -> int:
+        return self._count(uid, "reports", self._reports_collection(uid))
+
     def get_reports(self, uid: str, page: int = 1, page_size: int = 10):
         logger.info("get_reports: uid=%s page=%s page_size=%s", uid, page, page_size)
         reports_collection = (
@@ -90,6 +626,9 @@ class FirestoreService:
     def get_report(self, uid: str, report_id: str):
         """レポート詳細取得"""
         logger.info(f"get_report: uid={uid}, report_id={report_id}")
+        cached = self.document_cache.get(uid, ("reports", report_id))
+        if cached is not None:
+            return cached
 
         doc_ref = (
             self.db.collection("users")
@@ -101,6 +640,7 @@ class FirestoreService:
         if doc.exists:
             data = doc.to_dict()
             data["id"] = doc.id
+            self.document_cache.set(uid, ("reports", report_id), data)
             return data
         return None
 
@@ -108,20 +648,39 @@ class FirestoreService:
         """レポート新規作成"""
         logger.info(f"create_report: uid={uid} title={title}")
 
-        users_doc = self.db.collection("users").document(uid)
-        reports_ref = users_doc.collection("reports")
-        new_doc = reports_ref.document()
-        now = datetime.now()
-        new_doc.set(
-            {
-                "title": title,
-                "content": content,
-                "created_at": now,
-                "updated_at": now,
-            }
+        new_doc = self.db.collection("users").document(uid).collection("reports").document()
+        write_result = new_doc.set(self._new_report_fields(title, content))
+        return self._report_created(uid, new_doc.id, title, content, write_result)
+
+    async def acreate_report(self, uid: str, title: str, content: str):
+        """create_report の非同期版 (AsyncClient を使う)"""
+        logger.info(f"acreate_report: uid={uid} title={title}")
+
+        new_doc = (
+            self.async_db.collection("users").document(uid).collection("reports").document()
         )
-        data = new_doc.get().to_dict()
-        data["id"] = new_doc.id
+        write_result = await new_doc.set(self._new_report_fields(title, content))
+        return self._report_created(uid, new_doc.id, title, content, write_result)
+
+    def _new_report_fields(self, title: str, content: str) -> dict:
+        return {
+            "title": title,
+            "content": content,
+            "created_at": firestore.SERVER_TIMESTAMP,
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        }
+
+    def _report_created(self, uid: str, report_id: str, title: str, content: str, write_result):
+        # 書き込み結果の時刻を使い、書き込み後に読み直さない
+        self._invalidate_count(uid, "reports")
+        data = {
+            "title": title,
+            "content": content,
+            "created_at": write_result.update_time,
+            "updated_at": write_result.update_time,
+            "id": report_id,
+        }
+        self.document_cache.set(uid, ("reports", report_id), data)
         return data
 
     def update_report(self, uid: str, report_id: str, title: str, content: str):
@@ -134,11 +693,16 @@ class FirestoreService:
             .collection("reports")
             .document(report_id)
         )
-        now = datetime.now()
-        doc_ref.update({"title": title, "content": content, "updated_at": now})
-        data = doc_ref.get().to_dict()
-        data["id"] = report_id
-        return data
+        write_result = doc_ref.update(
+            {"title": title, "content": content, "updated_at": firestore.SERVER_TIMESTAMP}
+        )
+        data = {
+            "title": title,
+            "content": content,
+            "updated_at": write_result.update_time,
+            "id": report_id,
+        }
+        return self._write_through(uid, ("reports", report_id), doc_ref, data)
 
     def delete_report(self, uid: str, report_id: str):
         """レポート削除"""
@@ -151,8 +715,42 @@ class FirestoreService:
             .document(report_id)
         )
         doc_ref.delete()
+        self.document_cache.invalidate(uid, ("reports", report_id))
+        self._invalidate_count(uid, "reports")
         return True
 
+    def _procedures_collection(self, uid: str):
+        return self.db.collection("users").document(uid).collection("procedures")
+
+    def list_procedures(
+        self, uid: str, page_size: int = 10, page_token: str = None,
+        summary: bool = True,
+    ):
+        """
+        手順一覧を作成日時の古い順に取得する
+        :return: (手順のリスト, 次ページのトークン。最終ページなら None)
+        """
+        logger.info(
+            "list_procedures: uid=%s page_size=%s page_token=%s",
+            uid, page_size, page_token,
+        )
+        docs, next_page_token = self._list_page(
+            self._procedures_collection(uid),
+            firestore.Query.ASCENDING,
+            page_size,
+            page_token,
+            fields=PROCEDURE_SUMMARY_FIELDS if summary else None,
+        )
+        results = []
+        for doc_snap in docs:
+            data = doc_snap.to_dict()
+            data["task_name"] = doc_snap.id
+            results.append(data)
+        return results, next_page_token
+
+    def count_procedures(self, uid: str) -> int:
+        return self._count(uid, "procedures", self._procedures_collection(uid))
+
     def get_procedures(self, uid: str, page: int = 1, page_size: int = 10):
         """手順一覧をタスク名の昇順でページング取得"""
         logger.info("get_procedures: uid=%s page=%s page_size=%s", uid, page, page_size)
@@ -182,6 +780,9 @@ class FirestoreService:
     def get_procedure(self, uid: str, task_name: str):
         """手順詳細取得"""
         logger.info(f"get_procedure: uid={uid}, task_name={task_name}")
+        cached = self.document_cache.get(uid, ("procedures", task_name))
+        if cached is not None:
+            return cached
 
         doc_ref = (
             self.db.collection("users")
@@ -193,6 +794,7 @@ class FirestoreService:
         if doc.exists:
             data = doc.to_dict()
             data["task_name"] = task_name
+            self.document_cache.set(uid, ("procedures", task_name), data)
             return data
         return None
 
@@ -205,16 +807,21 @@ class FirestoreService:
             .collection("procedures")
             .document(task_name)
         )
-        now = datetime.now()
-        doc_ref.set(
+        write_result = doc_ref.set(
             {
                 "content": procedure_data,
-                "created_at": now,
-                "updated_at": now,
+                "created_at": firestore.SERVER_TIMESTAMP,
+                "updated_at": firestore.SERVER_TIMESTAMP,
             }
         )
-        data = doc_ref.get().to_dict()
-        data["task_name"] = task_name
+        self._invalidate_count(uid, "procedures")
+        data = {
+            "content": procedure_data,
+            "created_at": write_result.update_time,
+            "updated_at": write_result.update_time,
+            "task_name": task_name,
+        }
+        self.document_cache.set(uid, ("procedures", task_name), data)
         return data
 
     def update_procedure(self, uid: str, task_name: str, procedure_data: str):
@@ -227,11 +834,15 @@ class FirestoreService:
             .collection("procedures")
             .document(task_name)
         )
-        now = datetime.now()
-        doc_ref.update({"content": procedure_data, "updated_at": now})
-        data = doc_ref.get().to_dict()
-        data["task_name"] = task_name
-        return data
+        write_result = doc_ref.update(
+            {"content": procedure_data, "updated_at": firestore.SERVER_TIMESTAMP}
+        )
+        data = {
+            "content": procedure_data,
+            "updated_at": write_result.update_time,
+            "task_name": task_name,
+        }
+        return self._write_through(uid, ("procedures", task_name), doc_ref, data)
 
     def delete_procedure(self, uid: str, task_name: str):
         """手順削除"""
@@ -244,7 +855,18 @@ class FirestoreService:
             .document(task_name)
         )
         doc_ref.delete()
+        self.document_cache.invalidate(uid, ("procedures", task_name))
+        self._invalidate_count(uid, "procedures")
         return True
 
 
+instrument_methods(
+    FirestoreService,
+    registry.histogram(
+        "firestore_operation_duration_seconds",
+        "Duration of FirestoreService methods",
+        ("method", "status"),
+    ),
+)
+
 firestore_service = FirestoreService()
@@ -0,0 +1,348 @@
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from enum import Enum
+
+from utils.logger import Logger
+from utils.metrics import registry
+
+
+logger = Logger(name="job_queue").get_logger()
+
+job_wait_seconds = registry.histogram(
+    "job_queue_wait_seconds", "Time jobs spent queued before a worker picked them up",
+    ("queue",),
+)
+job_run_seconds = registry.histogram(
+    "job_queue_run_seconds", "Time jobs spent running", ("queue", "status"),
+)
+
+
+class JobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """キューが上限に達していて新しいジョブを受け付けられない"""
+
+
+class Job:
+    def __init__(self, func, args: tuple, kwargs: dict, owner: str = None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = JobStatus.QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {"stage": JobStatus.QUEUED.value, "percent": 0, "message": ""}
+        # 状態・進捗が変わるたびに version を上げ、待っているスレッドを起こす
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
+
+    def touch(self):
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+
+    def update_progress(self, stage: str, percent: float = None, message: str = ""):
+        self.progress = {
+            "stage": stage,
+            "percent": self.progress["percent"] if percent is None else percent,
+            "message": message,
+        }
+        self.touch()
+
+    def wait_for_update(self, version: int, timeout: float = None) -> int:
+        """version から変化するか timeout まで待ち、現在の version を返す"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    @property
+    def wait_time(self):
+        if self.started_at is None:
+            return None
+        return self.started_at - self.created_at
+
+    @property
+    def run_time(self):
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def to_dict(self, include_result: bool = True) -> dict:
+        data = {
+            "job_id": self.id,
+            "status": self.status.value,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wait_time": self.wait_time,
+            "run_time": self.run_time,
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+# 実行中のジョブ。スレッドごと・asyncio のタスクごとに別の値になる
+_current = contextvars.ContextVar("current_job", default=None)
+
+
+def report_progress(stage: str, percent: float = None, message: str = ""):
+    """
+    ワーカー上で実行中のジョブの進捗を更新する。ジョブの外から呼ばれた場合は何もしない
+    """
+    job = _current.get()
+    if job is not None:
+        job.update_progress(stage, percent, message)
+
+
+def _percentile(samples, pct: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summarize(samples) -> dict:
+    samples = list(samples)
+    return {
+        "count": len(samples),
+        "avg": sum(samples) / len(samples) if samples else None,
+        "p50": _percentile(samples, 50),
+        "p95": _percentile(samples, 95),
+        "max": max(samples) if samples else None,
+    }
+
+
+class JobQueue:
+    """
+    上限付きのジョブキューとワーカープール。
+    submit() は即座にジョブを返し、処理はバックグラウンドのワーカースレッドで行う。
+    submit_async() はコルーチン関数のジョブを呼び出し元のイベントループ上で
+    最大 async_concurrency 件まで同時に実行する (async サーバー用)。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        num_workers: int = 4,
+        max_queue_size: int = 100,
+        max_finished_jobs: int = 1000,
+        latency_window: int = 500,
+        async_concurrency: int = 100,
+    ):
+        self.name = name
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.max_finished_jobs = max_finished_jobs
+        self.async_concurrency = async_concurrency
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._counters = {"submitted": 0, "done": 0, "failed": 0, "rejected": 0}
+        self._wait_times = deque(maxlen=latency_window)
+        self._run_times = deque(maxlen=latency_window)
+        # submit_async で積まれて実行を待っているジョブ数
+        self._async_queued = 0
+        self._async_semaphore = None
+        self._async_tasks = set()
+
+        self._workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(
+                target=self._worker_loop, name=f"{name}-worker-{i}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, func, *args, owner: str = None, **kwargs) -> Job:
+        """
+        ジョブをキューに積む。キューが満杯の場合は JobQueueFullError を送出する。
+        """
+        job = Job(func, args, kwargs, owner=owner)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._counters["rejected"] += 1
+                raise JobQueueFullError(
+                    f"{self.name} queue is full (max_queue_size={self.max_queue_size})"
+                )
+            self._jobs[job.id] = job
+            self._counters["submitted"] += 1
+            self._evict_finished_jobs()
+        logger.info(
+            f"[{self.name}] job queued: job_id={job.id} queue_depth={self._queue.qsize()}"
+        )
+        return job
+
+    def submit_async(self, coro_func, *args, owner: str = None, **kwargs) -> Job:
+        """
+        コルーチン関数のジョブをイベントループ上のタスクとして実行する。
+        イベントループ上から呼ぶこと。待ちが max_queue_size に達していれば JobQueueFullError
+        """
+        job = Job(coro_func, args, kwargs, owner=owner)
+        with self._lock:
+            if self._async_queued >= self.max_queue_size:
+                self._counters["rejected"] += 1
+                raise JobQueueFullError(
+                    f"{self.name} queue is full (max_queue_size={self.max_queue_size})"
+                )
+            if self._async_semaphore is None:
+                self._async_semaphore = asyncio.Semaphore(self.async_concurrency)
+            self._async_queued += 1
+            self._jobs[job.id] = job
+            self._counters["submitted"] += 1
+            self._evict_finished_jobs()
+        task = asyncio.get_running_loop().create_task(self._run_async(job))
+        # 実行中のタスクが GC されないよう参照を持っておく
+        self._async_tasks.add(task)
+        task.add_done_callback(self._async_tasks.discard)
+        logger.info(
+            f"[{self.name}] async job queued: job_id={job.id} "
+            f"queue_depth={self._async_queued}"
+        )
+        return job
+
+    def get_job(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "queue": self.name,
+                "queue_depth": self._queue.qsize() + self._async_queued,
+                "max_queue_size": self.max_queue_size,
+                "workers": self.num_workers,
+                "running": self._running,
+                **self._counters,
+                "wait_time": _summarize(self._wait_times),
+                "run_time": _summarize(self._run_times),
+            }
+
+    def _evict_finished_jobs(self):
+        # 完了済みジョブの保持数を制限する (キュー中・実行中のジョブは残す)
+        if len(self._jobs) <= self.max_finished_jobs:
+            return
+        for job_id in list(self._jobs.keys()):
+            if len(self._jobs) <= self.max_finished_jobs:
+                break
+            if self._jobs[job_id].status in (JobStatus.DONE, JobStatus.FAILED):
+                del self._jobs[job_id]
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            self._start(job)
+            _current.set(job)
+            try:
+                job.result = job.func(*job.args, **job.kwargs)
+                job.status = JobStatus.DONE
+            except Exception as e:
+                self._fail(job, e)
+            finally:
+                _current.set(None)
+                self._finish(job)
+                self._queue.task_done()
+
+    async def _run_async(self, job: Job):
+        async with self._async_semaphore:
+            with self._lock:
+                self._async_queued -= 1
+            self._start(job)
+            _current.set(job)
+            try:
+                job.result = await job.func(*job.args, **job.kwargs)
+                job.status = JobStatus.DONE
+            except Exception as e:
+                self._fail(job, e)
+            finally:
+                self._finish(job)
+
+    def _start(self, job: Job):
+        with self._lock:
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            self._running += 1
+            self._wait_times.append(job.wait_time)
+        job_wait_seconds.observe(job.wait_time, queue=self.name)
+        job.update_progress(JobStatus.RUNNING.value)
+
+    def _fail(self, job: Job, error: Exception):
+        job.error = str(error)
+        job.status = JobStatus.FAILED
+        logger.error(f"[{self.name}] job failed: job_id={job.id} error={error}")
+        logger.error(traceback.format_exc())
+
+    def _finish(self, job: Job):
+        with self._lock:
+            job.finished_at = time.time()
+            self._running -= 1
+            self._run_times.append(job.run_time)
+            if job.status == JobStatus.DONE:
+                self._counters["done"] += 1
+            else:
+                self._counters["failed"] += 1
+        job_run_seconds.observe(
+            job.run_time,
+            queue=self.name,
+            status="ok" if job.status == JobStatus.DONE else "error",
+        )
+        # 引数 (フレームなど) は完了後に不要なので解放する
+        job.args = ()
+        job.kwargs = {}
+        job.update_progress(
+            job.status.value, 100 if job.status == JobStatus.DONE else None
+        )
+        logger.info(
+            f"[{self.name}] job finished: job_id={job.id} status={job.status.value} "
+            f"wait={job.wait_time:.3f}s run={job.run_time:.3f}s"
+        )
+
+
+ingest_queue = JobQueue(
+    name="ingest",
+    num_workers=int(os.getenv("INGEST_WORKERS", 4)),
+    max_queue_size=int(os.getenv("INGEST_QUEUE_SIZE", 100)),
+    async_concurrency=int(os.getenv("INGEST_ASYNC_CONCURRENCY", 100)),
+)
+
+# 手順書生成 (動画推論) は長時間かかるので、フレーム取り込みとは別のプールで処理する
+procedure_queue = JobQueue(
+    name="procedure",
+    num_workers=int(os.getenv("PROCEDURE_WORKERS", 2)),
+    max_queue_size=int(os.getenv("PROCEDURE_QUEUE_SIZE", 20)),
+)
+
+# ログ要約 (LLM 呼び出し) はフレーム取り込みと取り合わないよう、少ないワーカーの別プールで処理する
+summary_queue = JobQueue(
+    name="summary",
+    num_workers=int(os.getenv("SUMMARY_WORKERS", 1)),
+    max_queue_size=int(os.getenv("SUMMARY_QUEUE_SIZE", 100)),
+)
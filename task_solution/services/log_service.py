@@ -1,25 +1,46 @@
+import asyncio
 from datetime import datetime
 
-from agents import ScreenAnalyzer
+from agents import ScreenAnalyzer, get_agent
 from agents.report_maker import (
     ReportMaker,
     TaskTypeExtractor,
     TimeTableMaker,
 )
+from agents.report_maker.time_table_maker import TimeTableList
 from services.firestore_service import firestore_service
+from services.summary_service import (
+    abuild_report_log,
+    build_report_log,
+    schedule_summarization,
+)
+from utils.frame_processor import dedupe_frames, frame_payloads
 from utils.logger import Logger
+from utils.pipeline import Pipeline
 
 
 logger = Logger(name="log_service").get_logger()
 
 
-def upload_log_from_base64_screen_shot(
-    uid: str, user_query: str, encoded_frames: list[str]
-):
+def upload_log_from_frames(
+    uid: str, user_query: str, encoded_frames: list
+) -> dict:
+    """
+    スクリーンショット群を解析してログとして保存する。
+    encoded_frames は data URL 文字列か、multipart で受け取った画像バイト列のリスト。
+    ingest キューのワーカーから呼ばれ、戻り値はジョブ結果として返却される。
+    """
     try:
-        frames = [frame.split(",")[1] for frame in encoded_frames if "," in frame]
+        frames = frame_payloads(encoded_frames)
+        total_frames = len(frames)
 
-        screen_analyzer = ScreenAnalyzer()
+        # ほぼ同一のフレームは Vertex に送る前に除外する
+        frames, dropped_frames = dedupe_frames(frames)
+        logger.info(
+            f"uid={uid}: {dropped_frames}/{total_frames} frames dropped as duplicates"
+        )
+
+        screen_analyzer = get_agent(ScreenAnalyzer)
         output = screen_analyzer.analysis(frames, user_query=user_query)
 
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -27,11 +48,65 @@ def upload_log_from_base64_screen_shot(
 
         # Firestoreにログを保存
         firestore_service.upload_log(uid, record_string)
+
+        _schedule_summarization(uid)
+        return {
+            "frames": total_frames,
+            "analyzed_frames": len(frames),
+            "dropped_frames": dropped_frames,
+            "timestamp": timestamp,
+        }
+    except Exception as e:
+        logger.error(f"Error uploading log for uid={uid}: {e}")
+        raise e
+
+
+async def aupload_log_from_frames(
+    uid: str, user_query: str, encoded_frames: list
+) -> dict:
+    """
+    upload_log_from_frames の非同期版。ingest キューの submit_async から呼ばれる
+    """
+    try:
+        frames = frame_payloads(encoded_frames)
+        total_frames = len(frames)
+
+        # デコードと dHash の計算は CPU 処理なので、イベントループを止めないようスレッドで行う
+        frames, dropped_frames = await asyncio.to_thread(dedupe_frames, frames)
+        logger.info(
+            f"uid={uid}: {dropped_frames}/{total_frames} frames dropped as duplicates"
+        )
+
+        output = await get_agent(ScreenAnalyzer).aanalysis(frames, user_query=user_query)
+
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        await firestore_service.aupload_log(uid, f"{timestamp}: {output}")
+
+        _schedule_summarization(uid)
+        return {
+            "frames": total_frames,
+            "analyzed_frames": len(frames),
+            "dropped_frames": dropped_frames,
+            "timestamp": timestamp,
+        }
     except Exception as e:
         logger.error(f"Error uploading log for uid={uid}: {e}")
         raise e
 
 
+# 旧名 (フレームが base64 の data URL だけだった頃の名前)
+upload_log_from_base64_screen_shot = upload_log_from_frames
+aupload_log_from_base64_screen_shot = aupload_log_from_frames
+
+
+def _schedule_summarization(uid: str):
+    # 時間帯が切り替わったら、終わった時間帯のログ要約をバックグラウンドで作る
+    try:
+        schedule_summarization(uid)
+    except Exception as e:
+        logger.warning(f"Failed to schedule summarization for uid={uid}: {e}")
+
+
 def make_report_by_log(uid) -> str:
     """
     指定日付のログをまとめてLLMで作業レポートを生成する
@@ -39,27 +114,88 @@ def make_report_by_log(uid) -> str:
     :return: レポート文字列
     """
 
-    log_text = firestore_service.download_log(uid)
+    # 要約済みの時間帯は要約を使い、LLM に渡すログ量を抑える
+    log_text = build_report_log(uid)
     log_text_short = log_text[:30].replace("\n", " ")
     logger.info(f"make_report_by_log: uid={uid} log_text={log_text_short}")
 
-    report_maker = ReportMaker()
-    task_type_extractor = TaskTypeExtractor()
-    time_table_maker = TimeTableMaker()
+    # 時間割だけがタスク種別に依存するので、レポート本文の生成はその連鎖と並行して走らせる
+    pipeline = Pipeline("report")
+    pipeline.add(
+        "task_types",
+        lambda: get_agent(TaskTypeExtractor).extract_task_type(log_text),
+    )
+    pipeline.add(
+        "time_table",
+        lambda task_types: get_agent(TimeTableMaker).make_time_table(
+            log_text, task_types.to_str()
+        ),
+        deps=["task_types"],
+    )
+    pipeline.add("report", lambda: get_agent(ReportMaker).make_report(log_text))
+    result = pipeline.run()
+    logger.info(f"Report pipeline: {result.to_dict()}")
+
+    if not result.ok("report"):
+        raise result.errors["report"]
 
-    task_types = task_type_extractor.extract_task_type(log_text)
+    # 時間割が作れなかった場合は作業時間・円グラフを空にしてレポートだけ保存する
+    time_table_list = result.get("time_table") or TimeTableList(time_table=[])
+    return _save_report(uid, result.get("report"), time_table_list)
 
-    time_table_list = time_table_maker.make_time_table(log_text, task_types.to_str())
-    logger.info(f"Time table created: {time_table_list.to_str()}")
 
-    report_info = report_maker.make_report(log_text)
-    mark_down_report = report_info.to_markdown(time_table_list=time_table_list)
-    logger.info(f"Report info: {report_info}")
+async def amake_report_by_log(uid) -> str:
+    """
+    make_report_by_log の非同期版。Firestore の読み書きは AsyncClient で行い、
+    グラフ描画 (Markdown 化) だけスレッドで行う
+    """
+    log_text = await abuild_report_log(uid)
+    log_text_short = log_text[:30].replace("\n", " ")
+    logger.info(f"amake_report_by_log: uid={uid} log_text={log_text_short}")
+
+    async def make_time_table():
+        task_types = await get_agent(TaskTypeExtractor).aextract_task_type(log_text)
+        return await get_agent(TimeTableMaker).amake_time_table(
+            log_text, task_types.to_str()
+        )
+
+    report_info, time_table_list = await asyncio.gather(
+        get_agent(ReportMaker).amake_report(log_text),
+        make_time_table(),
+        return_exceptions=True,
+    )
+    if isinstance(report_info, Exception):
+        raise report_info
+    if isinstance(time_table_list, Exception):
+        logger.warning(f"Time table failed and was skipped: {time_table_list}")
+        time_table_list = TimeTableList(time_table=[])
+    mark_down_report = await asyncio.to_thread(
+        _render_report, report_info, time_table_list
+    )
+    await firestore_service.acreate_report(
+        uid, title=report_info.title, content=mark_down_report
+    )
+    _log_saved_report(mark_down_report)
+    return mark_down_report
+
 
+def _save_report(uid, report_info, time_table_list: TimeTableList) -> str:
+    mark_down_report = _render_report(report_info, time_table_list)
     firestore_service.create_report(
         uid, title=report_info.title, content=mark_down_report
     )
+    _log_saved_report(mark_down_report)
+    return mark_down_report
+
+
+def _render_report(report_info, time_table_list: TimeTableList) -> str:
+    logger.info(f"Time table created: {time_table_list.to_str()}")
 
+    mark_down_report = report_info.to_markdown(time_table_list=time_table_list)
+    logger.info(f"Report info: {report_info}")
+    return mark_down_report
+
+
+def _log_saved_report(mark_down_report: str):
     mark_down_report_short = mark_down_report[:50].replace("\n", " ")
     logger.info(f"=> {mark_down_report_short}")
-    return mark_down_report
@@ -1,11 +1,15 @@
 import time
 from utils.logger import Logger
+from utils.frame_processor import frame_payloads
+from utils.metrics import stage_seconds
 
-from agents import TaskSupporter, NotifyDesider
+from agents import TaskSupporter, NotifyDesider, NotifyGate, GateDecision, get_agent
 
 # ロガー初期化
 logger = Logger(name="notify_service").get_logger()
 
+notify_gate = NotifyGate()
+
 
 def generate_notification_message(encoded_frames, log_context="") -> str:
     """
@@ -13,40 +17,82 @@ def generate_notification_message(encoded_frames, log_context="") -> str:
     log_context: 過去のサポートログのコンテキスト
     """
     start_time = time.time()
+    frames = []
     try:
-        frames = [frame.split(",")[1] for frame in encoded_frames if "," in frame]
+        frames = frame_payloads(encoded_frames)
 
-        ts = TaskSupporter()
+        ts = get_agent(TaskSupporter)
         support_info = ts.get_support(
             encoded_frames=frames,
         )
 
-        nd = NotifyDesider()
-        notify_log_string = log_context.split("\n")[0]
-        if not nd.is_need_notify(
-            support_info=support_info, log_context=notify_log_string
-        ):
-            message = ""
+        # 明らかなケースはローカルで判定し、曖昧なときだけ NotifyDesider に問い合わせる
+        gate_result = notify_gate.decide(support_info, log_context)
+        logger.info(f"notify gate: {gate_result}")
+        if gate_result.decision == GateDecision.ASK_LLM:
+            nd = get_agent(NotifyDesider)
+            notify_log_string = log_context.split("\n")[0]
+            need_notify = nd.is_need_notify(
+                support_info=support_info, log_context=notify_log_string
+            )
         else:
-            message = support_info.make_message()
+            need_notify = gate_result.decision == GateDecision.NOTIFY
 
-        end_time = time.time()
-        logger.info(
-            "generate_notification_message execution time: "
-            f"{end_time - start_time} seconds"
-        )
+        message = support_info.make_message() if need_notify else ""
+        _record_time(start_time)
         return message
     except Exception as e:
-        end_time = time.time()
+        _record_time(start_time, error=e, frames=frames, log_context=log_context)
+        return ""
+
+
+async def agenerate_notification_message(encoded_frames, log_context="") -> str:
+    """
+    generate_notification_message の非同期版 (async サーバー用)。
+    モデルの応答を待つ間イベントループを止めない
+    """
+    start_time = time.time()
+    frames = []
+    try:
+        frames = frame_payloads(encoded_frames)
+
+        support_info = await get_agent(TaskSupporter).aget_support(encoded_frames=frames)
+
+        gate_result = notify_gate.decide(support_info, log_context)
+        logger.info(f"notify gate: {gate_result}")
+        if gate_result.decision == GateDecision.ASK_LLM:
+            need_notify = await get_agent(NotifyDesider).ais_need_notify(
+                support_info=support_info, log_context=log_context.split("\n")[0]
+            )
+        else:
+            need_notify = gate_result.decision == GateDecision.NOTIFY
+
+        message = support_info.make_message() if need_notify else ""
+        _record_time(start_time)
+        return message
+    except Exception as e:
+        _record_time(start_time, error=e, frames=frames, log_context=log_context)
+        return ""
+
+
+def _record_time(start_time: float, error: Exception = None, frames=(), log_context=""):
+    end_time = time.time()
+    stage_seconds.observe(end_time - start_time, stage="notify_message")
+    if error is None:
         logger.info(
-            "generate_notification_message execution time (error): "
+            "generate_notification_message execution time: "
             f"{end_time - start_time} seconds"
         )
-        log_context_snippet = f"{log_context[:50]}..." if log_context else "N/A"
-        logger.error(
-            "通知メッセージ生成中にエラーが発生しました: "
-            f"len(frames)='{len(frames)}', "
-            f"log_context='{log_context_snippet}', "
-            f"error='{str(e)}'"
-        )
-        return ""
+        return
+
+    logger.info(
+        "generate_notification_message execution time (error): "
+        f"{end_time - start_time} seconds"
+    )
+    log_context_snippet = f"{log_context[:50]}..." if log_context else "N/A"
+    logger.error(
+        "通知メッセージ生成中にエラーが発生しました: "
+        f"len(frames)='{len(frames)}', "
+        f"log_context='{log_context_snippet}', "
+        f"error='{str(error)}'"
+    )
@@ -1,12 +1,22 @@
-from agents import ProcedureDescriptor
+from agents import ProcedureDescriptor, get_agent
 from services.firestore_service import firestore_service
+from services.job_queue import report_progress
 from utils.logger import Logger
 
 logger = Logger(name="procedure_service").get_logger()
 
 
+def _report_segment_progress(done: int, total: int):
+    """分割モードの区間の進み具合を 10% - 90% の間で報告する"""
+    report_progress("analyzing", 10 + 80 * done // total, f"区間 {done}/{total} を解析しました")
+
+
 def make_procedure_from_mp4(
-    uid: str, video_url: str, user_request: str, task_name: str = ""
+    uid: str,
+    video_url: str,
+    user_request: str,
+    task_name: str = "",
+    duration_seconds: float = None,
 ):
     """
     base64エンコードされたスクリーンショット群から手順書を生成する
@@ -18,15 +28,21 @@ def make_procedure_from_mp4(
     logger.info(f"uid: {uid}, task_name: {task_name}, user_request: '{user_request}'")
 
     # ProcedureDescriptorで手順書体裁に
-    procedure_descriptor = ProcedureDescriptor()
+    report_progress("analyzing", 10, "動画を解析しています")
+    procedure_descriptor = get_agent(ProcedureDescriptor)
     procedure_info = procedure_descriptor.analyze_video(
         task_name=task_name,
         video_uri=video_url,
         user_query=user_request,
+        duration_seconds=duration_seconds,
+        on_segment_done=_report_segment_progress,
     )
+    if procedure_info.timings:
+        logger.info(f"procedure segment timings: {procedure_info.timings}")
 
     procedure_doc = procedure_info.to_document()
     logger.info(f"procedure_doc: {procedure_doc}")
 
+    report_progress("saving", 90, "手順書を保存しています")
     firestore_service.create_procedure(uid, task_name, procedure_doc)
     return procedure_doc
@@ -0,0 +1,221 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from agents import get_agent
+from agents.report_maker import LogSummarizer
+from services.firestore_service import firestore_service
+from services.job_queue import summary_queue, JobQueueFullError
+from utils.logger import Logger
+
+
+logger = Logger(name="summary_service").get_logger()
+
+# ログを要約する時間帯の幅 (分)
+SUMMARY_WINDOW_MINUTES = int(os.getenv("SUMMARY_WINDOW_MINUTES", 30))
+
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# ログ本文の時刻と created_at (書き込み時刻) のずれを吸収するため、生ログを取る範囲を前後に広げる幅
+_CREATED_AT_SLACK = timedelta(minutes=1)
+
+_state_lock = threading.Lock()
+# uid ごとに最後に要約処理を予約した時間帯の開始時刻 (今の時間帯に予約したユーザーだけを持つ)
+_last_scheduled_window = {}
+# _last_scheduled_window を最後に整理した時間帯
+_pruned_window = None
+# 要約処理中の uid (同じユーザーの要約を並行して走らせない)
+_running_uids = set()
+
+
+def _parse_log_timestamp(log: str):
+    """
+    "YYYY-MM-DD HH:MM:SS: ..." 形式のログから時刻を取り出す。形式が違えば None
+    """
+    try:
+        return datetime.strptime(log[:19], _TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def _window_start(dt: datetime) -> datetime:
+    minutes = (dt.hour * 60 + dt.minute) // SUMMARY_WINDOW_MINUTES * SUMMARY_WINDOW_MINUTES
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(
+        minutes=minutes
+    )
+
+
+def _group_by_window(logs: list[str]) -> tuple[OrderedDict, list[str]]:
+    """
+    ログを時間帯ごとにまとめる。
+    :return: (時間帯の開始時刻 -> ログのリスト, 時刻が読めなかったログ)
+    """
+    windows = OrderedDict()
+    untimed = []
+    for log in logs:
+        timestamp = _parse_log_timestamp(log)
+        if timestamp is None:
+            untimed.append(log)
+            continue
+        windows.setdefault(_window_start(timestamp), []).append(log)
+    return windows, untimed
+
+
+def _format_window(start: datetime) -> tuple[str, str]:
+    end = start + timedelta(minutes=SUMMARY_WINDOW_MINUTES)
+    return start.strftime("%H:%M"), end.strftime("%H:%M")
+
+
+def summarize_closed_windows(uid: str, date: str = None) -> int:
+    """
+    終了済みでまだ要約のない時間帯のログを要約して保存する。
+    date を省略すると今日に加えて直前の時間帯の日付も見る (日付をまたいだ直後に前日最後の時間帯を要約する)
+    :return: 新たに要約した時間帯の数
+    """
+    with _state_lock:
+        if uid in _running_uids:
+            return 0
+        _running_uids.add(uid)
+    try:
+        now = datetime.now()
+        if date:
+            dates = [date]
+        else:
+            previous = now - timedelta(minutes=SUMMARY_WINDOW_MINUTES)
+            dates = sorted({previous.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d")})
+        return sum(_summarize_date(uid, d, now) for d in dates)
+    finally:
+        with _state_lock:
+            _running_uids.discard(uid)
+
+
+def _summarize_date(uid: str, date: str, now: datetime) -> int:
+    logs = firestore_service.download_log_entries(uid, date)
+    windows, _ = _group_by_window(logs)
+    summarized = {s["window_start"] for s in firestore_service.get_log_summaries(uid, date)}
+
+    count = 0
+    for start, window_logs in windows.items():
+        window_start, window_end = _format_window(start)
+        closed = start + timedelta(minutes=SUMMARY_WINDOW_MINUTES) <= now
+        if not closed or window_start in summarized:
+            continue
+        log_text = "\n".join(log.replace("\n", " ") for log in window_logs)
+        summary = get_agent(LogSummarizer).summarize(log_text, f"{window_start}-{window_end}")
+        firestore_service.upload_log_summary(
+            uid, date, window_start, window_end, summary.summary, len(window_logs)
+        )
+        count += 1
+    logger.info(f"summarize_closed_windows: uid={uid} date={date} summarized={count}")
+    return count
+
+
+def schedule_summarization(uid: str, now: datetime = None):
+    """
+    新しい時間帯に入ったときだけ、直前までの時間帯の要約をバックグラウンドで予約する。
+    キューが満杯なら見送り、次回のログ追加時に再度予約する。
+    """
+    global _pruned_window
+    current_window = _window_start(now or datetime.now())
+    with _state_lock:
+        if _pruned_window != current_window:
+            # 時間帯が変わったら、前の時間帯までしか予約していないユーザーを忘れる
+            for key in [k for k, w in _last_scheduled_window.items() if w < current_window]:
+                del _last_scheduled_window[key]
+            _pruned_window = current_window
+        if _last_scheduled_window.get(uid) == current_window:
+            return
+        _last_scheduled_window[uid] = current_window
+    try:
+        summary_queue.submit(summarize_closed_windows, uid, owner=uid)
+    except JobQueueFullError:
+        logger.warning(f"schedule_summarization: queue full, skipped uid={uid}")
+        with _state_lock:
+            _last_scheduled_window.pop(uid, None)
+
+
+def _unsummarized_ranges(date: str, summaries) -> list[tuple[datetime, datetime]]:
+    """
+    date の1日のうち、要約のない時間の範囲 [start, end) のリスト。
+    created_at とログ本文の時刻のずれに備えて、各範囲を _CREATED_AT_SLACK だけ広げる
+    """
+    day_start = datetime.strptime(date, "%Y-%m-%d")
+    day_end = day_start + timedelta(days=1)
+    covered = []
+    for summary in summaries:
+        start = datetime.combine(
+            day_start, datetime.strptime(summary["window_start"], "%H:%M").time()
+        )
+        end = datetime.combine(
+            day_start, datetime.strptime(summary["window_end"], "%H:%M").time()
+        )
+        if end <= start:
+            # 23:30-00:00 のように日付をまたぐ時間帯
+            end += timedelta(days=1)
+        covered.append((start, end))
+
+    ranges = []
+    cursor = day_start
+    for start, end in sorted(covered):
+        if start > cursor:
+            ranges.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < day_end:
+        ranges.append((cursor, day_end))
+    return [(start - _CREATED_AT_SLACK, end + _CREATED_AT_SLACK) for start, end in ranges]
+
+
+def build_report_log(uid: str, date: str = None) -> str:
+    """
+    レポート生成用のログを組み立てる。
+    要約済みの時間帯は要約を、まだ要約のない時間帯 (記録中の時間帯など) は生ログを使い、時刻順に並べる。
+    生ログは要約のない時間帯の分だけ取得する。
+    """
+    date = date or datetime.now().strftime("%Y-%m-%d")
+    summaries = firestore_service.get_log_summaries(uid, date)
+    if not summaries:
+        return _assemble_report_log(date, [], firestore_service.download_log_entries(uid, date))
+
+    logs = firestore_service.download_log_entries_in_ranges(
+        uid, date, _unsummarized_ranges(date, summaries)
+    )
+    return _assemble_report_log(date, summaries, logs)
+
+
+async def abuild_report_log(uid: str, date: str = None) -> str:
+    """build_report_log の非同期版 (Firestore の読み込みに AsyncClient を使う)"""
+    date = date or datetime.now().strftime("%Y-%m-%d")
+    summaries = await firestore_service.aget_log_summaries(uid, date)
+    if not summaries:
+        logs = await firestore_service.adownload_log_entries(uid, date)
+        return _assemble_report_log(date, [], logs)
+
+    logs = await firestore_service.adownload_log_entries_in_ranges(
+        uid, date, _unsummarized_ranges(date, summaries)
+    )
+    return _assemble_report_log(date, summaries, logs)
+
+
+def _assemble_report_log(date: str, summaries: list[dict], logs: list[str]) -> str:
+    if not summaries:
+        return "\n".join(log.replace("\n", " ") for log in logs)
+
+    windows, untimed = _group_by_window(logs)
+    day_start = datetime.strptime(date, "%Y-%m-%d")
+    summary_windows = {
+        datetime.combine(
+            day_start, datetime.strptime(summary["window_start"], "%H:%M").time()
+        ): summary
+        for summary in summaries
+    }
+
+    lines = [log.replace("\n", " ") for log in untimed]
+    # 要約済みの時間帯は、範囲の余白で取れた生ログより要約を優先する
+    for start in sorted(summary_windows.keys() | windows.keys()):
+        summary = summary_windows.get(start)
+        if summary:
+            text = summary["summary"].replace("\n", " ")
+            lines.append(f"[{summary['window_start']}-{summary['window_end']} の要約] {text}")
+        else:
+            lines.extend(log.replace("\n", " ") for log in windows[start])
+    return "\n".join(lines)
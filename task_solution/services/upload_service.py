@@ -0,0 +1,492 @@
+import datetime
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+from utils.logger import Logger
+from utils.metrics import stage_seconds
+
+
+logger = Logger(name="upload_service").get_logger()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # task_solution
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", 2 * 1024 * 1024 * 1024))
+# complete されないままのアップロードセッションを削除するまでの時間と、削除処理の間隔
+UPLOAD_SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL_SECONDS", 24 * 3600))
+UPLOAD_SWEEP_INTERVAL = float(os.getenv("UPLOAD_SWEEP_SECONDS", 3600))
+# GCS の compose は1回あたり32オブジェクトまで
+COMPOSE_MAX_SOURCES = 32
+_READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """クライアントの入力が不正 (400)"""
+
+
+class UploadNotFoundError(Exception):
+    """アップロードセッションが存在しない、または別ユーザーのもの (404)"""
+
+
+class _HashingReader:
+    """読み出しながら SHA-256 とバイト数を数える。チャンクを丸ごとメモリに載せないためのラッパー"""
+
+    def __init__(self, stream, limit: int):
+        self._stream = stream
+        self._limit = limit
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._limit + 1 - self.size
+        # ソケットからは要求より短く返ることがあるので、EOF か要求サイズまで読む
+        parts = []
+        remaining = size
+        while remaining > 0:
+            part = self._stream.read(min(remaining, _READ_SIZE))
+            if not part:
+                break
+            parts.append(part)
+            remaining -= len(part)
+        data = b"".join(parts)
+        self.size += len(data)
+        if self.size > self._limit:
+            raise UploadError("Chunk is larger than the negotiated chunk size")
+        self.digest.update(data)
+        return data
+
+    def tell(self) -> int:
+        return self.size
+
+
+class UploadBackend(ABC):
+    """アップロード先のオブジェクトストレージ"""
+
+    @abstractmethod
+    def write_stream(self, name: str, reader, content_type: str, size: int = None) -> None:
+        pass
+
+    @abstractmethod
+    def write_text(self, name: str, text: str) -> None:
+        pass
+
+    @abstractmethod
+    def read_text(self, name: str):
+        """存在しなければ None"""
+        pass
+
+    @abstractmethod
+    def list_sizes(self, prefix: str) -> dict:
+        """prefix 配下のオブジェクト名 -> サイズ"""
+        pass
+
+    @abstractmethod
+    def list_dirs(self, prefix: str) -> list:
+        """prefix 直下の「ディレクトリ」名 (prefix と末尾の / を除いたもの)"""
+        pass
+
+    @abstractmethod
+    def compose(self, sources: list, dest: str, content_type: str) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, names: list) -> None:
+        pass
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> None:
+        pass
+
+    @abstractmethod
+    def public_url(self, name: str) -> str:
+        pass
+
+
+class LocalUploadBackend(UploadBackend):
+    """
+    バケットの代わりにローカルディレクトリを使う (開発・テスト用)。
+    結合した動画は url_prefix 配下の URL (app.py の /uploads/<name>) で配信する
+    """
+
+    def __init__(self, root: str, url_prefix: str = "/uploads"):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip("/")
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, *name.split("/"))
+
+    def write_stream(self, name: str, reader, content_type: str, size: int = None) -> None:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(reader, f, _READ_SIZE)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def write_text(self, name: str, text: str) -> None:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def read_text(self, name: str):
+        try:
+            with open(self._path(name), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def list_sizes(self, prefix: str) -> dict:
+        directory = self._path(prefix.rstrip("/"))
+        if not os.path.isdir(directory):
+            return {}
+        return {
+            f"{prefix}{name}": os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory)
+            if not name.endswith(".tmp")
+        }
+
+    def list_dirs(self, prefix: str) -> list:
+        directory = self._path(prefix.rstrip("/"))
+        if not os.path.isdir(directory):
+            return []
+        return [
+            name for name in os.listdir(directory)
+            if os.path.isdir(os.path.join(directory, name))
+        ]
+
+    def compose(self, sources: list, dest: str, content_type: str) -> None:
+        reader = _ConcatReader([self._path(name) for name in sources])
+        try:
+            self.write_stream(dest, reader, content_type)
+        finally:
+            reader.close()
+
+    def delete(self, names: list) -> None:
+        for name in names:
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def delete_prefix(self, prefix: str) -> None:
+        shutil.rmtree(self._path(prefix.rstrip("/")), ignore_errors=True)
+
+    def public_url(self, name: str) -> str:
+        return f"{self.url_prefix}/{name}"
+
+
+class _ConcatReader:
+    def __init__(self, paths: list):
+        self._paths = list(paths)
+        self._current = None
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self._current is None:
+                if not self._paths:
+                    return b""
+                self._current = open(self._paths.pop(0), "rb")
+            data = self._current.read(size)
+            if data:
+                return data
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+
+
+class GCSUploadBackend(UploadBackend):
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+        self._lock = threading.Lock()
+        self._client = None
+
+    @property
+    def bucket(self):
+        with self._lock:
+            if self._client is None:
+                from google.cloud import storage
+
+                self._client = storage.Client()
+        return self._client.bucket(self.bucket_name)
+
+    def write_stream(self, name: str, reader, content_type: str, size: int = None) -> None:
+        with stage_seconds.time(stage="gcs_upload"):
+            self.bucket.blob(name).upload_from_file(
+                reader, size=size, content_type=content_type
+            )
+
+    def write_text(self, name: str, text: str) -> None:
+        self.bucket.blob(name).upload_from_string(
+            text, content_type="application/json"
+        )
+
+    def read_text(self, name: str):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return self.bucket.blob(name).download_as_text()
+        except NotFound:
+            return None
+
+    def list_sizes(self, prefix: str) -> dict:
+        return {blob.name: blob.size for blob in self.bucket.list_blobs(prefix=prefix)}
+
+    def list_dirs(self, prefix: str) -> list:
+        blobs = self.bucket.list_blobs(prefix=prefix, delimiter="/")
+        # prefixes はページを読み進めると埋まる
+        for _ in blobs.pages:
+            pass
+        return [name[len(prefix):].rstrip("/") for name in blobs.prefixes]
+
+    def compose(self, sources: list, dest: str, content_type: str) -> None:
+        bucket = self.bucket
+        intermediates = []
+        # 32個を超える場合は中間オブジェクトにまとめてから再度 compose する
+        while len(sources) > COMPOSE_MAX_SOURCES:
+            grouped = []
+            for i in range(0, len(sources), COMPOSE_MAX_SOURCES):
+                part_name = f"{dest}.compose-{len(intermediates)}"
+                bucket.blob(part_name).compose(
+                    [bucket.blob(name) for name in sources[i : i + COMPOSE_MAX_SOURCES]]
+                )
+                intermediates.append(part_name)
+                grouped.append(part_name)
+            sources = grouped
+        dest_blob = bucket.blob(dest)
+        dest_blob.content_type = content_type
+        with stage_seconds.time(stage="gcs_compose"):
+            dest_blob.compose([bucket.blob(name) for name in sources])
+        self.delete(intermediates)
+
+    def delete(self, names: list) -> None:
+        from google.api_core.exceptions import NotFound
+
+        for name in names:
+            try:
+                self.bucket.blob(name).delete()
+            except NotFound:
+                pass
+
+    def delete_prefix(self, prefix: str) -> None:
+        self.delete([blob.name for blob in self.bucket.list_blobs(prefix=prefix)])
+
+    def public_url(self, name: str) -> str:
+        blob = self.bucket.blob(name)
+        blob.make_public()
+        return blob.public_url
+
+
+class UploadService:
+    """
+    分割・再開可能な動画アップロード。
+    init -> チャンクごとの PUT (SHA-256 で検証) -> complete の順に呼ぶ。
+    チャンクは受信しながらそのままストレージへ書き込み、complete でサーバー側で1つのオブジェクトに結合する。
+    セッション情報もストレージに置くので、インスタンスが変わっても続きから再開できる。
+    作成から session_ttl 秒経っても complete されないセッションは、チャンクごと削除する
+    (init_upload のたびに、sweep_interval 秒に1回までバックグラウンドで掃除する)。
+    """
+
+    def __init__(self, backend: UploadBackend, chunk_size: int, max_size: int,
+                 prefix: str = "uploads/", session_ttl: float = UPLOAD_SESSION_TTL,
+                 sweep_interval: float = UPLOAD_SWEEP_INTERVAL):
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.prefix = prefix
+        self.session_ttl = session_ttl
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._last_sweep = 0
+
+    def _session_name(self, upload_id: str) -> str:
+        return f"{self.prefix}{upload_id}/session.json"
+
+    def _chunk_prefix(self, upload_id: str) -> str:
+        return f"{self.prefix}{upload_id}/chunks/"
+
+    def _chunk_name(self, upload_id: str, index: int) -> str:
+        return f"{self._chunk_prefix(upload_id)}{index:06d}"
+
+    def _load_session(self, uid: str, upload_id: str) -> dict:
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id or ""):
+            raise UploadNotFoundError(upload_id)
+        text = self.backend.read_text(self._session_name(upload_id))
+        if text is None:
+            raise UploadNotFoundError(upload_id)
+        session = json.loads(text)
+        if session["owner"] != uid or self._expired(session):
+            raise UploadNotFoundError(upload_id)
+        return session
+
+    def _expired(self, session: dict, now: float = None) -> bool:
+        return (now or time.time()) - session["created_at"] > self.session_ttl
+
+    def sweep_expired(self) -> int:
+        """
+        期限切れのセッションと、セッション情報のないチャンクを削除する。
+        :return: 削除したセッション数
+        """
+        now = time.time()
+        removed = 0
+        for upload_id in self.backend.list_dirs(self.prefix):
+            text = self.backend.read_text(self._session_name(upload_id))
+            if text is not None and not self._expired(json.loads(text), now):
+                continue
+            self.backend.delete_prefix(f"{self.prefix}{upload_id}/")
+            removed += 1
+        if removed:
+            logger.info(f"Removed {removed} expired upload sessions")
+        return removed
+
+    def _maybe_sweep(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+
+        def sweep():
+            try:
+                self.sweep_expired()
+            except Exception as e:
+                logger.warning(f"Failed to sweep expired uploads: {e}")
+
+        threading.Thread(target=sweep, name="upload-sweep", daemon=True).start()
+
+    def _expected_chunk_size(self, session: dict, index: int) -> int:
+        if index < session["total_chunks"] - 1:
+            return session["chunk_size"]
+        return session["size"] - session["chunk_size"] * (session["total_chunks"] - 1)
+
+    def init_upload(self, uid: str, filename: str, size: int, content_type: str) -> dict:
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("size must be a positive integer")
+        if size > self.max_size:
+            raise UploadError(f"File is too large (max {self.max_size} bytes)")
+        # os.path.basename は実行環境の区切り文字しか見ないので、/ と \ の両方で切る
+        filename = re.split(r"[/\\]", filename or "")[-1] or "video.webm"
+        self._maybe_sweep()
+        upload_id = uuid.uuid4().hex
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        session = {
+            "upload_id": upload_id,
+            "owner": uid,
+            "filename": filename,
+            "object_name": f"{timestamp}_{upload_id}_{filename}",
+            "content_type": content_type or "application/octet-stream",
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": math.ceil(size / self.chunk_size),
+            "created_at": time.time(),
+        }
+        self.backend.write_text(self._session_name(upload_id), json.dumps(session))
+        logger.info(
+            f"Upload session created: upload_id={upload_id}, uid={uid}, size={size}"
+        )
+        return self._public_session(session)
+
+    def put_chunk(self, uid: str, upload_id: str, index: int, stream,
+                  checksum: str) -> dict:
+        session = self._load_session(uid, upload_id)
+        if not 0 <= index < session["total_chunks"]:
+            raise UploadError(f"Chunk index out of range: {index}")
+        if not checksum:
+            raise UploadError("X-Chunk-SHA256 header is required")
+
+        expected_size = self._expected_chunk_size(session, index)
+        name = self._chunk_name(upload_id, index)
+        reader = _HashingReader(stream, limit=expected_size)
+        try:
+            self.backend.write_stream(
+                name, reader, "application/octet-stream", size=expected_size
+            )
+        except Exception as e:
+            # 短い・途中で切れたボディでは GCS のクライアントが ValueError などを送出するので、
+            # 書きかけのオブジェクトを消してクライアントが再送できる UploadError にする
+            self.backend.delete([name])
+            if isinstance(e, UploadError):
+                raise
+            logger.warning(f"Failed to store chunk {index} of {upload_id}: {e}")
+            raise UploadError(f"Failed to store chunk {index}: {e}") from e
+        if reader.size != expected_size or reader.digest.hexdigest() != checksum.lower():
+            self.backend.delete([name])
+            raise UploadError(f"Checksum or size mismatch for chunk {index}")
+        return self.progress(uid, upload_id, session=session)
+
+    def progress(self, uid: str, upload_id: str, session: dict = None) -> dict:
+        session = session or self._load_session(uid, upload_id)
+        sizes = self.backend.list_sizes(self._chunk_prefix(upload_id))
+        received = sorted(int(name.rsplit("/", 1)[-1]) for name in sizes)
+        received_bytes = sum(sizes.values())
+        missing = sorted(set(range(session["total_chunks"])) - set(received))
+        return {
+            **self._public_session(session),
+            "received_chunks": len(received),
+            "received_bytes": received_bytes,
+            "missing_chunks": missing,
+            "progress": received_bytes / session["size"],
+        }
+
+    def complete(self, uid: str, upload_id: str) -> dict:
+        session = self._load_session(uid, upload_id)
+        status = self.progress(uid, upload_id, session=session)
+        if status["missing_chunks"]:
+            raise UploadError(
+                f"Missing chunks: {status['missing_chunks'][:10]}"
+            )
+        chunk_names = [
+            self._chunk_name(upload_id, i) for i in range(session["total_chunks"])
+        ]
+        self.backend.compose(
+            chunk_names, session["object_name"], session["content_type"]
+        )
+        video_url = self.backend.public_url(session["object_name"])
+        self.backend.delete_prefix(f"{self.prefix}{upload_id}/")
+        logger.info(
+            f"Upload completed: upload_id={upload_id}, object={session['object_name']}"
+        )
+        return {"video_url": video_url, "object_name": session["object_name"]}
+
+    def _public_session(self, session: dict) -> dict:
+        return {
+            "upload_id": session["upload_id"],
+            "size": session["size"],
+            "chunk_size": session["chunk_size"],
+            "total_chunks": session["total_chunks"],
+        }
+
+
+def create_upload_backend() -> UploadBackend:
+    backend = os.getenv("UPLOAD_BACKEND", "gcs").lower()
+    if backend == "local":
+        return LocalUploadBackend(
+            os.getenv("UPLOAD_LOCAL_DIR") or os.path.join(BASE_DIR, "temp_uploads")
+        )
+    if backend != "gcs":
+        raise ValueError(f"Unknown UPLOAD_BACKEND: {backend}")
+    return GCSUploadBackend(os.getenv("BUCKET_NAME"))
+
+
+upload_service = UploadService(
+    backend=create_upload_backend(),
+    chunk_size=UPLOAD_CHUNK_SIZE,
+    max_size=UPLOAD_MAX_SIZE,
+)
@@ -4,6 +4,8 @@
 
     let procedureCurrentPage = 1;
     let procedurePageSize = 10;
+    // procedurePageTokens[n - 1] がページ n を取得するためのトークン (1ページ目は null)
+    let procedurePageTokens = [null];
     let currentProcedure = null;
     let procedureIsEditing = false;
     let procedureIsDirty = false;
@@ -18,12 +20,20 @@
             // console.warn(`Invalid page value '${page}' received. Defaulting to 1.`); // Removed
             newPage = 1;
         }
+        if (newPage === 1 || procedurePageTokens[newPage - 1] === undefined) {
+            // トークンの分からないページには飛べないので1ページ目から読み直す
+            newPage = 1;
+            procedurePageTokens = [null];
+        }
         procedureCurrentPage = newPage;
-        // Ensure procedureCurrentPage is used in the fetch URL
         // console.log("Sanitized procedureCurrentPage:", procedureCurrentPage); // For debugging
 
+        const params = new URLSearchParams({ page_size: procedurePageSize, include_total: "1" });
+        const pageToken = procedurePageTokens[procedureCurrentPage - 1];
+        if (pageToken) params.set("page_token", pageToken);
+
         try {
-            const res = await fetch(`/api/procedures?page=${procedureCurrentPage}&page_size=${procedurePageSize}`);
+            const res = await fetch(`/api/procedures?${params}`);
             console.log("Response status for /api/procedures:", res.status);
             const data = await res.json();
             console.log("/api/procedures response JSON:", data);
@@ -32,11 +42,18 @@
                 return;
             }
             const procedures = data.procedures;
+            if (data.next_page_token) {
+                procedurePageTokens[procedureCurrentPage] = data.next_page_token;
+            } else {
+                procedurePageTokens.length = procedureCurrentPage;
+            }
+            const totalPages = data.total !== undefined ? Math.max(1, Math.ceil(data.total / procedurePageSize)) : null;
+            const pageInfoText = totalPages ? `ページ ${procedureCurrentPage} / ${totalPages}` : `ページ ${procedureCurrentPage}`;
             const container = document.getElementById("procedureListContainer");
             container.innerHTML = "";
             if (procedures.length === 0) {
                 container.innerHTML = "<p>手順書がありません</p>";
-                document.getElementById("procedurePageInfo").textContent = `ページ ${procedureCurrentPage}`;
+                document.getElementById("procedurePageInfo").textContent = pageInfoText;
                 document.getElementById("prevProcedurePageBtn").disabled = true;
                 document.getElementById("nextProcedurePageBtn").disabled = true;
                 return;
@@ -51,20 +68,11 @@
                 ul.appendChild(li);
             });
             container.appendChild(ul);
-            document.getElementById("procedurePageInfo").textContent = `ページ ${procedureCurrentPage}`;
-
-            // ページングボタン制御
-            const prevBtn = document.getElementById("prevProcedurePageBtn");
-            const nextBtn = document.getElementById("nextProcedurePageBtn");
-            // 1ページしか存在しない場合は両方無効
-            if (procedureCurrentPage === 1 && procedures.length < procedurePageSize) {
-                prevBtn.disabled = true;
-                nextBtn.disabled = true;
-            } else {
-                prevBtn.disabled = procedureCurrentPage === 1;
-                // Corrected line:
-                nextBtn.disabled = procedures.length < procedurePageSize;
-            }
+            document.getElementById("procedurePageInfo").textContent = pageInfoText;
+
+            // ページングボタン制御 (次ページのトークンが無ければ最終ページ)
+            document.getElementById("prevProcedurePageBtn").disabled = procedureCurrentPage === 1;
+            document.getElementById("nextProcedurePageBtn").disabled = !data.next_page_token;
         } catch (e) {
             console.error("Error calling /api/procedures:", e);
             return;
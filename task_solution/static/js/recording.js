@@ -5,12 +5,114 @@ const recordBtn = document.getElementById('recordBtn');
 const statusMessage = document.getElementById('statusMessage');
 const result = document.getElementById('result');
 
+// canvas の内容を JPEG の Blob にする (toBlob のコールバックを Promise にしたもの)
+function canvasToBlob(canvas, type, quality) {
+    return new Promise((resolve, reject) => {
+        canvas.toBlob(blob => {
+            if (blob) {
+                resolve(blob);
+            } else {
+                reject(new Error('canvas.toBlob failed'));
+            }
+        }, type, quality);
+    });
+}
+
+// フレームを送る fetch のオプションを作る。
+// Blob のフレームは multipart の frames パートとしてバイナリのまま送り (Content-Type はブラウザが付ける)、
+// 文字列 (data URL) のフレームは従来どおり JSON で送る
+function buildFramesRequest(frames, fields) {
+    if (frames.length > 0 && frames[0] instanceof Blob) {
+        const formData = new FormData();
+        frames.forEach((frame, i) => formData.append('frames', frame, `frame-${i}.jpg`));
+        Object.entries(fields).forEach(([key, value]) => formData.append(key, value));
+        return { method: 'POST', body: formData };
+    }
+    return {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ frames: frames, ...fields })
+    };
+}
+
+// fetch のボディを CompressionStream で圧縮し、Content-Encoding を付ける。
+// FormData は Response を通して multipart にしてから圧縮する (boundary 付きの Content-Type もそこから取る)。
+// encoding が 'none' か、ブラウザが CompressionStream に対応していなければそのまま返す
+async function compressRequest(init, encoding) {
+    if (!encoding || encoding === 'none' || typeof CompressionStream === 'undefined') {
+        return init;
+    }
+    const source = new Response(init.body);
+    const headers = new Headers(init.headers);
+    if (!headers.has('Content-Type') && source.headers.has('Content-Type')) {
+        headers.set('Content-Type', source.headers.get('Content-Type'));
+    }
+    headers.set('Content-Encoding', encoding);
+    const body = await new Response(source.body.pipeThrough(new CompressionStream(encoding))).blob();
+    return { ...init, headers, body };
+}
+
+// 縮小したキャンバスで直前に残したフレームとの差分を測る (フル解像度の描画・エンコードより十分軽い)
+class FrameChangeDetector {
+    constructor(width, pixelThreshold) {
+        this.width = width;
+        this.pixelThreshold = pixelThreshold;
+        this.canvas = document.createElement('canvas');
+        this.ctx = this.canvas.getContext('2d', { willReadFrequently: true });
+        this.previous = null;
+        this.current = null;
+    }
+
+    // 輝度の差が pixelThreshold を超えた画素の割合 (0-1) を返す。比較対象がなければ 1
+    measure(videoElement) {
+        const width = this.width;
+        const height = Math.max(1, Math.round(width * videoElement.videoHeight / videoElement.videoWidth));
+        if (this.canvas.width !== width || this.canvas.height !== height) {
+            this.canvas.width = width;
+            this.canvas.height = height;
+            this.previous = null;
+        }
+        this.ctx.drawImage(videoElement, 0, 0, width, height);
+        const pixels = this.ctx.getImageData(0, 0, width, height).data;
+        const luma = new Uint8Array(width * height);
+        let changed = 0;
+        for (let i = 0, p = 0; p < luma.length; i += 4, p++) {
+            luma[p] = (pixels[i] * 77 + pixels[i + 1] * 150 + pixels[i + 2] * 29) >> 8;
+            if (this.previous && Math.abs(luma[p] - this.previous[p]) > this.pixelThreshold) {
+                changed++;
+            }
+        }
+        this.current = luma;
+        return this.previous ? changed / luma.length : 1;
+    }
+
+    // 直前に measure したフレームを以後の比較対象にする (送ったフレームと比べるので、ゆっくりした変化も積み上がる)
+    commit() {
+        this.previous = this.current;
+    }
+}
+
 class Recorder {
     constructor(config) {
         this.config = Object.assign({
             captureInterval: 500,
             frameThreshold: 60,
-            pythonUrl: '/record_frame'
+            pythonUrl: '/record_frame',
+            // multipart: canvas.toBlob の JPEG をそのまま送る / json: data URL を JSON で送る (旧形式)
+            frameTransport: 'multipart',
+            // 'gzip' にするとボディを CompressionStream で圧縮して送る (JSON の data URL で効果が大きい)
+            requestCompression: 'none',
+            // 画面に変化がなければフレームを捨て、サンプリング間隔を captureBackoff 倍ずつ
+            // maxCaptureInterval まで延ばす。変化を検出したら captureInterval に戻す
+            adaptiveCapture: true,
+            maxCaptureInterval: 5000,
+            captureBackoff: 1.5,
+            changeThreshold: 0.01, // 変化した画素の割合がこれ未満なら同じ画面とみなす
+            pixelDiffThreshold: 16, // 輝度 (0-255) の差がこれを超えた画素を変化とみなす
+            diffWidth: 64, // 変化検出用キャンバスの幅
+            keyframeInterval: 60000, // 変化がなくてもこの間隔で 1 枚は送る
+            flushInterval: 30000, // frameThreshold に満たなくても、最初のフレームからこの時間で送る
+            maxFrameEdge: 1280 // 送るフレームの長辺 (サーバー側の縮小と同じ)
         }, config);
         this.isRecording = false;
         this.mediaStream = null;
@@ -19,6 +121,15 @@ class Recorder {
         this.canvas = null;
         this.ctx = null;
         this.frameBuffer = [];
+        this.bufferStartedAt = 0;
+        this.changeDetector = null;
+        this.currentInterval = this.config.captureInterval;
+        this.lastCaptureAt = 0;
+        // 前回の送信以降の件数 (送信時にサーバーへ報告してリセットする) と累計
+        this.captureStats = { sampled: 0, captured: 0, skipped: 0 };
+        this.captureTotals = { sampled: 0, captured: 0, skipped: 0 };
+        // 送信中の sendFrames。キャプチャは送信を待たずに続け、stop() でまとめて待つ
+        this.pendingSends = new Set();
         this.latestFrameForAINotify = null; // Added for AI notify
         this.lastFrameSentToAINotify = null; // Added to track last sent frame for AI notify
     }
@@ -41,8 +152,11 @@ class Recorder {
             await new Promise(resolve => {
                 this.videoElement.onloadedmetadata = () => {
                     this.videoElement.play();
-                    this.canvas.width = this.videoElement.videoWidth;
-                    this.canvas.height = this.videoElement.videoHeight;
+                    // 長辺 maxFrameEdge に縮めて描画・エンコードする
+                    const { videoWidth, videoHeight } = this.videoElement;
+                    const scale = Math.min(1, this.config.maxFrameEdge / Math.max(videoWidth, videoHeight));
+                    this.canvas.width = Math.round(videoWidth * scale);
+                    this.canvas.height = Math.round(videoHeight * scale);
                     resolve();
                 };
             });
@@ -60,8 +174,13 @@ class Recorder {
             if (result) {
                 result.classList.remove('hidden');
             }
-            // 指定間隔でフレームキャプチャを開始
-            this.samplingInterval = setInterval(() => this.captureAndProcessFrame(), this.config.captureInterval);
+            // フレームキャプチャを開始 (間隔は画面の変化に応じて変わる)
+            this.changeDetector = this.config.adaptiveCapture
+                ? new FrameChangeDetector(this.config.diffWidth, this.config.pixelDiffThreshold)
+                : null;
+            this.currentInterval = this.config.captureInterval;
+            this.lastCaptureAt = 0;
+            this.scheduleNextCapture();
             this.showStatus('録画を開始しました', 'success');
             // ストリーム終了時の処理
             this.mediaStream.getVideoTracks()[0].onended = () => {
@@ -85,20 +204,13 @@ class Recorder {
         }
 
         console.log('[DEBUG stop()] Clearing samplingInterval.');
-        clearInterval(this.samplingInterval);
+        clearTimeout(this.samplingInterval);
         this.samplingInterval = null; // Good practice to nullify
 
         // let lastSendResult = null; // 'lastSendResult' might not be meaningful in the same way
         if (this.frameBuffer.length > 0) {
             console.log(`[DEBUG stop()] Frame buffer has ${this.frameBuffer.length} frames. Sending in background.`);
-            // Call sendFrames without await and attach error handling to the promise
-            this.sendFrames(this.frameBuffer)
-                .then(result => {
-                    console.log('[DEBUG stop()] Background sendFrames completed. Result:', result);
-                })
-                .catch(err => {
-                    console.error("[DEBUG stop()] Error during background sendFrames:", err);
-                });
+            this.startSend(this.frameBuffer);
             this.frameBuffer = []; // Clear framebuffer immediately
             console.log('[DEBUG stop()] Frame buffer cleared locally.');
         } else {
@@ -148,44 +260,112 @@ class Recorder {
 
         console.log('[DEBUG stop()] Calling showStatus("録画を停止しました", "success").');
         this.showStatus('停止しました', 'success');
+        // UI を戻してから、送信中のフレームが届くのを待つ
+        await Promise.allSettled([...this.pendingSends]);
         console.log('[DEBUG stop()] Exiting stop method.');
-        return lastSendResult;
+    }
+
+    scheduleNextCapture() {
+        if (!this.isRecording) return;
+        // captureAndProcessFrame は送信を待たないので、アップロード中もサンプリングは止まらない
+        this.samplingInterval = setTimeout(async () => {
+            await this.captureAndProcessFrame();
+            this.scheduleNextCapture();
+        }, this.currentInterval);
     }
 
     async captureAndProcessFrame() {
         if (!this.isRecording || !this.videoElement || !this.ctx) return;
         try {
+            const now = Date.now();
+            this.captureStats.sampled++;
+            if (this.changeDetector) {
+                const changeRatio = this.changeDetector.measure(this.videoElement);
+                const keyframeDue = now - this.lastCaptureAt >= this.config.keyframeInterval;
+                if (changeRatio < this.config.changeThreshold && !keyframeDue) {
+                    // 変化なし: フレームは作らず、次のサンプリングまでの間隔を延ばす
+                    this.captureStats.skipped++;
+                    this.currentInterval = Math.min(
+                        this.currentInterval * this.config.captureBackoff,
+                        this.config.maxCaptureInterval
+                    );
+                    this.flushFramesIfDue(now);
+                    return;
+                }
+                this.changeDetector.commit();
+                if (changeRatio >= this.config.changeThreshold) {
+                    this.currentInterval = this.config.captureInterval;
+                }
+            }
             // フレームキャプチャ
             this.ctx.drawImage(this.videoElement, 0, 0, this.canvas.width, this.canvas.height);
-            // Base64エンコード（JPEG形式、品質0.7）
-            const dataUrl = this.canvas.toDataURL('image/jpeg', 0.7);
-            this.latestFrameForAINotify = dataUrl; // Store latest frame for AI notify
-            this.frameBuffer.push(dataUrl);
-            // バッファが閾値に達したら送信
-            if (this.frameBuffer.length >= this.config.frameThreshold) {
-                const tmp = this.frameBuffer;
-                this.frameBuffer = [];
-                await this.sendFrames(tmp);
+            // JPEG形式、品質0.7。multipart では Blob、json では Base64 の data URL で保持する
+            const frame = this.config.frameTransport === 'json'
+                ? this.canvas.toDataURL('image/jpeg', 0.7)
+                : await canvasToBlob(this.canvas, 'image/jpeg', 0.7);
+            this.captureStats.captured++;
+            this.lastCaptureAt = now;
+            this.latestFrameForAINotify = frame; // Store latest frame for AI notify
+            if (this.frameBuffer.length === 0) {
+                this.bufferStartedAt = now;
             }
+            this.frameBuffer.push(frame);
+            this.flushFramesIfDue(now);
         } catch (err) {
             console.error("フレーム処理エラー:", err);
             this.showStatus('フレーム処理中にエラーが発生しました: ' + err.message, 'error');
         }
     }
 
+    // バッファが閾値に達したか、最初のフレームから flushInterval 経ったら送信を始める (完了は待たない)
+    flushFramesIfDue(now) {
+        const full = this.frameBuffer.length >= this.config.frameThreshold;
+        const stale = this.frameBuffer.length > 0 && now - this.bufferStartedAt >= this.config.flushInterval;
+        if (full || stale) {
+            const tmp = this.frameBuffer;
+            this.frameBuffer = [];
+            this.startSend(tmp);
+        }
+    }
+
+    // sendFrames を待たずに始め、stop() で待てるよう pendingSends に入れておく
+    startSend(frameDataArray) {
+        const sending = this.sendFrames(frameDataArray).finally(() => {
+            this.pendingSends.delete(sending);
+        });
+        this.pendingSends.add(sending);
+        return sending;
+    }
+
+    // 前回の送信以降のキャプチャ統計を取り出してリセットする
+    takeCaptureStats() {
+        const stats = { ...this.captureStats, interval_ms: Math.round(this.currentInterval) };
+        for (const key of Object.keys(this.captureStats)) {
+            this.captureTotals[key] += this.captureStats[key];
+            this.captureStats[key] = 0;
+        }
+        const { sampled, skipped } = this.captureTotals;
+        console.info(
+            `[capture] sampled=${sampled} skipped=${skipped} ` +
+            `(${sampled ? (100 * skipped / sampled).toFixed(1) : 0}%) interval=${stats.interval_ms}ms`
+        );
+        return stats;
+    }
+
     async sendFrames(frameDataArray) {
         try {
             const userRequestInput = document.getElementById('userRequestInput');
             const userRequest = userRequestInput ? userRequestInput.value : '';
-            const requestData = {
-                frames: frameDataArray,
-                user_request: userRequest
-            };
-            const response = await fetch(this.config.pythonUrl, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(requestData)
-            });
+            const response = await fetch(
+                this.config.pythonUrl,
+                await compressRequest(
+                    buildFramesRequest(frameDataArray, {
+                        user_request: userRequest,
+                        capture_stats: JSON.stringify(this.takeCaptureStats())
+                    }),
+                    this.config.requestCompression
+                )
+            );
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
@@ -327,6 +507,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 });
 
                 this.isRecording = true;
+                this.recordingStartedAt = Date.now();
                 // UI updates for procedure recorder
                 const createProcedureBtn = document.getElementById('createProcedureBtn');
                 if (createProcedureBtn) {
@@ -408,6 +589,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         async stop() {
             console.log('[ProcedureRecorder stop()] Entered stop method.');
+            this.recordedDuration = this.recordingStartedAt ? (Date.now() - this.recordingStartedAt) / 1000 : null;
             // Since ProcedureRecorder's start() doesn't set up samplingInterval,
             // we don't need to clear it here like in the parent Recorder.
             // clearInterval(this.samplingInterval);
@@ -557,32 +739,62 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
     async sendVideo(videoBlob, userRequest) {
+        // 動画を分割してアップロードする (/api/uploads)。
+        // チャンクごとに SHA-256 を付けて送り、失敗したチャンクだけを再送する。
         const procedureResult = document.getElementById('procedureResult'); // For status updates
+        const maxRetries = 5;
         try {
-            const taskName = document.getElementById('taskNameInput').value || '';
-
-            const formData = new FormData();
-            formData.append('video_file', videoBlob, 'procedure_video.webm');
-            formData.append('task_name', taskName);
-            formData.append('user_request', userRequest);
-
-            console.log('[ProcedureRecorder] Uploading video file to /upload_video with FormData.');
-            // Optional: Log FormData entries for debugging
-            // for (var pair of formData.entries()) {
-            //    console.log(pair[0]+ ', ' + (pair[1] instanceof Blob ? 'Blob, size=' + pair[1].size : pair[1]));
-            // }
-
-            const response = await fetch('/upload_video', { // Changed endpoint
+            const initResponse = await fetch('/api/uploads', {
                 method: 'POST',
-                body: formData // No explicit Content-Type header here, browser sets it for FormData
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    filename: 'procedure_video.webm',
+                    size: videoBlob.size,
+                    content_type: videoBlob.type || 'video/webm'
+                })
             });
+            const initData = await initResponse.json();
+            if (!initResponse.ok || initData.status !== 'success') {
+                throw new Error(initData.message || `HTTP error! status: ${initResponse.status}`);
+            }
+            const upload = initData.upload;
+            console.log('[ProcedureRecorder] Upload session created:', upload);
 
-            const data = await response.json(); // Parse JSON response
+            let pending = [...Array(upload.total_chunks).keys()];
+            for (let attempt = 0; pending.length > 0; attempt++) {
+                if (attempt > maxRetries) {
+                    throw new Error(`${pending.length} chunks failed to upload`);
+                }
+                if (attempt > 0) {
+                    // 指数バックオフしてから、サーバーにまだ無いチャンクを確認して再送する
+                    await new Promise(r => setTimeout(r, Math.min(1000 * 2 ** (attempt - 1), 10000)));
+                    const statusResponse = await fetch(`/api/uploads/${upload.upload_id}`);
+                    if (statusResponse.ok) {
+                        pending = (await statusResponse.json()).upload.missing_chunks;
+                    }
+                }
+                const failed = [];
+                for (const index of pending) {
+                    const chunk = videoBlob.slice(index * upload.chunk_size, (index + 1) * upload.chunk_size);
+                    try {
+                        const progress = await this.putVideoChunk(upload.upload_id, index, chunk);
+                        if (procedureResult) {
+                            procedureResult.innerHTML = `アップロード中... ${Math.floor(progress.progress * 100)}%`;
+                            procedureResult.className = 'status info';
+                            procedureResult.classList.remove('hidden');
+                        }
+                    } catch (err) {
+                        console.warn(`[ProcedureRecorder] Chunk ${index} failed:`, err);
+                        failed.push(index);
+                    }
+                }
+                pending = failed;
+            }
 
-            if (!response.ok) {
-                let errorMsg = `HTTP error! status: ${response.status}`;
-                errorMsg = data.message || errorMsg; // Use server message if available
-                throw new Error(errorMsg);
+            const completeResponse = await fetch(`/api/uploads/${upload.upload_id}/complete`, { method: 'POST' });
+            const data = await completeResponse.json();
+            if (!completeResponse.ok) {
+                throw new Error(data.message || `HTTP error! status: ${completeResponse.status}`);
             }
 
             if (data.status === 'success' && data.video_url) {
@@ -604,6 +816,55 @@ document.addEventListener('DOMContentLoaded', () => {
             throw err; // Re-throw the error for the caller (e.g., onstop handler) to handle
         }
     }
+
+    async putVideoChunk(uploadId, index, chunk) {
+        const buffer = await chunk.arrayBuffer();
+        const digest = await crypto.subtle.digest('SHA-256', buffer);
+        const checksum = Array.from(new Uint8Array(digest))
+            .map(b => b.toString(16).padStart(2, '0'))
+            .join('');
+        const response = await fetch(`/api/uploads/${uploadId}/chunks/${index}`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/octet-stream',
+                'X-Chunk-SHA256': checksum
+            },
+            body: buffer
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.message || `HTTP error! status: ${response.status}`);
+        }
+        return data.upload;
+    }
+    }
+
+    // 手順書生成ジョブの進捗を表示する
+    function watchProcedureJob(job, procedureResult) {
+        procedureResult.innerHTML = '生成中...';
+        procedureResult.className = 'status info';
+        const events = new EventSource(job.events_url);
+        events.addEventListener('progress', (event) => {
+            const progress = JSON.parse(event.data).progress;
+            if (progress && progress.message) {
+                procedureResult.innerHTML = `生成中... ${progress.message} (${Math.floor(progress.percent)}%)`;
+            }
+        });
+        events.addEventListener('done', () => {
+            events.close();
+            procedureResult.innerHTML = '手順書作成成功';
+            procedureResult.className = 'status success';
+        });
+        events.addEventListener('failed', (event) => {
+            events.close();
+            const error = JSON.parse(event.data).error;
+            procedureResult.innerHTML = '手順書作成失敗: ' + (error || '不明なエラー');
+            procedureResult.className = 'status error';
+        });
+        events.onerror = () => {
+            // 接続が切れた場合は EventSource が自動で再接続する
+            console.warn('[watchProcedureJob] SSE connection error, retrying...');
+        };
     }
 
     // Separate instance for procedure capturing
@@ -704,14 +965,15 @@ document.addEventListener('DOMContentLoaded', () => {
                                 body: JSON.stringify({
                                     task_name: document.getElementById('taskNameInput').value || '',
                                     user_request: document.getElementById('procedureUserRequestInput') ? document.getElementById('procedureUserRequestInput').value : '',
-                                    video_url: resultFromServer.video_url
+                                    video_url: resultFromServer.video_url,
+                                    duration_seconds: procedureRecorder.recordedDuration
                                 })
                             })
                             .then(response => response.json())
                             .then(data => {
-                                if (data.status === 'success') {
-                                    procedureResult.innerHTML = '手順書作成成功';
-                                    procedureResult.className = 'status success';
+                                if (data.status === 'accepted') {
+                                    // 生成はバックグラウンドで行われるので、進捗を SSE で受け取る
+                                    watchProcedureJob(data, procedureResult);
                                 } else {
                                     procedureResult.innerHTML = '手順書作成失敗: ' + (data.message || '不明なエラー');
                                     procedureResult.className = 'status error';
@@ -799,14 +1061,13 @@ function startSupportCheck() {
                 recorder.lastFrameSentToAINotify = currentFrame;
             }
 
-            const resp = await fetch('/api/notify_support', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    frames: currentFrame ? [currentFrame] : [],
-                    log_context: logContext
-                })
-            });
+            const resp = await fetch(
+                '/api/notify_support',
+                await compressRequest(
+                    buildFramesRequest(currentFrame ? [currentFrame] : [], { log_context: logContext }),
+                    recorder.config.requestCompression
+                )
+            );
             if (!resp.ok) {
                 console.error('notify_support API Error:', resp.status);
                 return;
@@ -15,6 +15,8 @@
 
     let reportCurrentPage = 1;
     let reportPageSize = 10;
+    // reportPageTokens[n - 1] がページ n を取得するためのトークン (1ページ目は null)
+    let reportPageTokens = [null];
     let currentReport = null;
     let reportIsEditing = false;
     let reportIsDirty = false;
@@ -29,11 +31,20 @@
             console.warn(`Invalid page value '${page}' received for report list. Defaulting to 1.`);
             newPage = 1;
         }
+        if (newPage === 1 || reportPageTokens[newPage - 1] === undefined) {
+            // トークンの分からないページには飛べないので1ページ目から読み直す
+            newPage = 1;
+            reportPageTokens = [null];
+        }
         reportCurrentPage = newPage;
         // console.log("Sanitized reportCurrentPage:", reportCurrentPage); // For debugging
 
+        const params = new URLSearchParams({ page_size: reportPageSize, include_total: "1" });
+        const pageToken = reportPageTokens[reportCurrentPage - 1];
+        if (pageToken) params.set("page_token", pageToken);
+
         try {
-            const res = await fetch(`/api/reports?page=${reportCurrentPage}&page_size=${reportPageSize}`);
+            const res = await fetch(`/api/reports?${params}`);
             console.log("Response status for /api/reports:", res.status);
             const data = await res.json();
             console.log("/api/reports response JSON:", data);
@@ -42,11 +53,18 @@
                 return;
             }
             const reports = data.reports;
+            if (data.next_page_token) {
+                reportPageTokens[reportCurrentPage] = data.next_page_token;
+            } else {
+                reportPageTokens.length = reportCurrentPage;
+            }
+            const totalPages = data.total !== undefined ? Math.max(1, Math.ceil(data.total / reportPageSize)) : null;
+            const pageInfoText = totalPages ? `ページ ${reportCurrentPage} / ${totalPages}` : `ページ ${reportCurrentPage}`;
             const container = document.getElementById("reportListContainer");
             container.innerHTML = "";
             if (reports.length === 0) {
                 container.innerHTML = "<p>レポートがありません</p>";
-                document.getElementById("pageInfo").textContent = `ページ ${reportCurrentPage}`;
+                document.getElementById("pageInfo").textContent = pageInfoText;
                 document.getElementById("prevPageBtn").disabled = true;
                 document.getElementById("nextPageBtn").disabled = true;
                 return;
@@ -60,19 +78,11 @@
                 ul.appendChild(li);
             });
             container.appendChild(ul);
-            document.getElementById("pageInfo").textContent = `ページ ${reportCurrentPage}`;
+            document.getElementById("pageInfo").textContent = pageInfoText;
 
-            // ページングボタン制御
-            const prevBtn = document.getElementById("prevPageBtn");
-            const nextBtn = document.getElementById("nextPageBtn");
-            // 1ページしか存在しない場合は両方無効
-            if (reportCurrentPage === 1 && reports.length < reportPageSize) {
-                prevBtn.disabled = true;
-                nextBtn.disabled = true;
-            } else {
-                prevBtn.disabled = reportCurrentPage === 1;
-                nextBtn.disabled = reports.length < reportPageSize;
-            }
+            // ページングボタン制御 (次ページのトークンが無ければ最終ページ)
+            document.getElementById("prevPageBtn").disabled = reportCurrentPage === 1;
+            document.getElementById("nextPageBtn").disabled = !data.next_page_token;
         } catch (err) {
             console.error("Error calling /api/reports:", err);
             return;
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# task_solution 直下のモジュール (agents, services, utils) を import できるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# テスト中はログをファイルに書かず、GCP の設定がなくても import できるようにする
+os.environ.setdefault("LOGGER_OUTPUT", "CONSOLE")
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "test")
+# エージェントは Vertex AI を呼ばないモックで作る
+os.environ.setdefault("MODEL_BACKEND", "mock")
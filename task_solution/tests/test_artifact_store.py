@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+from utils.artifact_store import ArtifactNotFoundError, LocalArtifactStore
+
+
+def _age(path, seconds: float):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_startup_sweep_removes_expired_files(tmp_path):
+    (tmp_path / "old.png").write_bytes(b"x" * 10)
+    _age(tmp_path / "old.png", 7200)
+    (tmp_path / "new.png").write_bytes(b"y" * 10)
+
+    store = LocalArtifactStore(str(tmp_path), max_bytes=10_000, max_age=3600)
+
+    assert sorted(os.listdir(tmp_path)) == ["new.png"]
+    assert store.stats()["total_bytes"] == 10
+
+
+def test_put_sweeps_expired_files_under_byte_budget(tmp_path):
+    store = LocalArtifactStore(str(tmp_path), max_bytes=10_000, max_age=3600, sweep_interval=0)
+    store.put("old.png", b"x" * 10, "image/png")
+    _age(tmp_path / "old.png", 7200)
+
+    store.put("new.png", b"y" * 10, "image/png")
+
+    assert not store.exists("old.png")
+    assert store.exists("new.png")
+    assert store.stats()["evictions"] == 1
+
+
+def test_reput_of_existing_name_still_sweeps(tmp_path):
+    store = LocalArtifactStore(str(tmp_path), max_bytes=10_000, max_age=3600, sweep_interval=0)
+    store.put("old.png", b"x" * 10, "image/png")
+    store.put("kept.png", b"y" * 10, "image/png")
+    _age(tmp_path / "old.png", 7200)
+
+    store.put("kept.png", b"y" * 10, "image/png")
+
+    assert not store.exists("old.png")
+
+
+def test_sweep_is_rate_limited(tmp_path):
+    store = LocalArtifactStore(str(tmp_path), max_bytes=10_000, max_age=3600, sweep_interval=60)
+    store.put("old.png", b"x" * 10, "image/png")
+    _age(tmp_path / "old.png", 7200)
+
+    store.put("new.png", b"y" * 10, "image/png")
+
+    assert store.exists("old.png")
+
+
+def test_byte_budget_evicts_least_recently_used(tmp_path):
+    store = LocalArtifactStore(str(tmp_path), max_bytes=25, max_age=3600)
+    store.put("a.png", b"a" * 10, "image/png")
+    _age(tmp_path / "a.png", 20)
+    store.put("b.png", b"b" * 10, "image/png")
+    _age(tmp_path / "b.png", 10)
+    store.get("a.png")  # a を参照して b より新しくする
+
+    store.put("c.png", b"c" * 10, "image/png")
+
+    assert store.exists("a.png") and store.exists("c.png")
+    assert not store.exists("b.png")
+
+
+def test_fallback_root_is_read_but_never_evicted(tmp_path):
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "pie_chart_legacy.png").write_bytes(b"old chart")
+    _age(legacy / "pie_chart_legacy.png", 7200)
+
+    store = LocalArtifactStore(
+        str(tmp_path / "store"), max_bytes=10, max_age=3600, sweep_interval=0,
+        fallback_roots=[str(legacy)],
+    )
+    store.put("big.png", b"z" * 100, "image/png")
+
+    assert store.get("pie_chart_legacy.png") == b"old chart"
+    assert (legacy / "pie_chart_legacy.png").exists()
+    with pytest.raises(ArtifactNotFoundError):
+        store.get("missing.png")
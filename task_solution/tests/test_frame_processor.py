@@ -0,0 +1,32 @@
+import base64
+import io
+
+from PIL import Image
+
+from agents.screen_analyzer.screen_analyzer import ScreenAnalyzer
+from utils.frame_processor import dedupe_frames
+
+
+def _jpeg(color, size=(64, 48)) -> bytes:
+    image = Image.new("RGB", size, color)
+    for x in range(size[0] // 2):
+        image.putpixel((x, 0), (255 - color[0], 0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_dedupe_returns_decoded_bytes_and_drops_undecodable_frames():
+    frame = _jpeg((10, 200, 30))
+    kept, dropped = dedupe_frames([base64.b64encode(frame).decode(), "not base64!"])
+
+    assert kept == [frame]
+    assert dropped == 1
+
+
+def test_screen_analyzer_skips_frames_that_fail_to_decode():
+    analyzer = ScreenAnalyzer()
+    contents = analyzer._make_contents([_jpeg((0, 0, 0)), "not base64!"], "query")
+
+    # システムプロンプト + 画像 1 枚
+    assert len(contents) == 2
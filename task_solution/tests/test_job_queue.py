@@ -0,0 +1,138 @@
+import json
+import threading
+from unittest import mock
+
+import pytest
+from google.cloud import storage
+
+from services.job_queue import JobQueue, JobQueueFullError, JobStatus, report_progress
+
+
+TIMEOUT = 5
+
+
+def _wait_until(job, predicate):
+    version = -1
+    while not predicate(job):
+        current = job.wait_for_update(version, timeout=TIMEOUT)
+        assert current != version, f"job stuck at {job.status.value}"
+        version = current
+
+
+def test_job_moves_from_queued_to_running_to_done():
+    started, release = threading.Event(), threading.Event()
+    queue = JobQueue("test", num_workers=1, max_queue_size=10)
+
+    def work(x):
+        started.set()
+        release.wait(TIMEOUT)
+        return x * 2
+
+    blocker = queue.submit(work, 1)
+    job = queue.submit(lambda: "second")
+    assert started.wait(TIMEOUT)
+    assert blocker.status == JobStatus.RUNNING
+    assert job.status == JobStatus.QUEUED
+
+    release.set()
+    _wait_until(job, lambda j: j.finished and j.finished_at is not None)
+
+    assert blocker.result == 2
+    assert job.status == JobStatus.DONE
+    assert job.result == "second"
+    assert job.progress == {"stage": "done", "percent": 100, "message": ""}
+    assert queue.get_job(job.id) is job
+    assert queue.metrics()["done"] == 2
+
+
+def test_failed_job_records_error():
+    queue = JobQueue("test", num_workers=1)
+
+    def work():
+        raise ValueError("boom")
+
+    job = queue.submit(work)
+    _wait_until(job, lambda j: j.finished and j.finished_at is not None)
+
+    assert job.status == JobStatus.FAILED
+    assert job.error == "boom"
+    assert queue.metrics()["failed"] == 1
+
+
+def test_full_queue_rejects_submit():
+    started, release = threading.Event(), threading.Event()
+    queue = JobQueue("test", num_workers=1, max_queue_size=1)
+    queue.submit(lambda: (started.set(), release.wait(TIMEOUT)))
+    assert started.wait(TIMEOUT)
+    queue.submit(lambda: None)
+
+    with pytest.raises(JobQueueFullError):
+        queue.submit(lambda: None)
+
+    release.set()
+    assert queue.metrics()["rejected"] == 1
+
+
+def test_report_progress_updates_running_job():
+    release = threading.Event()
+    queue = JobQueue("test", num_workers=1)
+
+    def work():
+        report_progress("step", 50, "half")
+        release.wait(TIMEOUT)
+
+    job = queue.submit(work)
+    _wait_until(job, lambda j: j.progress["stage"] == "step")
+    assert job.progress == {"stage": "step", "percent": 50, "message": "half"}
+
+    release.set()
+    _wait_until(job, lambda j: j.finished and j.finished_at is not None)
+    assert job.progress["stage"] == "done"
+
+
+def test_report_progress_outside_job_is_ignored():
+    report_progress("step", 50)
+
+
+@pytest.fixture
+def flask_app():
+    with mock.patch.object(storage, "Client"):
+        import app
+    return app
+
+
+def test_procedure_job_events_stream_progress_until_done(flask_app):
+    release = threading.Event()
+
+    def work():
+        report_progress("segment", 40, "1/2")
+        release.wait(TIMEOUT)
+        return {"content": "ok"}
+
+    client = flask_app.app.test_client()
+    with client.session_transaction() as session:
+        session["session_uuid"] = "uid-1"
+    job = flask_app.procedure_queue.submit(work, owner="uid-1")
+    _wait_until(job, lambda j: j.progress["stage"] == "segment")
+    release.set()
+
+    response = client.get(f"/api/procedures/jobs/{job.id}/events")
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.get_data(as_text=True).strip().split("\n\n")
+        if block.startswith("event:")
+    ]
+
+    assert response.mimetype == "text/event-stream"
+    assert events[0][0] == "progress"
+    assert events[-1][0] == "done"
+    assert events[-1][1]["status"] == "done"
+
+
+def test_procedure_job_events_hide_other_users_jobs(flask_app):
+    client = flask_app.app.test_client()
+    with client.session_transaction() as session:
+        session["session_uuid"] = "uid-2"
+    job = flask_app.procedure_queue.submit(lambda: None, owner="someone-else")
+
+    assert client.get(f"/api/procedures/jobs/{job.id}/events").status_code == 404
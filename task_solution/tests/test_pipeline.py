@@ -0,0 +1,24 @@
+import threading
+
+from utils.pipeline import Pipeline
+
+
+def test_on_node_done_is_called_for_every_node_in_caller_thread():
+    calls = []
+
+    def fail():
+        raise ValueError("boom")
+
+    pipeline = Pipeline("test", max_workers=2)
+    pipeline.add("a", lambda: 1)
+    pipeline.add("b", fail)
+    pipeline.add("c", lambda a: a + 1, deps=["a"])
+
+    result = pipeline.run(
+        on_node_done=lambda name: calls.append((name, threading.current_thread()))
+    )
+
+    assert sorted(name for name, _ in calls) == ["a", "b", "c"]
+    assert all(thread is threading.current_thread() for _, thread in calls)
+    assert result.get("c") == 2
+    assert "b" in result.errors
@@ -0,0 +1,105 @@
+import gzip
+
+import pytest
+import zstandard
+from werkzeug.test import Client
+from werkzeug.wrappers import Request, Response
+
+from utils.request_decompression import (
+    DecompressedBodyTooLarge,
+    InvalidEncodedBody,
+    RequestDecompressionMiddleware,
+    make_decoder,
+)
+
+
+MAX_BYTES = 1024 * 1024
+BODY = b'{"frames": []}' * 1000
+
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data)
+
+
+def _zstd(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor().compress(data)
+
+
+COMPRESSORS = {"gzip": _gzip, "zstd": _zstd}
+
+
+@Request.application
+def _echo(request):
+    return Response(request.get_data(), headers={"X-Encoding": request.content_encoding or ""})
+
+
+@pytest.fixture
+def client():
+    return Client(RequestDecompressionMiddleware(_echo, max_bytes=MAX_BYTES))
+
+
+def _decode(encoding: str, payload: bytes, chunk_size: int = 4096) -> bytes:
+    decoder = make_decoder(encoding, MAX_BYTES)
+    out = [decoder.feed(payload[i : i + chunk_size]) for i in range(0, len(payload), chunk_size)]
+    out.append(decoder.finish())
+    return b"".join(out)
+
+
+@pytest.mark.parametrize("encoding", COMPRESSORS)
+def test_decoder_round_trip(encoding):
+    assert _decode(encoding, COMPRESSORS[encoding](BODY)) == BODY
+
+
+@pytest.mark.parametrize("encoding", COMPRESSORS)
+def test_decoder_stops_at_limit(encoding):
+    bomb = COMPRESSORS[encoding](b"\0" * (MAX_BYTES * 16))
+    with pytest.raises(DecompressedBodyTooLarge):
+        _decode(encoding, bomb)
+
+
+@pytest.mark.parametrize("encoding", COMPRESSORS)
+def test_decoder_rejects_truncated_body(encoding):
+    with pytest.raises(InvalidEncodedBody, match="Truncated"):
+        _decode(encoding, COMPRESSORS[encoding](BODY)[:-8])
+
+
+@pytest.mark.parametrize("encoding", COMPRESSORS)
+def test_middleware_passes_decoded_body(client, encoding):
+    response = client.post(
+        "/", data=COMPRESSORS[encoding](BODY), headers={"Content-Encoding": encoding}
+    )
+
+    assert response.status_code == 200
+    assert response.get_data() == BODY
+    assert response.headers["X-Encoding"] == ""
+
+
+@pytest.mark.parametrize("encoding", COMPRESSORS)
+def test_middleware_rejects_bomb_with_413(client, encoding):
+    bomb = COMPRESSORS[encoding](b"\0" * (MAX_BYTES * 16))
+    response = client.post("/", data=bomb, headers={"Content-Encoding": encoding})
+
+    assert response.status_code == 413
+    assert response.get_json()["status"] == "error"
+
+
+@pytest.mark.parametrize("encoding", COMPRESSORS)
+def test_middleware_rejects_truncated_body_with_400(client, encoding):
+    truncated = COMPRESSORS[encoding](BODY)[:-8]
+    response = client.post("/", data=truncated, headers={"Content-Encoding": encoding})
+
+    assert response.status_code == 400
+    assert "Truncated" in response.get_json()["message"]
+
+
+def test_middleware_rejects_unsupported_encoding_with_415(client):
+    response = client.post("/", data=b"abc", headers={"Content-Encoding": "br"})
+
+    assert response.status_code == 415
+
+
+def test_middleware_leaves_plain_body_alone(client):
+    response = client.post("/", data=BODY, headers={"Content-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.get_data() == BODY
@@ -0,0 +1,48 @@
+import os
+import time
+
+from agents.vertex_ai.response_cache import ResponseCache
+
+
+def _disk_usage(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
+
+def test_overwrite_does_not_double_count_disk_bytes(tmp_path):
+    cache = ResponseCache(disk_dir=str(tmp_path))
+    cache.set("ab" * 32, "x" * 1000, ttl=60)
+    cache.set("ab" * 32, "y" * 10, ttl=60)
+
+    assert cache.stats()["disk_bytes"] == _disk_usage(tmp_path)
+
+
+def test_expired_disk_entry_is_removed_from_disk_bytes(tmp_path):
+    cache = ResponseCache(disk_dir=str(tmp_path))
+    key = "cd" * 32
+    cache.set(key, "x" * 1000, ttl=0.01)
+    time.sleep(0.02)
+
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._disk_path(key))
+    assert cache.stats()["disk_bytes"] == 0
+
+
+def test_repeated_overwrites_do_not_trigger_eviction(tmp_path):
+    cache = ResponseCache(disk_dir=str(tmp_path), disk_max_bytes=5000)
+    for _ in range(50):
+        cache.set("ef" * 32, "x" * 1000, ttl=60)
+
+    assert cache.stats()["evictions"]["disk"] == 0
+    assert cache.stats()["disk_bytes"] == _disk_usage(tmp_path)
+
+
+def test_memory_entry_expires():
+    cache = ResponseCache()
+    cache.set("k", "text", ttl=-1)
+
+    assert cache.get("k") is None
+    assert cache.stats()["memory_bytes"] == 0
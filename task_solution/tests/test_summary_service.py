@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from benchmarks.fake_firestore import FakeAsyncFirestoreClient, FakeFirestoreClient
+from services import summary_service
+from services.firestore_service import firestore_service
+
+
+DATE = "2026-01-05"
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeFirestoreClient()
+    monkeypatch.setattr(firestore_service, "_db", db)
+    monkeypatch.setattr(firestore_service, "_async_db", FakeAsyncFirestoreClient(db))
+    monkeypatch.setattr(summary_service, "SUMMARY_WINDOW_MINUTES", 30)
+    return db
+
+
+def _add_log(uid: str, time: str, text: str):
+    created_at = datetime.strptime(f"{DATE} {time}", "%Y-%m-%d %H:%M:%S")
+    firestore_service._log_day_ref(uid, DATE).collection("entries").document().set(
+        {"log": f"{DATE} {time}: {text}", "created_at": created_at}
+    )
+
+
+def test_report_log_includes_every_summary_and_unsummarized_logs_in_order(fake_db):
+    _add_log("uid", "09:05:00", "raw 0905")
+    _add_log("uid", "09:40:00", "raw 0940")
+    _add_log("uid", "10:10:00", "raw 1010")
+    firestore_service.upload_log_summary("uid", DATE, "09:00", "09:30", "summary 0900", 1)
+    firestore_service.upload_log_summary("uid", DATE, "09:30", "10:00", "summary 0930", 1)
+
+    lines = summary_service.build_report_log("uid", DATE).split("\n")
+
+    assert lines == [
+        "[09:00-09:30 の要約] summary 0900",
+        "[09:30-10:00 の要約] summary 0930",
+        f"{DATE} 10:10:00: raw 1010",
+    ]
+
+
+def test_async_report_log_matches_sync(fake_db):
+    _add_log("uid", "09:05:00", "raw 0905")
+    _add_log("uid", "10:10:00", "raw 1010")
+    assert asyncio.run(summary_service.abuild_report_log("uid", DATE)) == (
+        summary_service.build_report_log("uid", DATE)
+    )
+
+    firestore_service.upload_log_summary("uid", DATE, "09:00", "09:30", "summary 0900", 1)
+    assert asyncio.run(summary_service.abuild_report_log("uid", DATE)) == (
+        summary_service.build_report_log("uid", DATE)
+    )
+
+
+def test_acreate_report_writes_through_async_client(fake_db):
+    report = asyncio.run(firestore_service.acreate_report("uid", "title", "content"))
+
+    stored = (
+        fake_db.collection("users").document("uid").collection("reports")
+        .document(report["id"]).get().to_dict()
+    )
+    assert stored["title"] == "title"
+    assert stored["content"] == "content"
+    assert firestore_service.document_cache.get("uid", ("reports", report["id"])) == report
@@ -0,0 +1,140 @@
+import hashlib
+import io
+import json
+import os
+import time
+
+import pytest
+
+from services.upload_service import (
+    LocalUploadBackend,
+    UploadError,
+    UploadNotFoundError,
+    UploadService,
+)
+
+
+CHUNK_SIZE = 10
+
+
+@pytest.fixture
+def service(tmp_path):
+    # init_upload から裏で掃除が走るとテスト中のファイルと競合するので、掃除は明示的に呼ぶ
+    return UploadService(
+        LocalUploadBackend(str(tmp_path)), chunk_size=CHUNK_SIZE, max_size=1000,
+        sweep_interval=float("inf"),
+    )
+
+
+def _put(service, upload_id, index, data, checksum=None):
+    return service.put_chunk(
+        "uid", upload_id, index, io.BytesIO(data),
+        checksum or hashlib.sha256(data).hexdigest(),
+    )
+
+
+def test_missing_chunk_is_reported_and_can_be_resumed(service, tmp_path):
+    data = bytes(range(25))
+    upload = service.init_upload("uid", "video.webm", len(data), "video/webm")
+    upload_id = upload["upload_id"]
+    _put(service, upload_id, 0, data[:10])
+    _put(service, upload_id, 2, data[20:])
+
+    assert service.progress("uid", upload_id)["missing_chunks"] == [1]
+    with pytest.raises(UploadError, match="Missing chunks"):
+        service.complete("uid", upload_id)
+
+    _put(service, upload_id, 1, data[10:20])
+    result = service.complete("uid", upload_id)
+
+    assert result["video_url"] == f"/uploads/{result['object_name']}"
+    with open(tmp_path / result["object_name"], "rb") as f:
+        assert f.read() == data
+    # 結合後はセッションもチャンクも残らない
+    assert service.backend.list_dirs(service.prefix) == []
+
+
+def test_checksum_mismatch_rejects_and_discards_chunk(service):
+    upload = service.init_upload("uid", "video.webm", 20, "video/webm")
+    upload_id = upload["upload_id"]
+
+    with pytest.raises(UploadError, match="Checksum"):
+        _put(service, upload_id, 0, b"a" * 10, checksum=hashlib.sha256(b"b" * 10).hexdigest())
+
+    assert service.progress("uid", upload_id)["missing_chunks"] == [0, 1]
+
+
+def test_oversized_chunk_is_rejected(service):
+    upload = service.init_upload("uid", "video.webm", 20, "video/webm")
+
+    with pytest.raises(UploadError):
+        _put(service, upload["upload_id"], 0, b"a" * 11)
+
+
+def test_other_users_cannot_see_session(service):
+    upload = service.init_upload("uid", "video.webm", 20, "video/webm")
+
+    with pytest.raises(UploadNotFoundError):
+        service.progress("someone-else", upload["upload_id"])
+
+
+def test_sweep_removes_expired_and_orphaned_sessions(service, tmp_path):
+    live = service.init_upload("uid", "video.webm", 20, "video/webm")["upload_id"]
+    stale = service.init_upload("uid", "video.webm", 20, "video/webm")["upload_id"]
+    _put(service, stale, 0, b"a" * 10)
+    session_path = tmp_path / "uploads" / stale / "session.json"
+    session = json.loads(session_path.read_text())
+    session["created_at"] = time.time() - service.session_ttl - 1
+    session_path.write_text(json.dumps(session))
+    orphan = tmp_path / "uploads" / ("0" * 32) / "chunks"
+    orphan.mkdir(parents=True)
+    (orphan / "000000").write_bytes(b"x")
+
+    with pytest.raises(UploadNotFoundError):
+        service.progress("uid", stale)
+    assert service.sweep_expired() == 2
+
+    assert os.listdir(tmp_path / "uploads") == [live]
+
+
+class _SizedUploadBackend(LocalUploadBackend):
+    """GCS の upload_from_file(size=...) と同じく、size に満たないボディで ValueError を送出する"""
+
+    def write_stream(self, name, reader, content_type, size=None):
+        data = reader.read(size)
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        if len(data) < size:
+            raise ValueError(f"Size {size} was specified but only {len(data)} bytes remained")
+
+
+def test_short_chunk_body_on_sized_backend_is_upload_error(tmp_path):
+    service = UploadService(
+        _SizedUploadBackend(str(tmp_path)), chunk_size=CHUNK_SIZE, max_size=1000,
+        sweep_interval=float("inf"),
+    )
+    upload_id = service.init_upload("uid", "video.webm", 20, "video/webm")["upload_id"]
+
+    with pytest.raises(UploadError, match="Failed to store chunk 0"):
+        _put(service, upload_id, 0, b"a" * 4)
+
+    assert service.progress("uid", upload_id)["missing_chunks"] == [0, 1]
+
+
+@pytest.mark.parametrize(
+    "filename, expected",
+    [
+        ("C:\\Users\\me\\video.webm", "video.webm"),
+        ("../../etc/clip.webm", "clip.webm"),
+        ("", "video.webm"),
+    ],
+)
+def test_filename_is_stripped_of_directories(service, filename, expected):
+    upload_id = service.init_upload("uid", filename, 10, "video/webm")["upload_id"]
+    _put(service, upload_id, 0, b"a" * 10)
+
+    object_name = service.complete("uid", upload_id)["object_name"]
+
+    assert object_name.endswith(f"_{upload_id}_{expected}")
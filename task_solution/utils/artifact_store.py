@@ -0,0 +1,306 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from utils.logger import Logger
+from utils.metrics import stage_seconds
+
+
+logger = Logger(name="artifact_store").get_logger()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # task_solution
+# 以前グラフを保存していたディレクトリ (静的ファイルとして配信され、リポジトリにも含まれる)
+LEGACY_CHART_DIR = os.path.join(BASE_DIR, "static", "generated_charts")
+
+
+class ArtifactNotFoundError(Exception):
+    pass
+
+
+class ArtifactStore(ABC):
+    """
+    生成物 (レポートのグラフ画像など) の保存先。
+    名前は内容のハッシュから作る前提で、同じ名前のものは上書きせず再利用する。
+    """
+
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        pass
+
+    @abstractmethod
+    def put(self, name: str, data: bytes, content_type: str) -> None:
+        """既に存在する場合は何もしない"""
+        pass
+
+    @abstractmethod
+    def get(self, name: str) -> bytes:
+        """存在しない場合は ArtifactNotFoundError"""
+        pass
+
+    @abstractmethod
+    def evict(self) -> dict:
+        """サイズ・経過時間の上限を超えたものを削除する"""
+        pass
+
+    @abstractmethod
+    def stats(self) -> dict:
+        pass
+
+    def _sweep_due(self) -> bool:
+        """
+        前回の evict から sweep_interval 秒経っていれば True (容量に余裕があっても経過時間の上限を守る)
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return False
+            self._last_sweep = now
+            return True
+
+
+def _validate_name(name: str):
+    if not name or "/" in name or "\\" in name or name.startswith("."):
+        raise ArtifactNotFoundError(name)
+
+
+class LocalArtifactStore(ArtifactStore):
+    """
+    ローカルディスクに保存する。
+    合計サイズが max_bytes、最終参照からの経過時間が max_age を超えたら参照の古い順 (LRU) に削除する。
+    参照時刻はファイルの mtime で管理する。経過時間による削除は起動時と、put のたびに
+    (sweep_interval 秒に1回まで) 行う。
+    root は専用のディレクトリにすること (root 内のファイルはすべて削除対象になる)。
+    fallback_roots は以前の保存先で、get で読むだけで書き込み・削除はしない。
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_age: float,
+                 sweep_interval: float = 3600, fallback_roots: list = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self.fallback_roots = list(fallback_roots or [])
+        self._lock = threading.Lock()
+        self._evictions = 0
+        self._last_sweep = time.time()
+        os.makedirs(self.root, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._files())
+        self.evict()
+
+    def _path(self, name: str) -> str:
+        _validate_name(name)
+        return os.path.join(self.root, name)
+
+    def _files(self) -> list:
+        files = []
+        for name in os.listdir(self.root):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except FileNotFoundError:
+                continue
+            files.append((name, stat.st_mtime, stat.st_size))
+        return files
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def put(self, name: str, data: bytes, content_type: str) -> None:
+        path = self._path(name)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._total_bytes += len(data)
+        with self._lock:
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget or self._sweep_due():
+            self.evict()
+
+    def get(self, name: str) -> bytes:
+        path = self._path(name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return self._get_fallback(name)
+        os.utime(path)  # LRU のために参照時刻を更新
+        return data
+
+    def _get_fallback(self, name: str) -> bytes:
+        for root in self.fallback_roots:
+            try:
+                with open(os.path.join(root, name), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                continue
+        raise ArtifactNotFoundError(name)
+
+    def evict(self) -> dict:
+        now = time.time()
+        files = sorted(self._files(), key=lambda f: f[1])
+        total = sum(size for _, _, size in files)
+        removed = 0
+        for name, mtime, size in files:
+            expired = now - mtime > self.max_age
+            if not expired and total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self._total_bytes = total
+            self._evictions += removed
+            self._last_sweep = now
+        if removed:
+            logger.info(f"Evicted {removed} artifacts from {self.root}")
+        return {"removed": removed, "total_bytes": total}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "local",
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "max_age": self.max_age,
+                "evictions": self._evictions,
+            }
+
+
+class GCSArtifactStore(ArtifactStore):
+    """
+    Cloud Storage に保存する。複数インスタンスから同じ URL で参照できる。
+    GCS は参照時刻を持たないので、作成時刻の古い順に削除する。
+    削除は evict_every 回の書き込みごとか、前回から sweep_interval 秒経った後の put で行う。
+    (バケットのライフサイクルルールで経過時間の上限を設定してもよい)
+    """
+
+    def __init__(self, bucket_name: str, prefix: str, max_bytes: int, max_age: float,
+                 evict_every: int = 100, sweep_interval: float = 3600):
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_every = evict_every
+        self.sweep_interval = sweep_interval
+        # 起動時にバケットを一覧しないよう、最初の put で削除を行う
+        self._last_sweep = 0
+        self._lock = threading.Lock()
+        self._client = None
+        self._known = set()  # 存在を確認済みの名前 (exists の往復を省く)
+        self._puts = 0
+        self._evictions = 0
+
+    @property
+    def bucket(self):
+        with self._lock:
+            if self._client is None:
+                from google.cloud import storage
+
+                self._client = storage.Client()
+        return self._client.bucket(self.bucket_name)
+
+    def _blob(self, name: str):
+        _validate_name(name)
+        return self.bucket.blob(f"{self.prefix}{name}")
+
+    def exists(self, name: str) -> bool:
+        if name in self._known:
+            return True
+        found = self._blob(name).exists()
+        if found:
+            self._known.add(name)
+        return found
+
+    def put(self, name: str, data: bytes, content_type: str) -> None:
+        should_evict = False
+        if not self.exists(name):
+            blob = self._blob(name)
+            blob.cache_control = "public, max-age=31536000, immutable"
+            with stage_seconds.time(stage="gcs_upload"):
+                blob.upload_from_string(data, content_type=content_type)
+            self._known.add(name)
+            with self._lock:
+                self._puts += 1
+                should_evict = self._puts % self.evict_every == 0
+        if should_evict or self._sweep_due():
+            self.evict()
+
+    def get(self, name: str) -> bytes:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return self._blob(name).download_as_bytes()
+        except NotFound:
+            self._known.discard(name)
+            raise ArtifactNotFoundError(name)
+
+    def evict(self) -> dict:
+        now = time.time()
+        blobs = sorted(
+            self.bucket.list_blobs(prefix=self.prefix), key=lambda b: b.time_created
+        )
+        total = sum(b.size or 0 for b in blobs)
+        removed = 0
+        for blob in blobs:
+            expired = now - blob.time_created.timestamp() > self.max_age
+            if not expired and total <= self.max_bytes * 0.9:
+                break
+            blob.delete()
+            self._known.discard(blob.name[len(self.prefix):])
+            total -= blob.size or 0
+            removed += 1
+        with self._lock:
+            self._evictions += removed
+            self._last_sweep = now
+        if removed:
+            logger.info(f"Evicted {removed} artifacts from gs://{self.bucket_name}/{self.prefix}")
+        return {"removed": removed, "total_bytes": total}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "gcs",
+                "bucket": self.bucket_name,
+                "prefix": self.prefix,
+                "max_bytes": self.max_bytes,
+                "max_age": self.max_age,
+                "evictions": self._evictions,
+            }
+
+
+def create_chart_store() -> ArtifactStore:
+    backend = os.getenv("CHART_STORE_BACKEND", "local").lower()
+    max_bytes = int(os.getenv("CHART_STORE_MAX_BYTES", 256 * 1024 * 1024))
+    max_age = float(os.getenv("CHART_STORE_MAX_AGE_DAYS", 30)) * 86400
+    sweep_interval = float(os.getenv("CHART_STORE_SWEEP_SECONDS", 3600))
+    if backend == "gcs":
+        return GCSArtifactStore(
+            bucket_name=os.getenv("CHART_BUCKET_NAME") or os.getenv("BUCKET_NAME"),
+            prefix=os.getenv("CHART_STORE_PREFIX", "charts/"),
+            max_bytes=max_bytes,
+            max_age=max_age,
+            sweep_interval=sweep_interval,
+        )
+    if backend != "local":
+        raise ValueError(f"Unknown CHART_STORE_BACKEND: {backend}")
+    return LocalArtifactStore(
+        root=os.getenv("CHART_STORE_DIR") or os.path.join(BASE_DIR, "artifacts", "charts"),
+        max_bytes=max_bytes,
+        max_age=max_age,
+        sweep_interval=sweep_interval,
+        # 以前の保存先。既存レポートのグラフ (static/generated_charts) は読むだけで削除しない
+        fallback_roots=[LEGACY_CHART_DIR],
+    )
+
+
+chart_store = create_chart_store()
@@ -0,0 +1,238 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from matplotlib import font_manager as fm
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from utils.artifact_store import ArtifactStore, chart_store
+from utils.logger import Logger
+from utils.metrics import stage_seconds
+
+
+logger = Logger(name="chart_renderer").get_logger()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # task_solution
+
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png").lower()
+CHART_DPI = 150
+CONTENT_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+# より鮮やかで見やすい色のパレット
+COLORS = [
+    "#FF6B6B",  # コーラルレッド
+    "#4ECDC4",  # ターコイズ
+    "#45B7D1",  # ブルー
+    "#96CEB4",  # ミントグリーン
+    "#FECA57",  # ゴールド
+    "#FF9FF3",  # ピンク
+    "#54A0FF",  # ライトブルー
+    "#5F27CD",  # パープル
+    "#00D2D3",  # シアン
+    "#FF9F43",  # オレンジ
+]
+
+FONT_FILENAME = "NotoSansJP-Regular.ttf"
+FONT_DOWNLOAD_URL = "https://raw.githubusercontent.com/google/fonts/main/ofl/notosansjp/NotoSansJP-Regular.ttf"
+# 同梱・キャッシュ済みフォントの探索先 (先にあるものを優先)
+LOCAL_FONT_PATHS = [
+    os.path.join(BASE_DIR, "static", "fonts", FONT_FILENAME),
+    os.path.join(BASE_DIR, "temp_fonts", FONT_FILENAME),
+]
+# システムにインストールされた日本語フォント (Docker イメージには fonts-noto-cjk を入れている)
+JAPANESE_FONT_FAMILIES = [
+    "Noto Sans CJK JP",
+    "NotoSansCJK-Regular",
+    "Hiragino Sans",
+    "Yu Gothic",
+    "Meiryo",
+    "Takao",
+]
+
+# 描画内容を変えたら上げる (同じデータでも別ファイルとして描き直す)
+CHART_STYLE_VERSION = 1
+
+
+class ChartRenderer:
+    """
+    作業時間の円グラフを描画するサービス。
+    - フォントは起動時に一度だけ解決する (リクエスト中にダウンロードや全フォント走査をしない)
+    - pyplot のグローバル状態を使わず Figure API でワーカースレッド上で描画する
+    - ファイル名を描画データのハッシュにするので、同じグラフは一度しか描画しない
+    描画結果は ArtifactStore に保存し、url_prefix 配下の URL を返す。
+    """
+
+    def __init__(self, store: ArtifactStore, url_prefix: str, max_workers: int = 2):
+        self.store = store
+        self.url_prefix = url_prefix.rstrip("/")
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="chart-render"
+        )
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._font_lock = threading.Lock()
+        self._font_prop = None
+
+    # --- フォント ---
+
+    def warm_up(self, allow_download: bool = True):
+        """起動時に呼び、フォントを解決しておく"""
+        return self.resolve_font(allow_download=allow_download)
+
+    def resolve_font(self, allow_download: bool = False) -> fm.FontProperties:
+        if self._font_prop is not None:
+            return self._font_prop
+        with self._font_lock:
+            if self._font_prop is None:
+                self._font_prop = self._find_font(allow_download)
+        return self._font_prop
+
+    def _find_font(self, allow_download: bool) -> fm.FontProperties:
+        env_font_path = os.getenv("CHART_FONT_PATH")
+        for path in [env_font_path] + LOCAL_FONT_PATHS:
+            if path and os.path.exists(path):
+                logger.info(f"Using chart font file: {path}")
+                return fm.FontProperties(fname=path)
+
+        available_fonts = {f.name: f.fname for f in fm.fontManager.ttflist}
+        for family in JAPANESE_FONT_FAMILIES:
+            for name, fname in available_fonts.items():
+                if family.lower() in name.lower():
+                    logger.info(f"Using system font: {name} ({fname})")
+                    return fm.FontProperties(fname=fname)
+        for name, fname in available_fonts.items():
+            if any(keyword in name.lower() for keyword in ["noto", "cjk", "jp", "japanese"]):
+                logger.info(f"Found Japanese font: {name} ({fname})")
+                return fm.FontProperties(fname=fname)
+
+        if allow_download:
+            downloaded = self._download_font()
+            if downloaded:
+                return fm.FontProperties(fname=downloaded)
+
+        logger.warning("No Japanese font found, using default font")
+        return fm.FontProperties()
+
+    def _download_font(self):
+        local_font_path = LOCAL_FONT_PATHS[-1]
+        os.makedirs(os.path.dirname(local_font_path), exist_ok=True)
+        try:
+            req = urllib.request.Request(
+                FONT_DOWNLOAD_URL, headers={"User-Agent": "Mozilla/5.0"}
+            )
+            with urllib.request.urlopen(req, timeout=10) as response:
+                data = response.read()
+            with open(local_font_path, "wb") as out_file:
+                out_file.write(data)
+            logger.info(f"Font downloaded successfully to {local_font_path}")
+            return local_font_path
+        except Exception as e:
+            logger.warning(f"Error downloading font: {e}")
+            return None
+
+    # --- 描画 ---
+
+    def render_pie_chart(self, durations: dict, fmt: str = None) -> str:
+        """
+        :param durations: タスク種別 -> 分 (挿入順に描画・配色する)
+        :param fmt: "png" または "svg"。省略時は CHART_FORMAT
+        :return: 画像の URL。描画に失敗した場合は ""
+        """
+        if not durations:
+            return ""
+        fmt = (fmt or CHART_FORMAT).lower()
+        if fmt not in ("png", "svg"):
+            raise ValueError(f"Unsupported chart format: {fmt}")
+
+        labels = list(durations.keys())
+        sizes = [float(v) for v in durations.values()]
+        digest = hashlib.sha256(
+            json.dumps(
+                {"v": CHART_STYLE_VERSION, "labels": labels, "sizes": sizes},
+                ensure_ascii=False,
+            ).encode("utf-8")
+        ).hexdigest()[:32]
+        filename = f"pie_chart_{digest}.{fmt}"
+        url = f"{self.url_prefix}/{filename}"
+
+        if self.store.exists(filename):
+            return url
+
+        with self._lock:
+            future = self._inflight.get(filename)
+            if future is None:
+                future = self._executor.submit(
+                    self._render, labels, sizes, filename, fmt
+                )
+                self._inflight[filename] = future
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"Error saving pie chart: {e}")
+            return ""
+        finally:
+            with self._lock:
+                self._inflight.pop(filename, None)
+        return url
+
+    def _render(self, labels: list, sizes: list, filename: str, fmt: str):
+        with stage_seconds.time(stage="chart_render"):
+            data = self._draw(labels, sizes, fmt)
+        self.store.put(filename, data, CONTENT_TYPES[fmt])
+        logger.info(f"Pie chart saved successfully as {filename}")
+
+    def _draw(self, labels: list, sizes: list, fmt: str) -> bytes:
+        font_prop = self.resolve_font()
+
+        fig = Figure(figsize=(10, 8), dpi=100)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+
+        _, texts, autotexts = ax.pie(
+            sizes,
+            labels=labels,
+            autopct="%1.1f%%",
+            startangle=90,
+            colors=[COLORS[i % len(COLORS)] for i in range(len(labels))],
+            textprops={"fontproperties": font_prop, "fontsize": 12, "weight": "bold"},
+            pctdistance=0.85,
+        )
+        # パーセンテージテキストの色を白に設定（視認性向上）
+        for autotext in autotexts:
+            autotext.set_fontproperties(font_prop)
+            autotext.set_color("white")
+            autotext.set_weight("bold")
+            autotext.set_fontsize(11)
+        for text in texts:
+            text.set_fontproperties(font_prop)
+            text.set_fontsize(12)
+            text.set_weight("bold")
+
+        ax.axis("equal")
+        ax.set_title(
+            "作業時間割合", fontsize=16, weight="bold", pad=20, fontproperties=font_prop
+        )
+        fig.patch.set_facecolor("white")
+        fig.tight_layout()
+
+        buf = io.BytesIO()
+        fig.savefig(
+            buf,
+            format=fmt,
+            dpi=CHART_DPI,
+            bbox_inches="tight",
+            facecolor="white",
+        )
+        return buf.getvalue()
+
+
+chart_renderer = ChartRenderer(
+    store=chart_store,
+    url_prefix="/charts",
+    max_workers=int(os.getenv("CHART_RENDER_WORKERS", 2)),
+)
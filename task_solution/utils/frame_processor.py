@@ -0,0 +1,217 @@
+import base64
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from utils.logger import Logger
+from utils.metrics import registry, stage_seconds
+
+
+logger = Logger(name="frame_processor").get_logger()
+
+# dHash のビット数は hash_size * hash_size (8 -> 64bit)
+DHASH_SIZE = 8
+# この距離以下のフレームは直前に残したフレームの重複とみなす
+DEFAULT_DEDUP_THRESHOLD = int(os.getenv("FRAME_DEDUP_THRESHOLD", 5))
+
+# Vertex に送るフレームの長辺の上限と再エンコード品質
+FRAME_MAX_EDGE = int(os.getenv("FRAME_MAX_EDGE", 1280))
+FRAME_JPEG_QUALITY = int(os.getenv("FRAME_JPEG_QUALITY", 75))
+
+# Pillow はデコード・リサイズ・エンコード中に GIL を解放するのでスレッドで並列化できる
+_normalize_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FRAME_NORMALIZE_WORKERS", os.cpu_count() or 4)),
+    thread_name_prefix="frame-normalize",
+)
+
+# Recorder が変化検出でキャプチャした / 送らずに捨てたフレーム数 (capture_stats で報告される)
+client_capture_frames = registry.counter(
+    "client_capture_frames_total",
+    "Frames sampled by the browser recorder, by result",
+    ("result",),
+)
+
+_MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def frame_payloads(frames: list) -> list:
+    """
+    受信したフレームから画像部分を取り出す。
+    data URL 文字列はヘッダを除いた base64 部分を、multipart で受け取ったバイト列はそのまま返す
+    """
+    payloads = []
+    for frame in frames:
+        if isinstance(frame, bytes):
+            payloads.append(frame)
+        elif "," in frame:
+            payloads.append(frame.split(",")[1])
+    return payloads
+
+
+def record_capture_stats(raw) -> dict:
+    """
+    Recorder から送られた capture_stats (JSON 文字列か dict) をメトリクスに加算する。
+    不正な値は無視して空の dict を返す
+    """
+    if not raw:
+        return {}
+    try:
+        stats = json.loads(raw) if isinstance(raw, str) else dict(raw)
+    except (TypeError, ValueError):
+        logger.warning(f"capture_stats を解釈できません: {str(raw)[:100]}")
+        return {}
+    for result in ("captured", "skipped"):
+        count = stats.get(result)
+        if isinstance(count, int) and count > 0:
+            client_capture_frames.inc(count, result=result)
+    return stats
+
+
+def decode_frame(encoded_frame) -> bytes:
+    """
+    base64 文字列 (data URL のヘッダは除去済み) を画像バイト列に変換する。
+    バイト列 (multipart で受け取ったフレーム) はデコード不要なのでそのまま返す
+    """
+    if isinstance(encoded_frame, bytes):
+        return encoded_frame
+    with stage_seconds.time(stage="base64_decode"):
+        return base64.b64decode(encoded_frame)
+
+
+def dhash(image_data: bytes, hash_size: int = DHASH_SIZE) -> int:
+    """
+    画像の difference hash を計算する。
+    グレースケール化して (hash_size+1) x hash_size に縮小し、隣接画素の大小をビット化する。
+    """
+    with Image.open(io.BytesIO(image_data)) as image:
+        image.draft("L", (hash_size * 8, hash_size * 8))  # JPEG はデコード時に縮小
+        small = image.convert("L").resize(
+            (hash_size + 1, hash_size), Image.Resampling.BILINEAR
+        )
+        pixels = np.asarray(small, dtype=np.int16)
+    diff = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(diff.flatten()).tobytes(), "big")
+
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    return (hash_a ^ hash_b).bit_count()
+
+
+def dedupe_frames(
+    encoded_frames: list, threshold: int = None
+) -> tuple[list, int]:
+    """
+    直前に残したフレームとのハミング距離が threshold 以下のフレームを除外する。
+    フレームは base64 文字列・画像バイト列のどちらでもよい。残したものはデコード済みのバイト列で返すので、
+    後段で base64 を再度デコードしなくてよい (base64 としてデコードできないフレームは除外する)
+    :return: (残したフレーム, 除外したフレーム数)
+    """
+    if threshold is None:
+        threshold = DEFAULT_DEDUP_THRESHOLD
+    if threshold < 0:
+        return list(encoded_frames), 0
+
+    kept = []
+    last_hash = None
+    for i, encoded_frame in enumerate(encoded_frames):
+        try:
+            image_data = decode_frame(encoded_frame)
+        except Exception as e:
+            logger.warning(f"Dropping frame {i}: failed to decode: {e}")
+            continue
+        try:
+            with stage_seconds.time(stage="frame_dhash"):
+                frame_hash = dhash(image_data)
+        except Exception as e:
+            # ハッシュが計算できないフレームは判定せず後段に任せる
+            logger.warning(f"Failed to hash frame {i}: {e}")
+            kept.append(image_data)
+            continue
+
+        if last_hash is not None and hamming_distance(frame_hash, last_hash) <= threshold:
+            continue
+        kept.append(image_data)
+        last_hash = frame_hash
+
+    dropped = len(encoded_frames) - len(kept)
+    logger.info(
+        f"dedupe_frames: total={len(encoded_frames)} kept={len(kept)} "
+        f"dropped={dropped} threshold={threshold}"
+    )
+    return kept, dropped
+
+
+def sniff_mime_type(image_data: bytes) -> str:
+    """
+    先頭バイトから画像の実際の MIME タイプを判定する。判定できなければ None
+    """
+    for magic, mime_type in _MAGIC_NUMBERS:
+        if image_data.startswith(magic):
+            return mime_type
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def normalize_frame(
+    image_data: bytes, max_edge: int = None, quality: int = None
+) -> tuple[bytes, str]:
+    """
+    フレームを長辺 max_edge 以内に縮小し、メタデータなしの JPEG に再エンコードする。
+    デコードできず画像の種類も判定できないフレームは Vertex が受け付けないので None を返す
+    :return: (画像バイト列, MIME タイプ) または None
+    """
+    max_edge = max_edge or FRAME_MAX_EDGE
+    quality = quality or FRAME_JPEG_QUALITY
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            image.draft("RGB", (max_edge, max_edge))
+            image = image.convert("RGB")
+            image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            # exif / icc_profile を渡さないので付随メタデータは落ちる
+            image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        return buffer.getvalue(), "image/jpeg"
+    except Exception as e:
+        mime_type = sniff_mime_type(image_data)
+        if mime_type is None:
+            logger.warning(
+                f"Dropping frame: not a recognizable image ({len(image_data)} bytes): {e}"
+            )
+            return None
+        logger.warning(f"Failed to normalize frame, sending as-is ({mime_type}): {e}")
+        return image_data, mime_type
+
+
+def normalize_frames(
+    frames: list[bytes], max_edge: int = None, quality: int = None
+) -> list[tuple[bytes, str]]:
+    """
+    normalize_frame をスレッドプールで並列に適用する (順序は保持、画像でないフレームは除く)
+    """
+    if not frames:
+        return []
+    with stage_seconds.time(stage="frame_normalize"):
+        normalized = [
+            result
+            for result in _normalize_executor.map(
+                lambda frame: normalize_frame(frame, max_edge=max_edge, quality=quality),
+                frames,
+            )
+            if result is not None
+        ]
+    before = sum(len(frame) for frame in frames)
+    after = sum(len(data) for data, _ in normalized)
+    logger.info(
+        f"normalize_frames: count={len(frames)} bytes {before} -> {after}"
+    )
+    return normalized
@@ -1,16 +1,177 @@
+import atexit
+import hashlib
 import logging
 import os
+import queue
+import threading
 from dotenv import load_dotenv
 from logging import Logger as BaseLogger
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from typing import Optional
 
+from utils.metrics import registry
+
 
 load_dotenv()
 
+# ファイルごとのローテーションサイズと世代数
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+# 書き込み待ちのレコード数の上限。溢れた分は捨てる (リクエストのスレッドを待たせない)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# これより長いメッセージは切り詰めてハッシュを付ける
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", 4000))
+# DEBUG は呼び出し箇所ごとに N 件に 1 件だけ出力する
+LOG_DEBUG_SAMPLE_EVERY = int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", 10))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+dropped_records = registry.counter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full"
+)
+
+
+def summarize_payload(value, limit: int = 200, keep_tail: bool = False) -> str:
+    """
+    ログに載せる値を limit 文字以内にする。長いものは先頭だけ残し、長さと sha256 を付ける
+    (同じ内容かどうかはハッシュで突き合わせられる)。
+    keep_tail なら先頭と末尾を半分ずつ残す (トレースバックの最後の例外行を落とさない)
+    """
+    if isinstance(value, bytes):
+        digest = hashlib.sha256(value).hexdigest()[:12]
+        return f"<{len(value)} bytes sha256={digest}>"
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    digest = hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()[:12]
+    if keep_tail:
+        head = limit // 2
+        return f"{text[:head]}...<{len(text)} chars sha256={digest}>...{text[head - limit:]}"
+    return f"{text[:limit]}...<{len(text)} chars sha256={digest}>"
+
+
+class _RoutingHandler(logging.Handler):
+    """
+    リスナースレッド上で、レコードを出力先ごとのハンドラに振り分ける。
+    ファイルは最初の書き込みで開き、以降は開いたままにする
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._handlers = {}
+
+    def _handler_for(self, log_path: Optional[str]) -> logging.Handler:
+        handler = self._handlers.get(log_path)
+        if handler is None:
+            if log_path is None:
+                handler = logging.StreamHandler()
+            else:
+                handler = RotatingFileHandler(
+                    log_path,
+                    maxBytes=LOG_MAX_BYTES,
+                    backupCount=LOG_BACKUP_COUNT,
+                    encoding="utf-8",
+                    delay=True,
+                )
+            # メッセージは QueueHandler 側で書式化済み
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._handlers[log_path] = handler
+        return handler
+
+    def emit(self, record):
+        self._handler_for(getattr(record, "log_path", None)).handle(record)
+
+    def flush(self):
+        for handler in list(self._handlers.values()):
+            handler.flush()
+
+    def close(self):
+        for handler in list(self._handlers.values()):
+            handler.close()
+        self._handlers.clear()
+        super().close()
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """書式化と切り詰めだけを呼び出し元で行い、書き込みはリスナーに任せる"""
+
+    def __init__(self, log_queue, log_path: Optional[str]):
+        super().__init__(log_queue)
+        self.log_path = log_path
+
+    def prepare(self, record):
+        # super().prepare() がトレースバックを message に含めて exc_info を消すので先に見る
+        keep_tail = bool(record.exc_info or record.stack_info) or record.levelno >= logging.ERROR
+        record = super().prepare(record)
+        record.msg = record.message = summarize_payload(
+            record.message, LOG_MAX_MESSAGE_CHARS, keep_tail=keep_tail
+        )
+        record.log_path = self.log_path
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records.inc()
+
+
+class _DebugSampler(logging.Filter):
+    """DEBUG レコードを呼び出し箇所ごとに every 件に 1 件だけ通す"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self._counts = {}
+
+    def filter(self, record) -> bool:
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        key = (record.pathname, record.lineno)
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % self.every == 0
+
+
+class _DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # キューが満杯でも、残りのレコードを書き出してから止まるよう空きを待つ
+        self.queue.put(self._sentinel)
+
+
+_log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_listener = None
+_listener_lock = threading.Lock()
+_debug_sampler = _DebugSampler(LOG_DEBUG_SAMPLE_EVERY)
+
+
+def _ensure_listener():
+    global _listener
+    if _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = _DrainingQueueListener(_log_queue, _RoutingHandler())
+            _listener.start()
+            atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """キューに残っているレコードを書き出してリスナーを止める"""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
 
 class Logger:
     """
     汎用的なロガークラス。logディレクトリ配下にログを出力する。
+    ファイルへの書き込みは共有のバックグラウンドスレッドで行い、呼び出し元はキューに積むだけ。
+    同じ name で何度生成してもハンドラは作り直さない。
     """
 
     def __init__(
@@ -18,31 +179,40 @@ class Logger:
         name: str = "app",
         log_dir: str = "log",
         log_file: Optional[str] = None,
-        level: int = logging.INFO,
+        level: Optional[int] = None,
         fmt: str = "[%(asctime)s] %(levelname)s %(name)s: %(message)s",
     ):
         self.log_dir = log_dir
-        os.makedirs(self.log_dir, exist_ok=True)
         self.log_file = log_file or f"{name}.log"
         self.log_path = os.path.join(self.log_dir, self.log_file)
 
         self.logger: BaseLogger = logging.getLogger(name)
-        self.logger.setLevel(level)
+        self.logger.setLevel(level if level is not None else LOG_LEVEL)
         self.logger.propagate = False
 
+        output_type = os.getenv("LOGGER_OUTPUT", "FILE").upper()
+        log_path = None if output_type == "CONSOLE" else self.log_path
+
+        handlers = self.logger.handlers
+        if (
+            len(handlers) == 1
+            and isinstance(handlers[0], _NonBlockingQueueHandler)
+            and handlers[0].log_path == log_path
+        ):
+            return
+
         # 既存のハンドラをクリア
-        if self.logger.hasHandlers():
-            self.logger.handlers.clear()
+        for handler in list(handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
 
-        output_type = os.getenv("LOGGER_OUTPUT", "FILE").upper()
-        if output_type == "CONSOLE":
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(logging.Formatter(fmt))
-            self.logger.addHandler(console_handler)
-        else:
-            file_handler = logging.FileHandler(self.log_path, encoding="utf-8")
-            file_handler.setFormatter(logging.Formatter(fmt))
-            self.logger.addHandler(file_handler)
+        if log_path is not None:
+            os.makedirs(self.log_dir, exist_ok=True)
+        _ensure_listener()
+        queue_handler = _NonBlockingQueueHandler(_log_queue, log_path)
+        queue_handler.setFormatter(logging.Formatter(fmt))
+        queue_handler.addFilter(_debug_sampler)
+        self.logger.addHandler(queue_handler)
 
     def info(self, msg: str):
         self.logger.info(msg)
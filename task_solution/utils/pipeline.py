@@ -0,0 +1,157 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.logger import Logger
+from utils.metrics import registry
+
+
+logger = Logger(name="pipeline").get_logger()
+
+node_seconds = registry.histogram(
+    "pipeline_node_duration_seconds",
+    "Duration of pipeline nodes",
+    ("pipeline", "node", "status"),
+)
+
+
+class PipelineNode:
+    def __init__(self, name: str, func, deps: tuple):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+
+class PipelineResult:
+    """
+    パイプラインの実行結果。失敗したノードがあっても成功したノードの結果は参照できる。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.results = {}
+        self.errors = {}
+        self.timings = {}
+        self.wall_time = None
+
+    def ok(self, node_name: str) -> bool:
+        return node_name in self.results
+
+    def get(self, node_name: str, default=None):
+        return self.results.get(node_name, default)
+
+    def to_dict(self) -> dict:
+        return {
+            "pipeline": self.name,
+            "succeeded": list(self.results.keys()),
+            "failed": {name: str(e) for name, e in self.errors.items()},
+            "timings": self.timings,
+            "wall_time": self.wall_time,
+        }
+
+
+class DependencyFailedError(Exception):
+    """依存先のノードが失敗したためノードを実行しなかった"""
+
+
+class Pipeline:
+    """
+    依存関係を考慮してノードをスレッドプールで並列実行する小さな DAG 実行器。
+    各ノードの関数には依存先ノードの結果がノード名をキーワード引数として渡される。
+
+        pipeline = Pipeline("report")
+        pipeline.add("task_types", extract)
+        pipeline.add("time_table", make_time_table, deps=["task_types"])
+        pipeline.add("report", make_report)
+        result = pipeline.run()
+    """
+
+    def __init__(self, name: str, max_workers: int = None):
+        self.name = name
+        self.max_workers = max_workers
+        self._nodes = {}
+
+    def add(self, name: str, func, deps=()) -> "Pipeline":
+        if name in self._nodes:
+            raise ValueError(f"Duplicate node name: {name}")
+        self._nodes[name] = PipelineNode(name, func, deps)
+        return self
+
+    def _validate(self):
+        for node in self._nodes.values():
+            for dep in node.deps:
+                if dep not in self._nodes:
+                    raise ValueError(f"Node '{node.name}' depends on unknown node '{dep}'")
+        # 循環依存の検出 (トポロジカルソートできるか)
+        remaining = {name: set(node.deps) for name, node in self._nodes.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Cyclic dependency among nodes: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def _run_node(self, node: PipelineNode, kwargs: dict, timings: dict):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = node.func(**kwargs)
+            status = "ok"
+            return result
+        finally:
+            timings[node.name] = time.perf_counter() - start
+            node_seconds.observe(
+                timings[node.name], pipeline=self.name, node=node.name, status=status
+            )
+
+    def run(self, on_node_done=None) -> PipelineResult:
+        """
+        :param on_node_done: ノードが終わるたび (成功・失敗とも) にノード名で呼ぶ関数。
+            呼び出し元のスレッドで呼ぶので、進捗の報告などに使える
+        """
+        self._validate()
+        result = PipelineResult(self.name)
+        pending = dict(self._nodes)
+        running = {}
+        start = time.perf_counter()
+
+        max_workers = self.max_workers or max(1, len(self._nodes))
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"pipeline-{self.name}"
+        ) as executor:
+            while pending or running:
+                for name, node in list(pending.items()):
+                    failed_deps = [dep for dep in node.deps if dep in result.errors]
+                    if failed_deps:
+                        result.errors[name] = DependencyFailedError(
+                            f"skipped because {', '.join(failed_deps)} failed"
+                        )
+                        del pending[name]
+                    elif all(dep in result.results for dep in node.deps):
+                        kwargs = {dep: result.results[dep] for dep in node.deps}
+                        future = executor.submit(
+                            self._run_node, node, kwargs, result.timings
+                        )
+                        running[future] = name
+                        del pending[name]
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result.results[name] = future.result()
+                    except Exception as e:
+                        result.errors[name] = e
+                        logger.error(f"[{self.name}] node '{name}' failed: {e}")
+                    if on_node_done is not None:
+                        on_node_done(name)
+
+        result.wall_time = time.perf_counter() - start
+        logger.info(
+            f"[{self.name}] finished in {result.wall_time:.3f}s "
+            + " ".join(f"{name}={t:.3f}s" for name, t in result.timings.items())
+        )
+        return result
@@ -0,0 +1,212 @@
+import json
+import os
+import tempfile
+import time
+import zlib
+
+import zstandard
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import ClosingIterator, get_input_stream
+
+from utils.logger import Logger
+from utils.metrics import registry, stage_seconds
+
+
+logger = Logger(name="request_decompression").get_logger()
+
+# 展開後のボディの上限。超えた時点で展開をやめて 413 を返す (圧縮爆弾対策)
+MAX_DECOMPRESSED_BYTES = int(os.getenv("MAX_DECOMPRESSED_BYTES", 64 * 1024 * 1024))
+# zstd のウィンドウの上限 (展開時に確保するメモリ)
+ZSTD_MAX_WINDOW_BYTES = int(os.getenv("ZSTD_MAX_WINDOW_BYTES", 8 * 1024 * 1024))
+# 展開したボディをメモリに置く上限。超えた分は一時ファイルに書く
+SPOOL_MAX_BYTES = int(os.getenv("REQUEST_SPOOL_MAX_BYTES", 8 * 1024 * 1024))
+
+_READ_SIZE = 64 * 1024
+
+request_body_bytes = registry.counter(
+    "http_request_body_bytes_total",
+    "Request body bytes of Content-Encoding requests, on the wire and after decoding",
+    ("encoding", "stage"),
+)
+request_decode_errors = registry.counter(
+    "http_request_decode_errors_total",
+    "Compressed request bodies rejected while decoding",
+    ("encoding", "reason"),
+)
+
+
+class DecompressedBodyTooLarge(Exception):
+    pass
+
+
+class InvalidEncodedBody(Exception):
+    pass
+
+
+class _GzipDecoder:
+    def __init__(self, max_bytes: int):
+        self._remaining = max_bytes
+        # wbits=16+MAX_WBITS で gzip ヘッダ付きのストリームとして扱う
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def feed(self, chunk: bytes) -> bytes:
+        if self._decompressor.eof:
+            if chunk:
+                raise InvalidEncodedBody("Trailing data after gzip stream")
+            return b""
+        try:
+            # 上限 +1 バイトまでしか展開しないので、超えたかどうかだけ分かればよい
+            data = self._decompressor.decompress(chunk, self._remaining + 1)
+        except zlib.error as e:
+            raise InvalidEncodedBody(f"Invalid gzip body: {e}")
+        self._remaining -= len(data)
+        if self._remaining < 0:
+            raise DecompressedBodyTooLarge()
+        return data
+
+    def finish(self) -> bytes:
+        if not self._decompressor.eof:
+            raise InvalidEncodedBody("Truncated gzip body")
+        return b""
+
+
+class _ZstdDecoder:
+    # 入力 1 バイトあたりの展開量の上限の目安 (RLE ブロックは 4 バイトで 128KB になる)
+    MAX_RATIO = 32 * 1024
+    MIN_SLICE = 64
+
+    def __init__(self, max_bytes: int):
+        self._remaining = max_bytes
+        self._decompressor = zstandard.ZstdDecompressor(
+            max_window_size=ZSTD_MAX_WINDOW_BYTES
+        ).decompressobj(write_size=_READ_SIZE)
+
+    def feed(self, chunk: bytes) -> bytes:
+        # decompressobj には展開量の上限を渡せないので、入力を小分けにして1回の展開量を抑え、
+        # 残りの上限に近づくほど小さく切る (上限の超過は最悪でも MIN_SLICE 分の展開量まで)
+        out = []
+        view = memoryview(chunk)
+        while view:
+            if self._decompressor.eof:
+                raise InvalidEncodedBody("Trailing data after zstd frame")
+            size = max(self.MIN_SLICE, self._remaining // self.MAX_RATIO)
+            try:
+                data = self._decompressor.decompress(view[:size])
+            except zstandard.ZstdError as e:
+                raise InvalidEncodedBody(f"Invalid zstd body: {e}")
+            view = view[size:]
+            self._remaining -= len(data)
+            if self._remaining < 0:
+                raise DecompressedBodyTooLarge()
+            out.append(data)
+            if self._decompressor.eof and (view or self._decompressor.unused_data):
+                raise InvalidEncodedBody("Trailing data after zstd frame")
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        if not self._decompressor.eof:
+            raise InvalidEncodedBody("Truncated zstd body")
+        return b""
+
+
+DECODERS = {
+    "gzip": _GzipDecoder,
+    "x-gzip": _GzipDecoder,
+    "zstd": _ZstdDecoder,
+}
+
+
+def content_encoding(value: str) -> str:
+    """Content-Encoding ヘッダの値を正規化する (identity は空文字)"""
+    value = (value or "").strip().lower()
+    return "" if value == "identity" else value
+
+
+def make_decoder(encoding: str, max_bytes: int = None):
+    """
+    Content-Encoding に対応するデコーダを返す。feed(chunk) で展開済みのバイト列を、
+    finish() で残りを返す。未対応の符号化なら None
+    """
+    decoder_class = DECODERS.get(encoding)
+    if decoder_class is None:
+        return None
+    return decoder_class(MAX_DECOMPRESSED_BYTES if max_bytes is None else max_bytes)
+
+
+def record_decoded_body(encoding: str, wire_bytes: int, decoded_bytes: int, seconds: float):
+    request_body_bytes.inc(wire_bytes, encoding=encoding, stage="wire")
+    request_body_bytes.inc(decoded_bytes, encoding=encoding, stage="decoded")
+    stage_seconds.observe(seconds, stage="request_decompress")
+
+
+def record_decode_error(encoding: str, error: Exception):
+    reason = "too_large" if isinstance(error, DecompressedBodyTooLarge) else "invalid"
+    request_decode_errors.inc(encoding=encoding, reason=reason)
+    logger.warning(f"圧縮ボディを展開できません: encoding={encoding}, reason={reason}")
+
+
+class RequestDecompressionMiddleware:
+    """
+    Content-Encoding: gzip / zstd のリクエストボディを展開してからアプリに渡す WSGI ミドルウェア。
+    少しずつ読みながら展開し、展開後のサイズが max_bytes を超えた時点で 413 を返す。
+    展開したボディは SPOOL_MAX_BYTES を超えると一時ファイルに置くので、メモリに全体を持たない
+    """
+
+    def __init__(self, app, max_bytes: int = None):
+        self.app = app
+        self.max_bytes = MAX_DECOMPRESSED_BYTES if max_bytes is None else max_bytes
+
+    def __call__(self, environ, start_response):
+        encoding = content_encoding(environ.get("HTTP_CONTENT_ENCODING"))
+        if not encoding:
+            return self.app(environ, start_response)
+
+        decoder = make_decoder(encoding, self.max_bytes)
+        if decoder is None:
+            return _error(415, f"Unsupported Content-Encoding: {encoding}")(
+                environ, start_response
+            )
+
+        start = time.perf_counter()
+        stream = get_input_stream(environ)
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        wire_bytes = 0
+        try:
+            while True:
+                chunk = stream.read(_READ_SIZE)
+                if not chunk:
+                    break
+                wire_bytes += len(chunk)
+                body.write(decoder.feed(chunk))
+            body.write(decoder.finish())
+        except DecompressedBodyTooLarge as e:
+            body.close()
+            record_decode_error(encoding, e)
+            return _error(413, f"Decompressed body exceeds {self.max_bytes} bytes")(
+                environ, start_response
+            )
+        except InvalidEncodedBody as e:
+            body.close()
+            record_decode_error(encoding, e)
+            return _error(400, str(e))(environ, start_response)
+
+        decoded_bytes = body.tell()
+        body.seek(0)
+        record_decoded_body(encoding, wire_bytes, decoded_bytes, time.perf_counter() - start)
+
+        environ = dict(environ)
+        environ.pop("HTTP_CONTENT_ENCODING", None)
+        environ.pop("HTTP_TRANSFER_ENCODING", None)
+        environ["wsgi.input"] = body
+        environ["wsgi.input_terminated"] = False
+        environ["CONTENT_LENGTH"] = str(decoded_bytes)
+        # ストリーミングのレスポンスがボディを読む場合もあるので、レスポンスを返し終えてから閉じる
+        return ClosingIterator(self.app(environ, start_response), body.close)
+
+
+def _error(status: int, message: str) -> Response:
+    return Response(
+        json.dumps({"status": "error", "message": message}),
+        status=status,
+        mimetype="application/json",
+    )
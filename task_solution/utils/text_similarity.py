@@ -0,0 +1,16 @@
+import re
+
+
+def char_ngrams(text: str, n: int = 2) -> set:
+    text = re.sub(r"\s+", "", text.lower())
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+def ngram_similarity(a: str, b: str, n: int = 2) -> float:
+    """文字 n-gram の Dice 係数 (0.0 - 1.0)"""
+    grams_a, grams_b = char_ngrams(a, n), char_ngrams(b, n)
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))